@@ -1,154 +1,422 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+"""Application Flask du portfolio.
+
+Les routes sont déclarées sur `app` ; les stores, le stockage et les tâches
+sont créés par `create_app(config)` (voir wsgi.py), pas à l'import :
+
+    from app import create_app
+    application = create_app()          # config.Config par défaut
+
+Le SDK Cloudinary n'est importé qu'au premier appel qui en a besoin
+(`cloudinary_sdk()`), et WARMUP=1 charge et indexe les données avant la
+première requête. Les durées de démarrage sont dans `STARTUP_TIMINGS`
+(et /admin/metrics) ; elles ne sont affichées qu'avec STARTUP_LOG=1 ou en debug.
+"""
+import time
+
+# Référence des mesures de démarrage (import de ce module, première réponse)
+_import_start = time.perf_counter()
+
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from functools import wraps
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-from cloudinary.exceptions import NotFound
-import cloudinary.utils
 import json
 import os
-from dotenv import load_dotenv
+import threading
 import uuid
-import requests
-from io import BytesIO
 import hashlib
-import time
+import zlib
 from datetime import datetime
 
+from config import Config
+from gallery_store import GalleryStore, encode_cursor, decode_cursor, project
+from gallery_snapshot import GallerySnapshot, SnapshotPublisher, signature_key
+from message_store import MessageStore
+from user_store import UserStore
+from notifications import UnreadNotifier
+from response_cache import CachedBody, ResponseCache, cached_json
+from storage import JsonStorage, SqliteStorage
+from cloudinary_sync import CloudinarySync
+from image_variants import add_variants, build_variants
+from migrations import run_migrations
+from visits import ALL_PAGES, VisitTracker, fill_series, series_keys
+from metrics import Metrics, counter_lines, gauge_lines
+from photo_record import PhotoRecord
+from data_export import export_lines
+from jobs import JobQueue, JobRunner
+
 # Liste des administrateurs
 ADMINS = ['Urioxi', 'noemie.mrn21']
 
-load_dotenv()
+
+class PortfolioJSONProvider(DefaultJSONProvider):
+    """JSON de Flask (jsonify, tojson, cache des réponses) acceptant aussi les PhotoRecord."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, PhotoRecord):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
 
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
-app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
+app.json = PortfolioJSONProvider(app)
 CORS(app)
 
-# Mot de passe admin (défini dans .env, valeur par défaut pour dev)
-ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin123')
+# Métriques (/admin/metrics). SLOW_REQUEST_MS > 0 journalise les requêtes plus
+# lentes que ce seuil, avec le temps passé dans le stockage et chez Cloudinary.
+metrics = Metrics()
 
-# Config Cloudinary (seulement si les variables sont définies)
-cloud_name = os.getenv('CLOUDINARY_CLOUD_NAME')
-api_key = os.getenv('CLOUDINARY_API_KEY')
-api_secret = os.getenv('CLOUDINARY_API_SECRET')
+# Réponses JSON pré-sérialisées des routes en lecture seule
+response_cache = ResponseCache()
+
+# Durées de démarrage du worker, en millisecondes
+STARTUP_TIMINGS = {}
 
-if cloud_name and api_key and api_secret:
-    cloudinary.config(
-        cloud_name=cloud_name,
-        api_key=api_key,
-        api_secret=api_secret
-    )
-    CLOUDINARY_CONFIGURED = True
-else:
-    print("WARNING: Cloudinary non configure - mode degrade active")
-    CLOUDINARY_CONFIGURED = False
 # Définir le répertoire de données en fonction de l'environnement
 GALLERY_FILE = 'data.json'
 STATS_FILE = 'stats.json'
 USERS_FILE = 'users.json'
 MESSAGES_FILE = 'messages.json'
 
+# Notifications temps réel du nombre de messages non lus (SSE / long-polling),
+# seulement avec UNREAD_PUSH=1 : une connexion ouverte occupe un worker synchrone.
+# Les connexions sont bornées en nombre (UNREAD_MAX_SUBSCRIBERS) et en durée
+# pour ne pas monopoliser les workers.
+UNREAD_STREAM_DURATION = 55
+UNREAD_LONG_POLL_TIMEOUT = 25
+UNREAD_CHECK_INTERVAL = 5
+UNREAD_HEARTBEAT_INTERVAL = 15
+
+# Séries affichées dans /admin/stats (ALL_PAGES : toutes pages confondues)
+VISIT_PAGES = (ALL_PAGES, '/', '/gallerie')
+VISITS_SERIES_DAYS = 30
+VISITS_SERIES_HOURS = 48
+
+# Pagination de l'API /gallery
+GALLERY_PAGE_SIZE = 24
+GALLERY_MAX_PAGE_SIZE = 100
+# Champs des photos de la grille (GRID_FIELDS de static/gallery.js)
+GRID_FIELDS = ['id', 'url', 'title', 'description', 'variants.grid', 'variants.slider', 'variants.fullscreen']
+# Photos de la page d'accueil : slider, dont les 4 premières en aperçu
+HOME_PHOTOS = 6
+# Messages par page de la boîte de réception
+MESSAGES_PAGE_SIZE = 20
+# Nombre maximum d'éléments par appel à /batch-photos
+BATCH_MAX_ITEMS = 500
+# Taille approximative des morceaux envoyés par /admin/export (octets avant compression)
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Synchronisation avec Cloudinary (/rebuild-gallery)
+SYNC_STATE_FILE = 'sync_state.json'
+# Maximum de public_ids par appel à delete_resources (limite de l'Admin API)
+REMOTE_DELETE_BATCH = 100
+VARIANTS_BATCH = 500
+# Tâches listées par /admin/jobs (par défaut, maximum)
+JOBS_PAGE_SIZE = 50
+JOBS_MAX_PAGE_SIZE = 500
+
+# Créés par create_app() à partir de la configuration
+config = None
+storage = None
+unread_notifier = None
+user_store = None
+message_store = None
+visit_tracker = None
+gallery_store = None
+gallery_snapshot = None
+snapshot_publisher = None
+cloudinary_sync = None
+job_queue = None
+job_runner = None
+CLOUDINARY_CONFIGURED = False
+
+
+# --- Cloudinary : SDK importé au premier usage ---
+_cloudinary = None
+_cloudinary_lock = threading.Lock()
+
+
+def cloudinary_sdk():
+    """Module `cloudinary`, importé et configuré au premier appel.
+
+    Le SDK (et requests/urllib3 qu'il importe) coûte plusieurs dizaines de
+    millisecondes : seul le premier appel à Cloudinary les paie, pas chaque
+    démarrage de worker.
+    """
+    global _cloudinary
+    if _cloudinary is None:
+        with _cloudinary_lock:
+            if _cloudinary is None:
+                start = time.perf_counter()
+                import cloudinary
+                import cloudinary.api
+                cloudinary.config(cloud_name=config.CLOUDINARY_CLOUD_NAME, api_key=config.CLOUDINARY_API_KEY,
+                                  api_secret=config.CLOUDINARY_API_SECRET)
+                STARTUP_TIMINGS['cloudinary_import_ms'] = (time.perf_counter() - start) * 1000
+                _cloudinary = cloudinary
+    return _cloudinary
+
+
+class LazyCloudinaryApi:
+    """`cloudinary.api`, importé au premier appel d'une de ses fonctions."""
+
+    def __getattr__(self, name):
+        return getattr(cloudinary_sdk().api, name)
+
+
+def build_cloudinary_url(public_id, **transformation):
+    return cloudinary_sdk().CloudinaryImage(public_id).build_url(secure=True, **transformation)
+
+
+cloudinary_admin_api = metrics.instrument_api(LazyCloudinaryApi(), 'admin')
+
+
+# --- Tâches d'arrière-plan (voir jobs.py) : synchronisation, suppressions distantes, variantes ---
+def run_rebuild_gallery(job):
+    """Tâche 'rebuild_gallery' : synchronisation avec Cloudinary (voir CloudinarySync)."""
+    return cloudinary_sync.sync(full=job.params.get('full', False), since=job.params.get('since'))
+
+
+def run_delete_remote(job):
+    """Tâche 'delete_remote' : supprime les images de Cloudinary par lots.
+
+    Les images de nouveau référencées par une photo locale (réimport entre-temps)
+    sont conservées. Rejouer un lot est sans effet sur les images déjà supprimées.
+    """
+    referenced = {photo.get('public_id') for photo in gallery_store.all()}
+    public_ids = [public_id for public_id in job.params.get('public_ids', []) if public_id not in referenced]
+    deleted = not_found = 0
+    for start in range(0, len(public_ids), REMOTE_DELETE_BATCH):
+        result = cloudinary_admin_api.delete_resources(public_ids[start:start + REMOTE_DELETE_BATCH])
+        for status in (result.get('deleted') or {}).values():
+            if status == 'deleted':
+                deleted += 1
+            else:
+                not_found += 1
+        job.progress(min(start + REMOTE_DELETE_BATCH, len(public_ids)), len(public_ids))
+    return {'deleted': deleted, 'not_found': not_found, 'kept': len(job.params.get('public_ids', [])) - len(public_ids)}
+
+
+def run_generate_variants(job):
+    """Tâche 'generate_variants' : calcule les variantes manquantes (toutes avec `force`), par lots."""
+    force = job.params.get('force', False)
+    photo_ids = [photo['id'] for photo in gallery_store.all()
+                 if photo.get('public_id') and (force or not photo.get('variants'))]
+    for start in range(0, len(photo_ids), VARIANTS_BATCH):
+        photos = gallery_store.get_many(photo_ids[start:start + VARIANTS_BATCH])
+        updates = [(photo_id, {'variants': build_variants(photo['public_id'], build_cloudinary_url)})
+                   for photo_id, photo in photos.items()]
+        gallery_store.apply_batch(updates=updates)
+        job.progress(min(start + VARIANTS_BATCH, len(photo_ids)), len(photo_ids))
+    return {'updated': len(photo_ids)}
+
+
+def submit_job(job_type, params=None, **options):
+    """Enregistre une tâche (et démarre les exécutants de ce worker en mode thread)."""
+    job_id = job_queue.submit(job_type, params, **options)
+    if config.JOB_RUNNER == 'thread':
+        job_runner.start()
+    return job_id
+
+
+def delete_remote_later(photos):
+    """Planifie la suppression sur Cloudinary des images de photos supprimées localement."""
+    public_ids = [photo.get('public_id') for photo in photos if photo is not None and photo.get('public_id')]
+    if not public_ids or not CLOUDINARY_CONFIGURED:
+        return None
+    return submit_job('delete_remote', {'public_ids': public_ids}, delay=config.REMOTE_DELETE_DELAY,
+                      batch_key='public_ids')
+
+
+# --- Création de l'application ---
+def create_app(config_object=Config):
+    """Configure l'application et crée le stockage, les stores et la file de tâches.
+
+    Une seule application par processus : les routes utilisent les objets
+    créés ici (variables du module). Un second appel retourne l'application
+    déjà configurée.
+    """
+    global config, storage, unread_notifier, user_store, message_store, visit_tracker, gallery_store, gallery_snapshot
+    global snapshot_publisher
+    global cloudinary_sync, job_queue, job_runner, CLOUDINARY_CONFIGURED
+    if config is not None:
+        return app
+    start = time.perf_counter()
+    config = config_object
+    app.config.from_object(config)
+    app.secret_key = config.SECRET_KEY
+
+    metrics.slow_request_ms = config.SLOW_REQUEST_MS
+    metrics.init_app(app)
+
+    # Cloudinary : seulement si les identifiants sont définis (SDK importé plus tard)
+    CLOUDINARY_CONFIGURED = bool(config.CLOUDINARY_CLOUD_NAME and config.CLOUDINARY_API_KEY
+                                 and config.CLOUDINARY_API_SECRET)
+    if not CLOUDINARY_CONFIGURED:
+        print("WARNING: Cloudinary non configure - mode degrade active")
+
+    # Backend de stockage : 'json' (fichiers ci-dessus, par défaut) ou 'sqlite'
+    if config.STORAGE_BACKEND == 'sqlite':
+        storage = SqliteStorage(config.SQLITE_PATH, config.VISITS_UNIQUE_MODE)
+    else:
+        storage = JsonStorage(GALLERY_FILE, USERS_FILE, MESSAGES_FILE, STATS_FILE, config.VISITS_UNIQUE_MODE,
+                              compact=config.JSON_COMPACT)
+    metrics.instrument_storage(storage)
+
+    # Mise à niveau du schéma des données au démarrage (une seule fois, voir migrations.py).
+    # MIGRATE_ON_STARTUP=0 pour la faire uniquement avec `python migrations.py`.
+    if config.MIGRATE_ON_STARTUP:
+        run_migrations(storage)
+
+    unread_notifier = UnreadNotifier(max_subscribers=config.UNREAD_MAX_SUBSCRIBERS)
+    # Utilisateurs en mémoire, indexés par nom insensible à la casse
+    user_store = UserStore(storage)
+    # Boîtes de réception en mémoire (index par destinataire, compteurs de non lus)
+    message_store = MessageStore(storage, on_unread_change=unread_notifier.notify)
+    # Les visites sont écrites par lots, pas à chaque page vue
+    visit_tracker = VisitTracker(storage, flush_interval=config.VISITS_FLUSH_INTERVAL)
+    # Cache de la galerie partagé par toutes les routes ; les écritures publient, par
+    # rafale, un snapshot lu par tous les workers (GALLERY_SNAPSHOT vide pour s'en passer)
+    gallery_store = GalleryStore(storage, on_change=publish_gallery_snapshot)
+    if config.GALLERY_SNAPSHOT:
+        gallery_snapshot = GallerySnapshot(config.GALLERY_SNAPSHOT, dumps=app.json.dumps)
+        snapshot_publisher = SnapshotPublisher(gallery_snapshot, gallery_store.snapshot_state,
+                                               delay=config.GALLERY_SNAPSHOT_DELAY)
+
+    cloudinary_sync = CloudinarySync(gallery_store, api=cloudinary_admin_api,
+                                     state_file=SYNC_STATE_FILE,
+                                     max_workers=config.CLOUDINARY_SYNC_CONCURRENCY,
+                                     full_sync_interval=config.CLOUDINARY_FULL_SYNC_INTERVAL,
+                                     build_url=build_cloudinary_url)
+
+    # JOB_RUNNER=external pour exécuter les tâches dans un processus séparé (`python jobs.py worker`)
+    job_queue = JobQueue(config.JOBS_DB, max_attempts=config.JOB_MAX_ATTEMPTS)
+    job_runner = JobRunner(job_queue, {
+        'rebuild_gallery': run_rebuild_gallery,
+        'delete_remote': run_delete_remote,
+        'generate_variants': run_generate_variants,
+    }, concurrency=config.JOB_CONCURRENCY)
+
+    STARTUP_TIMINGS['import_ms'] = (_import_end - _import_start) * 1000
+    STARTUP_TIMINGS['create_app_ms'] = (time.perf_counter() - start) * 1000
+    if config.WARMUP:
+        warm_up()
+    if startup_log_enabled():
+        print("Démarrage : " + ", ".join(f"{name[:-3]} {value:.0f} ms" for name, value in STARTUP_TIMINGS.items()))
+    return app
+
+
+def startup_log_enabled():
+    """Afficher les durées de démarrage (STARTUP_LOG=1 ou mode debug)."""
+    return config.STARTUP_LOG or app.debug
+
+
+def warm_up():
+    """Charge et indexe les données et compile les templates avant la première requête.
+
+    Avec le snapshot partagé, la galerie n'est chargée que s'il faut le (re)publier,
+    ce qui est fait tout de suite plutôt qu'en tâche de fond.
+    """
+    start = time.perf_counter()
+    if gallery_snapshot is None or current_snapshot() is None:
+        gallery_store.all()
+        if snapshot_publisher is not None:
+            snapshot_publisher.flush()
+    user_store.all()
+    message_store.all()
+    for template in ('index.html', 'gallery.html', 'base.html'):
+        app.jinja_env.get_template(template)
+    STARTUP_TIMINGS['warmup_ms'] = (time.perf_counter() - start) * 1000
+
+
+# --- Snapshot partagé de la galerie (voir gallery_snapshot.py) ---
+def publish_gallery_snapshot():
+    """Planifie la publication de l'état de la galerie de ce worker (regroupée, en tâche de fond)."""
+    if snapshot_publisher is not None:
+        snapshot_publisher.schedule()
+
+
+def current_snapshot():
+    """Snapshot à jour de la galerie, ou None (absent, ou galerie modifiée depuis).
+
+    Tant que la publication est en attente, les routes utilisent le cache du
+    worker. Une galerie modifiée hors de l'application (import, autre outil)
+    est republiée par le premier worker qui le remarque.
+    """
+    if gallery_snapshot is None:
+        return None
+    view = gallery_snapshot.current()
+    if view is None or view.signature != signature_key(storage.gallery_signature()):
+        publish_gallery_snapshot()
+        return None
+    return view
+
+
+def snapshot_first(lookup):
+    """Décorateur : sert la route depuis le snapshot partagé quand c'est possible.
+
+    `lookup(view, *args)` retourne un CachedBody, une réponse Flask, ou None
+    pour laisser la route répondre (paramètres non couverts, pas de snapshot).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            view = current_snapshot()
+            result = lookup(view, *args, **kwargs) if view is not None else None
+            if result is None:
+                return f(*args, **kwargs)
+            if isinstance(result, CachedBody):
+                return result.to_response('public, no-cache')
+            return result
+        return decorated_function
+    return decorator
+
+
+@app.after_request
+def record_first_response(response):
+    """Note le temps écoulé entre l'import du module et la première réponse du worker."""
+    if 'first_response_ms' not in STARTUP_TIMINGS:
+        STARTUP_TIMINGS['first_response_ms'] = (time.perf_counter() - _import_start) * 1000
+        if startup_log_enabled():
+            print(f"Première réponse {STARTUP_TIMINGS['first_response_ms']:.0f} ms après l'import ({request.path})")
+    return response
+
+
+def session_username():
+    """Nom de l'utilisateur connecté, ou None."""
+    return session.get('username') if session.get('user_logged_in') else None
+
 
 def load_gallery():
-    """Charge la liste des photos stockées dans le JSON local."""
-    try:
-        with open(GALLERY_FILE, 'r') as f:
-            data = json.load(f)
-            # Compat: accepter soit une liste simple, soit un dict {photos: []}
-            if isinstance(data, list):
-                photos = data
-            else:
-                photos = data.get('photos', [])
-            
-            # Migration : convertir l'ancien format vers le nouveau
-            updated = False
-            for photo in photos:
-                # Si ancien format avec 'category' (string), convertir en 'categories' (list)
-                if 'category' in photo and 'categories' not in photo:
-                    photo['categories'] = [photo['category']] if photo['category'] else ['Non catégorisé']
-                    updated = True
-                # Si pas de catégories du tout, ajouter par défaut
-                elif 'categories' not in photo:
-                    photo['categories'] = ['Non catégorisé']
-                    updated = True
-                # S'assurer qu'il y a toujours un texte descriptif et un titre
-                if 'description' not in photo:
-                    photo['description'] = ''
-                    updated = True
-                if 'title' not in photo:
-                    photo['title'] = ''
-                    updated = True
-            
-            if updated:
-                save_gallery(photos)
-            
-            return photos
-    except FileNotFoundError:
-        # Fichier n'existe pas encore, retourner liste vide
-        return []
-    except Exception as e:
-        print(f"Erreur lors du chargement de la galerie: {e}")
-        return []
+    """Charge la liste des photos (depuis le cache en mémoire si le stockage n'a pas changé)."""
+    return gallery_store.all()
 
 
 def save_gallery(gallery):
-    """Sauvegarde la liste des photos dans le JSON local."""
+    """Sauvegarde la liste des photos dans le stockage."""
     try:
-        with open(GALLERY_FILE, 'w') as f:
-            json.dump({'photos': gallery}, f, indent=2)
+        gallery_store.replace_all(gallery)
     except Exception as e:
         print(f"Erreur lors de la sauvegarde de la galerie: {e}")
         raise
 
 def get_categories():
-    """Récupère toutes les catégories uniques depuis la galerie."""
-    gallery = load_gallery()
-    categories = set()
-    for photo in gallery:
-        # Support ancien format (string) et nouveau format (list)
-        if photo.get('categories'):
-            categories.update(photo['categories'])
-        elif photo.get('category'):
-            categories.add(photo['category'])
-    return sorted(list(categories))
-
-def load_stats():
-    """Charge les statistiques de visites."""
-    try:
-        with open(STATS_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {
-            'unique_visits': set(),
-            'total_visits': 0
-        }
-
-def save_stats(stats):
-    """Sauvegarde les statistiques de visites."""
-    # Convertir le set en list pour JSON
-    stats_to_save = {
-        'unique_visits': list(stats['unique_visits']),
-        'total_visits': stats['total_visits']
-    }
-    with open(STATS_FILE, 'w') as f:
-        json.dump(stats_to_save, f, indent=2)
+    """Récupère toutes les catégories uniques (snapshot partagé, sinon index de la galerie)."""
+    view = current_snapshot()
+    if view is not None:
+        return view.category_names()
+    return gallery_store.categories()
 
 # Gestion des utilisateurs
 def load_users():
-    """Charge les utilisateurs depuis le JSON."""
-    try:
-        with open(USERS_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+    """Charge les utilisateurs (depuis le cache en mémoire)."""
+    return user_store.all()
 
 def save_users(users):
-    """Sauvegarde les utilisateurs dans le JSON."""
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f, indent=2)
+    """Sauvegarde les utilisateurs dans le stockage."""
+    user_store.replace_all(users)
 
 def hash_password(password):
     """Hash un mot de passe avec SHA256."""
@@ -156,78 +424,50 @@ def hash_password(password):
 
 def create_user(username, password):
     """Crée un nouvel utilisateur."""
-    users = load_users()
-    username_lower = username.lower()
-
-    # Vérifier si le nom d'utilisateur existe déjà (insensible à la casse)
-    for existing_username in users:
-        if existing_username.lower() == username_lower:
-            return False, "Nom d'utilisateur déjà pris"
-
-    users[username] = {
+    # Refus d'un nom déjà pris (insensible à la casse), vérifié aussi par le stockage
+    created = user_store.add(username, {
         'password': hash_password(password),
         'created_at': datetime.now().isoformat(),
         'is_admin': False
-    }
-    save_users(users)
+    })
+    if not created:
+        return False, "Nom d'utilisateur déjà pris"
     return True, "Compte créé avec succès"
 
 def authenticate_user(username, password):
     """Authentifie un utilisateur."""
-    users = load_users()
-    username_lower = username.lower()
-
     # Trouver l'utilisateur en ignorant la casse
-    actual_username = None
-    for existing_username in users:
-        if existing_username.lower() == username_lower:
-            actual_username = existing_username
-            break
+    actual_username, user = user_store.find(username)
 
     if actual_username is None:
         return False, "Utilisateur non trouvé"
 
-    if users[actual_username]['password'] != hash_password(password):
+    if user['password'] != hash_password(password):
         return False, "Mot de passe incorrect"
 
-    return True, users[actual_username]
+    return True, user
 
 # Gestion des messages
 def load_messages():
-    """Charge les messages depuis le JSON."""
-    try:
-        with open(MESSAGES_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
+    """Charge les messages (depuis le cache en mémoire)."""
+    return message_store.all()
 
 def save_messages(messages):
-    """Sauvegarde les messages dans le JSON."""
-    with open(MESSAGES_FILE, 'w') as f:
-        json.dump(messages, f, indent=2)
+    """Sauvegarde les messages dans le stockage."""
+    message_store.replace_all(messages)
 
 def get_user_messages(username):
     """Récupère les messages d'un utilisateur."""
-    messages = load_messages()
-    user_messages = [msg for msg in messages if msg['to'] == username]
-
-    # S'assurer que tous les messages ont la propriété 'read'
-    for msg in user_messages:
-        if 'read' not in msg:
-            msg['read'] = False
-
-    return user_messages
+    return message_store.for_user(username)
 
 def get_unread_count(username):
-    """Compte les messages non lus d'un utilisateur."""
-    messages = get_user_messages(username)
-    return len([msg for msg in messages if not msg.get('read', False)])
+    """Compte les messages non lus d'un utilisateur (compteur maintenu, sans parcourir les messages)."""
+    return message_store.unread_count(username)
 
 def send_message(from_user, to_user, subject, content, photo_ids=None):
     """Envoie un message."""
-    users = load_users()
     # Vérifier si le destinataire existe (utilisateur enregistré ou admin)
-    if to_user not in users and to_user not in ADMINS:
+    if not user_store.exists(to_user) and to_user not in ADMINS:
         return False, "Destinataire non trouvé"
 
     # Convertir photo_ids en liste si c'est une string
@@ -236,7 +476,6 @@ def send_message(from_user, to_user, subject, content, photo_ids=None):
     elif not photo_ids:
         photo_ids = []
 
-    messages = load_messages()
     message = {
         'id': str(uuid.uuid4()),
         'from': from_user,
@@ -247,34 +486,35 @@ def send_message(from_user, to_user, subject, content, photo_ids=None):
         'timestamp': datetime.now().isoformat(),
         'read': False
     }
-    messages.append(message)
-    save_messages(messages)
+    message_store.add(message)
     return True, "Message envoyé"
 
 def track_visit():
-    """Enregistre une visite unique."""
+    """Enregistre une visite unique (et la compte dans les tranches de la page demandée)."""
     if not session.get('visitor_id'):
         # Créer un ID unique pour ce visiteur
         session['visitor_id'] = str(uuid.uuid4())
-    
-    stats = load_stats()
-    # Convertir la list en set pour les opérations
-    if isinstance(stats['unique_visits'], list):
-        stats['unique_visits'] = set(stats['unique_visits'])
-    
-    visitor_id = session.get('visitor_id')
-    if visitor_id not in stats['unique_visits']:
-        stats['unique_visits'].add(visitor_id)
-    
-    stats['total_visits'] = stats.get('total_visits', 0) + 1
-    save_stats(stats)
+
+    visit_tracker.record(session.get('visitor_id'), page=request.path)
 
 def get_unique_visits_count():
-    """Retourne le nombre de visites uniques."""
-    stats = load_stats()
-    if isinstance(stats['unique_visits'], list):
-        return len(stats['unique_visits'])
-    return len(stats['unique_visits'])
+    """Retourne le nombre de visites uniques (agrégat, sans parcourir les visiteurs)."""
+    visit_tracker.flush()
+    unique, _ = storage.visit_counts()
+    return unique
+
+def get_visit_series():
+    """Visites des derniers jours et des dernières heures, par page, lues dans les agrégats par tranche.
+
+    Le coût ne dépend que du nombre de tranches affichées, pas de l'historique.
+    """
+    visit_tracker.flush()
+    series = {}
+    for granularity, count in (('day', VISITS_SERIES_DAYS), ('hour', VISITS_SERIES_HOURS)):
+        keys = series_keys(granularity, count)
+        rows = storage.visit_buckets(granularity, keys[0], keys[-1])
+        series[granularity] = fill_series(rows, keys, VISIT_PAGES)
+    return series
 
 
 def admin_required(f):
@@ -290,16 +530,38 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def first_gallery_page(limit):
+    """Première page de la galerie (plus récentes d'abord), incluse dans le HTML.
+
+    Même forme que /gallery?limit=...&fields=...&sort=-uploaded_at : les pages
+    suivantes sont chargées par le navigateur à partir de `next_cursor`.
+    Lue dans le snapshot partagé s'il existe, sans charger la galerie.
+    """
+    view = current_snapshot()
+    page = view.recent(limit) if view is not None else None
+    if page is None:
+        page = gallery_store.page(limit, descending=True)
+    photos, next_key = page
+    return {
+        'photos': [project(photo, GRID_FIELDS) for photo in photos],
+        'next_cursor': encode_cursor(next_key) if next_key else None
+    }
+
 @app.route('/')
 def index():
     track_visit()
-    return render_template('index.html')
+    return render_template('index.html', initial_page=first_gallery_page(HOME_PHOTOS))
 
 @app.route('/gallerie')
 def gallery_page():
-    """Page galerie publique avec filtrage par catégorie."""
+    """Page galerie publique avec filtrage par catégorie.
+
+    Les catégories et la première page sont rendues avec la page : les images
+    se chargent sans attendre /categories et /gallery.
+    """
     track_visit()
-    return render_template('gallery.html')
+    return render_template('gallery.html', initial_page=first_gallery_page(GALLERY_PAGE_SIZE),
+                           categories=get_categories())
 
 @app.route('/apropos')
 def perso():
@@ -321,21 +583,97 @@ def admin_stats():
     categories = get_categories()
     unique_visits = get_unique_visits_count()
     
+    counts = gallery_store.category_counts()
+
     stats = {
         'total_photos': len(gallery),
         'categories': len(categories),
         'unique_visits': unique_visits,
-        'photos_by_category': {}
+        'photos_by_category': {category: counts[category] for category in categories},
+        'visits': get_visit_series()
     }
-    
-    for category in categories:
-        stats['photos_by_category'][category] = len([
-            p for p in gallery 
-            if category in p.get('categories', [])
-        ])
-    
+
     return render_template('admin_stats.html', stats=stats, categories=categories, gallery=gallery)
 
+@app.route('/admin/cache-stats')
+@admin_required
+def admin_cache_stats():
+    """Compteurs des caches (galerie et réponses JSON) et des écritures."""
+    stats = {
+        'gallery': gallery_store.get_stats(),
+        'users': user_store.get_stats(),
+        'messages': message_store.get_stats(),
+        'notifications': unread_notifier.get_stats(),
+        'responses': response_cache.get_stats(),
+        'visits': visit_tracker.get_stats(),
+        'sync': cloudinary_sync.get_stats(),
+        'jobs': job_runner.get_stats(),
+        'startup': STARTUP_TIMINGS,
+        'snapshot': dict(gallery_snapshot.get_stats(), publisher=snapshot_publisher.get_stats())
+                    if gallery_snapshot is not None else None
+    }
+    if isinstance(storage, JsonStorage):
+        stats['writes'] = storage.writer.get_stats()
+    return jsonify(stats)
+
+@app.route('/admin/metrics')
+@admin_required
+def admin_metrics():
+    """Métriques du worker au format texte Prometheus."""
+    gallery_stats = gallery_store.get_stats()
+    message_stats = message_store.get_stats()
+    response_stats = response_cache.get_stats()
+    extra = (
+        gauge_lines('portfolio_photos', 'Photos dans la galerie', gallery_stats['photos'])
+        + gauge_lines('portfolio_messages', 'Messages en mémoire', message_stats['messages'])
+        + gauge_lines('portfolio_users', 'Utilisateurs en mémoire', user_store.get_stats()['users'])
+        + gauge_lines('portfolio_unread_subscribers', 'Connexions SSE et long-polling ouvertes',
+                      unread_notifier.get_stats()['subscribers'])
+        + counter_lines('portfolio_cache_hits_total', 'Lectures servies par les caches en mémoire', {
+            'gallery': gallery_stats['hits'], 'messages': message_stats['hits'],
+            'responses': response_stats['hits']}, label='cache')
+        + counter_lines('portfolio_cache_misses_total', 'Lectures ayant vérifié ou rechargé le stockage', {
+            'gallery': gallery_stats['misses'], 'messages': message_stats['misses'],
+            'responses': response_stats['misses']}, label='cache')
+        + gauge_lines('portfolio_jobs', "Tâches d'arrière-plan par statut", job_queue.counts(), label='status')
+        + gauge_lines('portfolio_startup_seconds', 'Durées de démarrage du worker', {
+            phase[:-3]: value / 1000 for phase, value in STARTUP_TIMINGS.items()}, label='phase')
+    )
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/export')
+@admin_required
+def admin_export():
+    """Export NDJSON de toutes les données, envoyé au fil de la lecture (voir data_export.py).
+
+    `?gzip=1` compresse le flux ; la mémoire utilisée ne dépend pas de la taille des données.
+    """
+    compress = request.args.get('gzip') == '1'
+    filename = f"export-{datetime.now():%Y%m%d-%H%M%S}.ndjson" + ('.gz' if compress else '')
+
+    def generate():
+        compressor = zlib.compressobj(wbits=31) if compress else None
+        chunk = []
+        size = 0
+        for line in export_lines(storage):
+            chunk.append(line)
+            size += len(line)
+            # Regrouper les lignes : un write par ligne serait trop coûteux
+            if size >= EXPORT_CHUNK_SIZE:
+                data = ''.join(chunk).encode('utf-8')
+                chunk, size = [], 0
+                yield compressor.compress(data) if compressor else data
+        data = ''.join(chunk).encode('utf-8')
+        if compressor:
+            yield compressor.compress(data) + compressor.flush()
+        elif data:
+            yield data
+
+    return Response(stream_with_context(generate()),
+                    mimetype='application/gzip' if compress else 'application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
 @app.route('/get-signature', methods=['GET'])
 def get_signature():
     """Génère une signature Cloudinary pour l'upload direct depuis le navigateur."""
@@ -343,9 +681,9 @@ def get_signature():
         return jsonify({'error': 'Cloudinary non configuré'}), 500
 
     try:
-        cloud_name = os.getenv('CLOUDINARY_CLOUD_NAME')
-        api_key = os.getenv('CLOUDINARY_API_KEY')
-        api_secret = os.getenv('CLOUDINARY_API_SECRET')
+        cloud_name = config.CLOUDINARY_CLOUD_NAME
+        api_key = config.CLOUDINARY_API_KEY
+        api_secret = config.CLOUDINARY_API_SECRET
         
         if not all([cloud_name, api_key, api_secret]):
             return jsonify({'error': 'Cloudinary non configuré'}), 500
@@ -375,6 +713,37 @@ def get_signature():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def build_photo(data):
+    """Construit une photo à partir des données d'upload. Lève ValueError si invalide."""
+    if not isinstance(data, dict):
+        raise ValueError('Objet JSON attendu')
+    public_id = data.get('public_id')
+    if not public_id:
+        raise ValueError('public_id manquant')
+    category = data.get('category', 'Non catégorisé')
+    photo = {
+        'id': str(uuid.uuid4()),
+        'public_id': public_id,
+        'url': build_cloudinary_url(public_id),
+        'uploaded_at': data.get('created_at', ''),
+        'categories': [category] if category else ['Non catégorisé'],
+        'description': data.get('description', '').strip(),
+        'title': data.get('title', '').strip()
+    }
+    add_variants(photo, build_cloudinary_url)
+    return photo
+
+def photo_changes(data):
+    """Champs modifiables d'une photo. Lève ValueError si les données ou les catégories sont invalides."""
+    if not isinstance(data, dict):
+        raise ValueError('Objet JSON attendu')
+    changes = {key: data[key] for key in ('categories', 'description', 'title') if key in data}
+    categories = changes.get('categories')
+    if 'categories' in changes and not (isinstance(categories, list)
+                                        and all(isinstance(c, str) for c in categories)):
+        raise ValueError('categories doit être une liste de noms')
+    return changes
+
 @app.route('/add-photo', methods=['POST'])
 def add_photo():
     """Ajoute une photo à la galerie après upload direct vers Cloudinary."""
@@ -382,30 +751,14 @@ def add_photo():
         return jsonify({'error': 'Cloudinary non configuré'}), 500
 
     try:
-        data = request.json
-        public_id = data.get('public_id')
-        uploaded_at = data.get('created_at', '')
-        title = data.get('title', '').strip()
-        description = data.get('description', '').strip()
-        category = data.get('category', 'Non catégorisé')
-
-        if not public_id:
-            return jsonify({'error': 'public_id manquant'}), 400
+        try:
+            new_photo = build_photo(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
         # Ajout à la galerie
-        gallery = load_gallery()
-        new_photo = {
-            'id': str(uuid.uuid4()),
-            'public_id': public_id,
-            'url': cloudinary.CloudinaryImage(public_id).build_url(secure=True),
-            'uploaded_at': uploaded_at,
-            'categories': [category] if category else ['Non catégorisé'],
-            'description': description,
-            'title': title
-        }
-        gallery.append(new_photo)
-        save_gallery(gallery)
-        
+        gallery_store.add(new_photo)
+
         return jsonify({
             'success': True,
             'photo': new_photo
@@ -413,14 +766,87 @@ def add_photo():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/batch-photos', methods=['POST'])
+@admin_required
+def batch_photos():
+    """Ajoute, modifie et supprime plusieurs photos en une seule écriture.
+
+    Corps JSON (toutes les listes sont optionnelles) :
+    - add : données d'upload, comme pour /add-photo
+    - update : {id, title?, description?, categories?}
+    - delete : ids des photos à supprimer
+    Retourne un résultat par élément, dans l'ordre reçu.
+    """
+    if not CLOUDINARY_CONFIGURED:
+        return jsonify({'error': 'Cloudinary non configuré'}), 500
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Corps JSON attendu'}), 400
+    add_items = data.get('add') or []
+    update_items = data.get('update') or []
+    delete_items = data.get('delete') or []
+    if not all(isinstance(items, list) for items in (add_items, update_items, delete_items)):
+        return jsonify({'error': 'add, update et delete doivent être des listes'}), 400
+    if len(add_items) + len(update_items) + len(delete_items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Lot trop grand (maximum {BATCH_MAX_ITEMS} éléments)'}), 400
+
+    # Validation élément par élément : un élément invalide n'empêche pas le reste du lot
+    results = {'add': [None] * len(add_items), 'update': [None] * len(update_items),
+               'delete': [None] * len(delete_items)}
+    new_photos, new_indexes = [], []
+    for i, item in enumerate(add_items):
+        try:
+            new_photos.append(build_photo(item))
+            new_indexes.append(i)
+        except ValueError as e:
+            results['add'][i] = {'success': False, 'error': str(e)}
+    updates, update_indexes = [], []
+    for i, item in enumerate(update_items):
+        if not isinstance(item, dict) or not item.get('id'):
+            results['update'][i] = {'success': False, 'error': 'id manquant'}
+            continue
+        try:
+            changes = photo_changes(item)
+        except ValueError as e:
+            results['update'][i] = {'success': False, 'id': item['id'], 'error': str(e)}
+            continue
+        updates.append((item['id'], changes))
+        update_indexes.append(i)
+    delete_ids, delete_indexes = [], []
+    for i, photo_id in enumerate(delete_items):
+        if not isinstance(photo_id, str) or not photo_id:
+            results['delete'][i] = {'success': False, 'error': 'id invalide'}
+            continue
+        delete_ids.append(photo_id)
+        delete_indexes.append(i)
+
+    try:
+        deleted_photos = gallery_store.get_many(delete_ids)
+        added, updated, deleted = gallery_store.apply_batch(new_photos, updates, delete_ids)
+        delete_remote_later(deleted_photos.get(photo_id) for photo_id, existed in zip(delete_ids, deleted) if existed)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    for i, photo in zip(new_indexes, added):
+        results['add'][i] = {'success': True, 'photo': photo}
+    for i, (photo_id, _), photo in zip(update_indexes, updates, updated):
+        results['update'][i] = ({'success': True, 'photo': photo} if photo is not None
+                                else {'success': False, 'id': photo_id, 'error': 'Photo non trouvée'})
+    for i, photo_id, existed in zip(delete_indexes, delete_ids, deleted):
+        results['delete'][i] = ({'success': True, 'id': photo_id} if existed
+                                else {'success': False, 'id': photo_id, 'error': 'Photo non trouvée'})
+
+    return jsonify({'success': True, 'results': results})
+
 @app.route('/delete-photo/<photo_id>', methods=['DELETE'])
 @admin_required
 def delete_photo(photo_id):
-    """Supprime une photo de la galerie."""
+    """Supprime une photo de la galerie (l'image Cloudinary est supprimée en tâche de fond)."""
     try:
-        gallery = load_gallery()
-        gallery = [p for p in gallery if p.get('id') != photo_id]
-        save_gallery(gallery)
+        photo = gallery_store.get(photo_id)
+        if gallery_store.delete(photo_id):
+            delete_remote_later([photo])
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -430,21 +856,14 @@ def delete_photo(photo_id):
 def update_photo(photo_id):
     """Met à jour les catégories et/ou la description d'une photo."""
     try:
-        data = request.json
-        gallery = load_gallery()
-        
-        for photo in gallery:
-            if photo.get('id') == photo_id:
-                if 'categories' in data:
-                    photo['categories'] = data['categories']
-                if 'description' in data:
-                    photo['description'] = data['description']
-                if 'title' in data:
-                    photo['title'] = data['title']
-                save_gallery(gallery)
-                return jsonify({'success': True, 'photo': photo})
-        
-        return jsonify({'error': 'Photo non trouvée'}), 404
+        try:
+            changes = photo_changes(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        photo = gallery_store.update(photo_id, changes)
+        if photo is None:
+            return jsonify({'error': 'Photo non trouvée'}), 404
+        return jsonify({'success': True, 'photo': photo})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -465,37 +884,110 @@ def create_category():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def gallery_from_snapshot(view):
+    """Galerie complète ou d'une catégorie : les seules variantes de /gallery pré-sérialisées."""
+    if not request.args:
+        return view.gallery()
+    if list(request.args) == ['category'] and request.args['category']:
+        return view.category(request.args['category'])
+    return None
+
 @app.route('/gallery')
+@snapshot_first(gallery_from_snapshot)
+@cached_json(response_cache, lambda: gallery_store.current_version())
 def get_gallery():
-    """API pour récupérer la galerie, avec filtrage optionnel par catégorie."""
+    """API pour récupérer la galerie, avec filtrage optionnel par catégorie.
+
+    Paramètres optionnels :
+    - limit / cursor : pagination par curseur, retourne {photos, next_cursor}
+    - fields : liste de champs à renvoyer, ex. fields=id,url,title
+    - sort : uploaded_at (plus anciennes d'abord) ou -uploaded_at (plus récentes d'abord)
+    Sans limit, la réponse reste une simple liste de photos.
+    """
     category = request.args.get('category', None)
-    gallery = load_gallery()
-    
-    if category:
-        filtered_gallery = []
-        for photo in gallery:
-            # Support ancien format (category: string) et nouveau format (categories: list)
-            photo_categories = []
-            if photo.get('categories'):
-                # Nouveau format : liste de catégories
-                photo_categories = photo['categories'] if isinstance(photo['categories'], list) else [photo['categories']]
-            elif photo.get('category'):
-                # Ancien format : une seule catégorie
-                photo_categories = [photo['category']]
-
-            # Vérifier si la catégorie recherchée est dans les catégories de la photo
-            if category in photo_categories:
-                filtered_gallery.append(photo)
-
-        gallery = filtered_gallery
-    
-    return jsonify(gallery)
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    sort = request.args.get('sort', '')
+    limit = request.args.get('limit')
+
+    if sort not in ('', 'uploaded_at', '-uploaded_at'):
+        return jsonify({'error': 'Tri invalide'}), 400
+
+    if limit is not None:
+        try:
+            limit = max(1, min(int(limit), GALLERY_MAX_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'limit invalide'}), 400
+        cursor = request.args.get('cursor')
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        photos, next_key = gallery_store.page(
+            limit, after=after, descending=(sort != 'uploaded_at'), category=category
+        )
+        return {
+            'photos': [project(photo, fields) for photo in photos],
+            'next_cursor': encode_cursor(next_key) if next_key else None
+        }
+
+    if sort:
+        gallery = gallery_store.sorted_photos(descending=(sort == '-uploaded_at'), category=category)
+    elif category:
+        gallery = gallery_store.by_category(category)
+    else:
+        gallery = load_gallery()
+
+    if fields:
+        gallery = [project(photo, fields) for photo in gallery]
+
+    return gallery
+
+@app.route('/gallery/search')
+@cached_json(response_cache, lambda: gallery_store.current_version())
+def search_gallery():
+    """API de recherche plein texte (titre, description, catégories), insensible aux accents.
+
+    Paramètres : q (requis), category, limit, cursor, fields.
+    Retourne {photos, next_cursor}, les photos étant classées par pertinence.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Paramètre q requis'}), 400
+
+    category = request.args.get('category', None)
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    try:
+        limit = max(1, min(int(request.args.get('limit', GALLERY_PAGE_SIZE)), GALLERY_MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit invalide'}), 400
+    cursor = request.args.get('cursor')
+    try:
+        after = decode_cursor(cursor, types=((int, float), str, str)) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    photos, next_key = gallery_store.search(query, limit, after=after, category=category)
+    return {
+        'photos': [project(photo, fields) for photo in photos],
+        'next_cursor': encode_cursor(next_key) if next_key else None
+    }
 
 @app.route('/categories')
+@snapshot_first(lambda view: view.categories())
+@cached_json(response_cache, lambda: gallery_store.current_version())
 def get_categories_api():
     """API pour récupérer toutes les catégories."""
-    categories = get_categories()
-    return jsonify(categories)
+    return get_categories()
+
+@app.route('/gallery/<photo_id>')
+@snapshot_first(lambda view, photo_id: view.photo(photo_id) or (jsonify({'error': 'Photo non trouvée'}), 404))
+def get_photo(photo_id):
+    """API pour récupérer une photo par son id."""
+    photo = gallery_store.get(photo_id)
+    if photo is None:
+        return jsonify({'error': 'Photo non trouvée'}), 404
+    return jsonify(photo)
 
 # Routes utilisateur
 @app.route('/register', methods=['GET', 'POST'])
@@ -558,27 +1050,25 @@ def user_logout():
 # Routes messagerie
 @app.route('/messages')
 def messages():
-    """Page de messagerie."""
+    """Page de messagerie (boîte de réception paginée, plus récents d'abord)."""
     if not session.get('user_logged_in'):
         return redirect(url_for('user_login'))
 
     username = session['username']
-    user_messages = get_user_messages(username)
-    # Marquer les messages comme lus quand on ouvre la page
-    messages_data = load_messages()
-    for msg in messages_data:
-        if msg['to'] == username and not msg.get('read', False):
-            msg['read'] = True
-    save_messages(messages_data)
-
-    # Récupérer la liste des utilisateurs pour envoyer des messages
-    users = load_users()
-    other_users = [u for u in users.keys() if u != username]
-
-    # Charger la galerie pour l'affichage des photos dans les messages
-    gallery = load_gallery()
+    page = max(1, request.args.get('page', 1, type=int))
+    # Copies des messages : l'état affiché est celui d'avant le marquage comme lus
+    user_messages, total = message_store.page(username, page, MESSAGES_PAGE_SIZE)
+    pages = max(1, -(-total // MESSAGES_PAGE_SIZE))
+
+    # Marquer comme lus les messages affichés (seuls ceux encore non lus sont réécrits)
+    message_store.mark_read(username, [msg['id'] for msg in user_messages if not msg['read']])
 
-    return render_template('messages.html', messages=user_messages, users=other_users, gallery=gallery)
+    # Seules les photos jointes aux messages de la page sont envoyées au template
+    photo_ids = {photo_id for msg in user_messages for photo_id in msg.get('photo_ids') or []}
+    photos = gallery_store.get_many(photo_ids)
+
+    return render_template('messages.html', messages=user_messages, photos=photos,
+                           page=page, pages=pages, total=total)
 
 @app.route('/send-message', methods=['POST'])
 def send_message_route():
@@ -600,14 +1090,79 @@ def send_message_route():
 
 @app.route('/api/messages/unread')
 def get_unread_messages():
-    """API pour récupérer le nombre de messages non lus."""
+    """API pour récupérer le nombre de messages non lus.
+
+    Long-polling (UNREAD_PUSH=1) : avec ?wait=<secondes>&since=<nombre connu>,
+    la réponse est retardée jusqu'à ce que le nombre change (ou jusqu'à expiration).
+    Sinon `wait` est ignoré et la réponse est immédiate.
+    """
     if not session.get('user_logged_in'):
         return jsonify({'unread': 0})
 
     username = session['username']
     unread_count = get_unread_count(username)
+
+    wait = request.args.get('wait', type=float) if config.UNREAD_PUSH else None
+    since = request.args.get('since', type=int)
+    if wait and since is not None and unread_count == since and unread_notifier.acquire():
+        try:
+            deadline = time.monotonic() + min(wait, UNREAD_LONG_POLL_TIMEOUT)
+            seen = unread_notifier.version(username)
+            while unread_count == since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                new_version = unread_notifier.wait(username, seen, min(remaining, UNREAD_CHECK_INTERVAL))
+                if new_version is not None:
+                    seen = new_version
+                unread_count = get_unread_count(username)
+        finally:
+            unread_notifier.release()
+
     return jsonify({'unread': unread_count})
 
+@app.route('/api/messages/stream')
+def unread_messages_stream():
+    """Flux Server-Sent Events du nombre de messages non lus, avec heartbeats.
+
+    Le flux se ferme après UNREAD_STREAM_DURATION secondes et le navigateur se
+    reconnecte ; au-delà de UNREAD_MAX_SUBSCRIBERS connexions, la route répond
+    503 et le client repasse en long-polling. Désactivé (404) sans UNREAD_PUSH=1.
+    """
+    if not config.UNREAD_PUSH:
+        return jsonify({'error': 'Flux désactivé'}), 404
+    if not session.get('user_logged_in'):
+        return jsonify({'error': 'Non connecté'}), 401
+    if not unread_notifier.acquire():
+        return jsonify({'error': 'Trop de connexions'}), 503, {'Retry-After': '30'}
+
+    username = session['username']
+
+    def generate():
+        yield 'retry: 5000\n\n'
+        deadline = time.monotonic() + UNREAD_STREAM_DURATION
+        last_count = None
+        last_sent = time.monotonic()
+        seen = unread_notifier.version(username)
+        while time.monotonic() < deadline:
+            unread_count = get_unread_count(username)
+            if unread_count != last_count:
+                yield f'event: unread\ndata: {json.dumps({"unread": unread_count})}\n\n'
+                last_count = unread_count
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= UNREAD_HEARTBEAT_INTERVAL:
+                yield ': heartbeat\n\n'
+                last_sent = time.monotonic()
+            new_version = unread_notifier.wait(username, seen, UNREAD_CHECK_INTERVAL)
+            if new_version is not None:
+                seen = new_version
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Libérer la place même si le client se déconnecte avant le premier événement
+    response.call_on_close(unread_notifier.release)
+    return response
+
 @app.route('/api/messages/mark-read', methods=['POST'])
 def mark_message_read():
     """API pour marquer un message comme lu."""
@@ -620,73 +1175,91 @@ def mark_message_read():
     if not message_id:
         return jsonify({'success': False, 'error': 'ID de message requis'})
 
-    # Charger les messages et marquer comme lu
-    messages = load_messages()
-    for msg in messages:
-        if str(msg.get('id')) == str(message_id) and msg['to'] == username:
-            msg['read'] = True
-            save_messages(messages)
-            return jsonify({'success': True})
+    # Marquer le message comme lu
+    if message_store.mark_read(username, [message_id]):
+        return jsonify({'success': True})
 
     return jsonify({'success': False, 'error': 'Message non trouvé'})
 
 @app.route('/api/users')
+@cached_json(response_cache, lambda: storage.users_signature(), key=session_username,
+             cache_control='private, no-cache', vary=['Cookie'])
 def get_users():
     """API pour récupérer la liste des utilisateurs disponibles pour l'envoi de messages."""
     if not session.get('user_logged_in'):
-        return jsonify({'users': []})
+        return {'users': []}
 
     current_username = session['username']
-    users = load_users()
 
     # Pour les admins, retourner tous les utilisateurs sauf eux-mêmes
     if current_username in ADMINS:
-        available_users = [u for u in users.keys() if u != current_username]
+        available_users = [u for u in user_store.usernames() if u != current_username]
     else:
         # Pour les utilisateurs normaux, seulement les admins
         available_users = [admin for admin in ADMINS if admin != current_username]
 
-    return jsonify({'users': available_users})
+    return {'users': available_users}
 
 @app.route('/rebuild-gallery', methods=['POST'])
+@admin_required
 def rebuild_gallery():
-    """Reconstruit la galerie depuis toutes les images dans le dossier portfolio/ sur Cloudinary."""
+    """Synchronise la galerie avec les images du dossier portfolio/ sur Cloudinary.
+
+    Les nouvelles images sont ajoutées, les images supprimées de Cloudinary sont
+    retirées, et les titres/descriptions/catégories existants sont conservés.
+    Paramètres (JSON ou query string) : `full` pour forcer une synchronisation
+    complète, `since` (date ISO) pour ne lire que les images créées depuis.
+    Répond tout de suite (202) avec l'id de la tâche, à suivre sur /admin/jobs/<id>.
+    """
     if not CLOUDINARY_CONFIGURED:
         return jsonify({'error': 'Cloudinary non configuré'}), 500
 
-    try:
-        # Récupérer toutes les images du dossier portfolio/
-        result = cloudinary.api.resources(
-            type='upload',
-            prefix='portfolio/',
-            resource_type='image',
-            max_results=500
-        )
-        
-        gallery = []
-        for resource in result.get('resources', []):
-            photo = {
-                'id': str(uuid.uuid4()),
-                'public_id': resource['public_id'],
-                'url': cloudinary.CloudinaryImage(resource['public_id']).build_url(secure=True),
-                'uploaded_at': resource.get('created_at', ''),
-                'categories': ['Non catégorisé'], # Default category
-                'description': '',
-                'title': ''
-            }
-            gallery.append(photo)
-        
-        # Sauvegarder la galerie reconstruite
-        save_gallery(gallery)
-        
-        return jsonify({
-            'success': True,
-            'message': f'Galerie reconstruite avec {len(gallery)} photos',
-            'count': len(gallery)
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    data = request.get_json(silent=True) or {}
+    full = str(data.get('full', request.args.get('full', ''))).lower() in ('1', 'true')
+    since = data.get('since') or request.args.get('since') or None
+
+    # La synchronisation (appels à l'Admin API, réécriture de la galerie) part en tâche de fond
+    job_id = submit_job('rebuild_gallery', {'full': full, 'since': since})
+    return jsonify({
+        'success': True,
+        'message': 'Synchronisation de la galerie lancée',
+        'job_id': job_id,
+        'status_url': url_for('admin_job', job_id=job_id)
+    }), 202
+
+@app.route('/admin/variants', methods=['POST'])
+@admin_required
+def admin_variants():
+    """Lance le calcul des variantes manquantes (`{"force": true}` pour tout recalculer)."""
+    data = request.get_json(silent=True) or {}
+    job_id = submit_job('generate_variants', {'force': bool(data.get('force'))})
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': url_for('admin_job', job_id=job_id)}), 202
+
+@app.route('/admin/jobs')
+@admin_required
+def admin_jobs():
+    """Dernières tâches d'arrière-plan et nombre de tâches par statut (paramètre : limit)."""
+    # Avec type=int, une valeur non entière donne la valeur par défaut (None)
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        if 'limit' in request.args:
+            return jsonify({'error': 'limit invalide'}), 400
+        limit = JOBS_PAGE_SIZE
+    limit = max(1, min(limit, JOBS_MAX_PAGE_SIZE))
+    return jsonify({'jobs': job_queue.recent(limit), 'counts': job_queue.counts()})
+
+@app.route('/admin/jobs/<job_id>')
+@admin_required
+def admin_job(job_id):
+    """État d'une tâche : statut, tentatives, avancement, résultat ou dernière erreur."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Tâche non trouvée'}), 404
+    return jsonify(job)
+
+
+_import_end = time.perf_counter()
 
-# Pour PythonAnywhere, pas de app.run() - le serveur WSGI gère cela
+# Pour PythonAnywhere, pas de app.run() - le serveur WSGI gère cela (voir wsgi.py)
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,640 @@
+# -*- coding: utf-8 -*-
+"""Benchmark de latence de toutes les routes de l'application.
+
+Génère un stockage synthétique (photos, utilisateurs, messages, visites) dans
+un dossier temporaire, puis appelle chaque route avec le client de test Flask
+et/ou un serveur WSGI local, et mesure débit et latences p50/p95/p99.
+
+    python bench.py --preset small
+    python bench.py --preset large --backend sqlite --driver wsgi --concurrency 8
+    python bench.py --save bench_baseline.json
+    python bench.py --compare bench_baseline.json --tolerance 0.25
+
+    python bench.py --memory [--variants]
+
+Avec --compare, le code de sortie vaut 1 si le p95 d'une route dépasse celui
+de la référence de plus de `tolerance` (régression).
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+PRESETS = {
+    'small': {'photos': 2000, 'users': 1000, 'messages': 20000, 'visitors': 5000},
+    'medium': {'photos': 20000, 'users': 10000, 'messages': 200000, 'visitors': 50000},
+    'large': {'photos': 100000, 'users': 50000, 'messages': 1000000, 'visitors': 500000},
+}
+
+BENCH_PASSWORD = 'benchpass'
+ADMIN_USERNAME = 'Urioxi'
+BENCH_USERNAME = 'user00000'
+CATEGORIES = ['Nature', 'Portrait', 'Voyage', 'Concert', 'Architecture', 'Animaux', 'Noir et blanc',
+              'Mariage', 'Sport', 'Nuit', 'Mer', 'Montagne']
+WORDS = ['lumière', 'coucher', 'soleil', 'bateau', 'forêt', 'ville', 'rue', 'portrait', 'scène', 'concert',
+         'montagne', 'neige', 'plage', 'vague', 'reflet', 'brume', 'chat', 'chien', 'oiseau', 'fleur',
+         'pont', 'gare', 'marché', 'café', 'église', 'château', 'lac', 'rivière', 'été', 'hiver']
+GRID_FIELDS = 'id,url,title,description,variants.grid,variants.slider,variants.fullscreen'
+
+
+# --- Données synthétiques ---
+def generate_data(photos, users, messages, seed=0, variants=False):
+    """Génère (photos, utilisateurs, messages) reproductibles."""
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    gallery = []
+    for i in range(photos):
+        public_id = f'portfolio/bench{i:07d}{rng.randrange(36 ** 6):06x}'
+        photo = {
+            'id': f'{i:08d}-{rng.getrandbits(64):016x}',
+            'public_id': public_id,
+            'url': f'https://res.cloudinary.com/bench/image/upload/v1/{public_id}',
+            'uploaded_at': (start + timedelta(minutes=i)).isoformat(),
+            'categories': rng.sample(CATEGORIES, rng.choice((1, 1, 2))),
+            'description': ' '.join(rng.choices(WORDS, k=rng.randrange(0, 12))),
+            'title': ' '.join(rng.choices(WORDS, k=rng.randrange(1, 4))).capitalize()
+        }
+        if variants:
+            from image_variants import build_variants
+            photo['variants'] = build_variants(public_id, lambda pid, **t: (
+                'https://res.cloudinary.com/bench/image/upload/'
+                + ','.join(f'{k}_{v}' for k, v in sorted(t.items())) + '/v1/' + pid))
+        gallery.append(photo)
+
+    password = hashlib.sha256(BENCH_PASSWORD.encode()).hexdigest()
+    usernames = [f'user{i:05d}' for i in range(users)]
+    user_records = {
+        username: {'password': password, 'created_at': start.isoformat(), 'is_admin': False}
+        for username in usernames + [ADMIN_USERNAME]
+    }
+
+    message_list = []
+    recipients = usernames or [ADMIN_USERNAME]
+    for i in range(messages):
+        # 1 % des messages vont à l'admin : une boîte de réception chargée
+        to_user = ADMIN_USERNAME if rng.random() < 0.01 else rng.choice(recipients)
+        message_list.append({
+            'id': f'm{i:08d}',
+            'from': rng.choice(recipients),
+            'to': to_user,
+            'subject': ' '.join(rng.choices(WORDS, k=3)),
+            'content': ' '.join(rng.choices(WORDS, k=20)),
+            'photo_ids': [gallery[rng.randrange(photos)]['id'] for _ in range(rng.choice((0, 0, 1, 2)))] if photos else [],
+            'timestamp': (start + timedelta(seconds=i * 30)).isoformat(),
+            'read': rng.random() < 0.7
+        })
+    return gallery, user_records, message_list
+
+
+def build_store(directory, backend, scale, seed=0, variants=False):
+    """Écrit un stockage synthétique dans `directory`. Retourne les données générées."""
+    from migrations import SCHEMA_VERSION
+    from storage import JsonStorage, SqliteStorage
+
+    photos, users, messages = generate_data(scale['photos'], scale['users'], scale['messages'], seed, variants)
+    if backend == 'sqlite':
+        storage = SqliteStorage(os.path.join(directory, 'portfolio.db'))
+    else:
+        storage = JsonStorage(*(os.path.join(directory, name) for name in
+                                ('data.json', 'users.json', 'messages.json', 'stats.json')), compact=True)
+    for ticket in (storage.save_photos(photos), storage.save_users(users), storage.save_messages(messages)):
+        if ticket is not None:
+            ticket.wait()
+    storage.set_schema_version(SCHEMA_VERSION)
+    visitors = {f'visitor-{i}' for i in range(scale['visitors'])}
+    storage.record_visits(visitors, scale['visitors'] * 3)
+    return photos, users, messages
+
+
+# --- Scénarios ---
+class BenchContext:
+    """Identifiants utilisés par les scénarios (photos à supprimer, messages à lire...)."""
+
+    def __init__(self, photos, users, messages):
+        # Les 10 % les plus récents sont réservés aux suppressions
+        reserved = len(photos) // 10
+        self.photo_ids = [photo['id'] for photo in photos[:len(photos) - reserved]]
+        deletable = [photo['id'] for photo in photos[len(photos) - reserved:]]
+        self.usernames = [u for u in users if u != ADMIN_USERNAME]
+        self.message_ids = [m['id'] for m in messages if m['to'] == BENCH_USERNAME] or ['absent']
+        self.search_terms = WORDS
+        # Tâche suivie par GET /admin/jobs/<job_id> (créée une fois l'application importée)
+        self.job_id = 'absent'
+        self._deletable = iter(reversed(deletable))
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def next_deletable(self):
+        with self._lock:
+            return next(self._deletable, 'absent')
+
+    def unique(self):
+        with self._lock:
+            return next(self._counter)
+
+    def photo(self, i):
+        return self.photo_ids[i % len(self.photo_ids)] if self.photo_ids else 'absent'
+
+
+class Scenario:
+    """Une requête type sur une route. `path` et `body` peuvent dépendre de l'itération."""
+
+    def __init__(self, name, rule, path, method='GET', role='anon', body=None, form=None,
+                 stream=False, weight=1.0):
+        self.name = name
+        self.rule = rule
+        self.path = path
+        self.method = method
+        self.role = role
+        self.body = body
+        self.form = form
+        self.stream = stream
+        # Fraction du nombre d'itérations (routes lentes ou destructrices)
+        self.weight = weight
+
+    def request(self, ctx, i):
+        """Retourne (chemin, json, form) pour l'itération i."""
+        path = self.path(ctx, i) if callable(self.path) else self.path
+        body = self.body(ctx, i) if callable(self.body) else self.body
+        form = self.form(ctx, i) if callable(self.form) else self.form
+        return path, body, form
+
+
+SCENARIOS = [
+    # Pages publiques (visiteur sans cookie : nouvelle visite à chaque requête)
+    Scenario('GET / (nouveau visiteur)', '/', '/', role='visitor'),
+    Scenario('GET /gallerie', '/gallerie', '/gallerie'),
+    Scenario('GET /apropos', '/apropos', '/apropos'),
+    Scenario('GET /register', '/register', '/register'),
+    Scenario('GET /user/login', '/user/login', '/user/login'),
+    Scenario('GET /logout', '/logout', '/logout'),
+    Scenario('GET /user/logout', '/user/logout', '/user/logout'),
+    # API galerie
+    Scenario('GET /gallery (première page)', '/gallery',
+             f'/gallery?limit=24&fields={GRID_FIELDS}&sort=-uploaded_at'),
+    Scenario('GET /gallery?category', '/gallery',
+             lambda ctx, i: f'/gallery?limit=24&sort=-uploaded_at&category={CATEGORIES[i % len(CATEGORIES)]}'),
+    Scenario('GET /gallery (complète)', '/gallery', '/gallery', weight=0.1),
+    Scenario('GET /gallery/search', '/gallery/search',
+             lambda ctx, i: f'/gallery/search?limit=24&q={ctx.search_terms[i % len(ctx.search_terms)]}'),
+    Scenario('GET /categories', '/categories', '/categories'),
+    Scenario('GET /gallery/<photo_id>', '/gallery/<photo_id>', lambda ctx, i: f'/gallery/{ctx.photo(i * 31)}'),
+    Scenario('GET /get-signature', '/get-signature', '/get-signature'),
+    # Utilisateur connecté
+    Scenario('GET /api/messages/unread', '/api/messages/unread', '/api/messages/unread', role='user'),
+    Scenario('GET /api/messages/stream (premier événement)', '/api/messages/stream',
+             '/api/messages/stream', role='user', stream=True),
+    Scenario('GET /api/users', '/api/users', '/api/users', role='user'),
+    Scenario('GET /messages', '/messages', '/messages', role='user', weight=0.5),
+    Scenario('GET /messages (admin)', '/messages', '/messages', role='admin', weight=0.2),
+    Scenario('POST /api/messages/mark-read', '/api/messages/mark-read', '/api/messages/mark-read',
+             method='POST', role='user',
+             body=lambda ctx, i: {'message_id': ctx.message_ids[i % len(ctx.message_ids)]}),
+    Scenario('POST /send-message', '/send-message', '/send-message', method='POST', role='user',
+             form=lambda ctx, i: {'to_user': ctx.usernames[i % len(ctx.usernames)] if ctx.usernames else ADMIN_USERNAME,
+                                  'subject': 'Bench', 'content': 'Message de test', 'photo_ids': ctx.photo(i)}),
+    Scenario('POST /user/login', '/user/login', '/user/login', method='POST',
+             form={'username': BENCH_USERNAME, 'password': BENCH_PASSWORD}),
+    Scenario('POST /register', '/register', '/register', method='POST', weight=0.5,
+             form=lambda ctx, i: {'username': f'bench-new-{ctx.unique()}', 'password': BENCH_PASSWORD,
+                                  'confirm_password': BENCH_PASSWORD}),
+    # Administration
+    Scenario('GET /admin/stats', '/admin/stats', '/admin/stats', role='admin', weight=0.2),
+    Scenario('GET /admin/cache-stats', '/admin/cache-stats', '/admin/cache-stats', role='admin'),
+    Scenario('GET /admin/metrics', '/admin/metrics', '/admin/metrics', role='admin'),
+    Scenario('GET /admin/export (gzip)', '/admin/export', '/admin/export?gzip=1', role='admin', weight=0.02),
+    Scenario('GET /admin/jobs', '/admin/jobs', '/admin/jobs', role='admin'),
+    Scenario('GET /admin/jobs/<id>', '/admin/jobs/<job_id>', lambda ctx, i: f'/admin/jobs/{ctx.job_id}', role='admin'),
+    Scenario('POST /create-category', '/create-category', '/create-category', method='POST', role='admin',
+             body={'name': 'Bench'}),
+    Scenario('PUT /update-photo', '/update-photo/<photo_id>',
+             lambda ctx, i: f'/update-photo/{ctx.photo(i * 7919)}', method='PUT', role='admin',
+             body=lambda ctx, i: {'title': f'Titre {i}', 'categories': [CATEGORIES[i % len(CATEGORIES)]]}),
+    Scenario('POST /add-photo', '/add-photo', '/add-photo', method='POST', role='admin',
+             body=lambda ctx, i: {'public_id': f'portfolio/bench-add-{ctx.unique()}', 'title': 'Ajout',
+                                  'category': 'Bench'}),
+    Scenario('POST /batch-photos (50 éléments)', '/batch-photos', '/batch-photos', method='POST',
+             role='admin', weight=0.2,
+             body=lambda ctx, i: {'add': [{'public_id': f'portfolio/bench-batch-{ctx.unique()}', 'category': 'Bench'}
+                                          for _ in range(25)],
+                                  'update': [{'id': ctx.photo(i * 25 + k), 'description': 'Lot'} for k in range(25)]}),
+    Scenario('DELETE /delete-photo', '/delete-photo/<photo_id>',
+             lambda ctx, i: f'/delete-photo/{ctx.next_deletable()}', method='DELETE', role='admin'),
+    Scenario('POST /rebuild-gallery', '/rebuild-gallery', '/rebuild-gallery', method='POST', role='admin',
+             body={'full': True}, weight=0.02),
+    Scenario('POST /admin/variants', '/admin/variants', '/admin/variants', method='POST', role='admin',
+             weight=0.02),
+]
+
+
+# --- Statistiques ---
+def percentile(sorted_values, p):
+    """Percentile au rang le plus proche d'une liste triée."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def summarize(latencies, statuses, wall_time):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'count': count,
+        # Toute réponse hors 2xx/3xx est une erreur : une 404 rapide ne doit pas passer pour une mesure
+        'errors': sum(1 for status in statuses if not 200 <= status < 400),
+        'statuses': {str(status): statuses.count(status) for status in sorted(set(statuses))},
+        'throughput_rps': round(count / wall_time, 1) if wall_time else 0.0,
+        'mean_ms': round(sum(latencies) / count, 3) if count else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(latencies[-1], 3) if count else 0.0,
+    }
+
+
+# --- Exécution ---
+class TestClientDriver:
+    """Requêtes en mémoire via le client de test Flask (pas de réseau)."""
+
+    name = 'client'
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self, role):
+        client = self.app.test_client(use_cookies=(role != 'visitor'))
+        if role in ('user', 'admin'):
+            username = ADMIN_USERNAME if role == 'admin' else BENCH_USERNAME
+            client.post('/user/login', data={'username': username, 'password': BENCH_PASSWORD})
+        return client
+
+    def send(self, client, scenario, path, body, form):
+        if scenario.stream:
+            response = client.open(path, method=scenario.method, buffered=False)
+            for chunk in response.response:
+                if b'event:' in (chunk if isinstance(chunk, bytes) else chunk.encode()):
+                    break
+            response.close()
+            return response.status_code
+        response = client.open(path, method=scenario.method, json=body, data=form)
+        response.close()
+        return response.status_code
+
+
+class WsgiDriver:
+    """Requêtes HTTP réelles vers un serveur WSGI local (threads)."""
+
+    name = 'wsgi'
+
+    def __init__(self, app):
+        import requests
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self._requests = requests
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def session(self, role):
+        session = self._requests.Session()
+        if role in ('user', 'admin'):
+            username = ADMIN_USERNAME if role == 'admin' else BENCH_USERNAME
+            session.post(self.base_url + '/user/login', data={'username': username, 'password': BENCH_PASSWORD},
+                         allow_redirects=False)
+        return session
+
+    def send(self, session, scenario, path, body, form):
+        if scenario.role == 'visitor':
+            session.cookies.clear()
+        if scenario.stream:
+            with session.get(self.base_url + path, stream=True) as response:
+                for chunk in response.iter_content(chunk_size=None):
+                    if b'event:' in chunk:
+                        break
+                return response.status_code
+        response = session.request(scenario.method, self.base_url + path, json=body, data=form,
+                                   allow_redirects=False)
+        return response.status_code
+
+    def close(self):
+        self.server.shutdown()
+
+
+def run_scenario(driver, scenario, ctx, iterations, concurrency=1, warmup=3):
+    """Exécute un scénario et retourne ses statistiques."""
+    count = max(1, int(iterations * scenario.weight))
+    sessions = [driver.session(scenario.role) for _ in range(concurrency)]
+    for i in range(min(warmup, count)):
+        driver.send(sessions[0], scenario, *scenario.request(ctx, i))
+
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def worker(session):
+        while True:
+            i = next(counter)
+            if i >= count:
+                return
+            path, body, form = scenario.request(ctx, warmup + i)
+            start = time.perf_counter()
+            try:
+                status = driver.send(session, scenario, path, body, form)
+            except Exception as e:
+                print(f"  {scenario.name}: {e}")
+                status = 599
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(status)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(session,)) for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def uncovered_routes(app):
+    """Routes de l'application sans scénario de benchmark."""
+    covered = {scenario.rule for scenario in SCENARIOS}
+    return sorted(rule.rule for rule in app.url_map.iter_rules()
+                  if rule.endpoint != 'static' and rule.rule not in covered)
+
+
+def compare(results, baseline, tolerance, min_delta_ms=1.0):
+    """Liste des régressions (p95) par rapport à une référence.
+
+    Les écarts de moins de `min_delta_ms` sont ignorés (bruit sur les routes rapides).
+    """
+    regressions = []
+    for key, stats in results['routes'].items():
+        reference = baseline.get('routes', {}).get(key)
+        if not reference or not reference['p95_ms']:
+            continue
+        if (stats['p95_ms'] > reference['p95_ms'] * (1 + tolerance)
+                and stats['p95_ms'] - reference['p95_ms'] >= min_delta_ms):
+            regressions.append((key, reference['p95_ms'], stats['p95_ms']))
+    return regressions
+
+
+# --- Mémoire de la galerie ---
+MEMORY_MODES = {
+    'dicts': 'dicts (load_photos, format d\'avant)',
+    'records': 'PhotoRecord (load_photo_records)',
+    'store': 'GalleryStore complet (PhotoRecord + index)',
+}
+
+
+def resident_size():
+    """Mémoire résidente du processus, en octets."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def release_free_memory():
+    """Rend au système la mémoire libérée par malloc (glibc), pour une RSS représentative."""
+    try:
+        import ctypes
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def measure_memory(mode, path, metric):
+    """Charge la galerie de `path` sous la forme `mode` et mesure la mémoire occupée.
+
+    metric : 'traced' (taille des objets Python vivants, tracemalloc) ou 'rss'
+    (mémoire résidente, mesurée sans tracemalloc qui en consomme lui-même).
+    """
+    import gc
+    import tracemalloc
+    from gallery_store import GalleryStore
+    from storage import JsonStorage
+
+    gc.collect()
+    release_free_memory()
+    before = resident_size()
+    if metric == 'traced':
+        tracemalloc.start()
+    if mode == 'store':
+        kept = GalleryStore(JsonStorage(path))
+        count = len(kept.all())
+    else:
+        storage = JsonStorage(path)
+        kept = storage.load_photo_records() if mode == 'records' else storage.load_photos()
+        count = len(kept)
+    gc.collect()
+    if metric == 'traced':
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    else:
+        release_free_memory()
+        size = resident_size() - before
+    return {'photos': count, 'bytes': size}
+
+
+def memory_benchmark(count, variants, seed):
+    """Mémoire par 100 000 photos de chaque représentation (un processus par mesure)."""
+    photos, _, _ = generate_data(count, 0, 0, seed, variants)
+    directory = tempfile.mkdtemp(prefix='portfolio-bench-memory-')
+    path = os.path.join(directory, 'data.json')
+    with open(path, 'w') as f:
+        json.dump({'schema_version': 1, 'photos': photos}, f, separators=(',', ':'))
+    del photos
+    results = {}
+    try:
+        for mode, label in MEMORY_MODES.items():
+            results[mode] = {'label': label}
+            for metric in ('traced', 'rss'):
+                output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                                  '--memory-child', mode, path, metric])
+                stats = json.loads(output)
+                per_100k = stats['bytes'] * 100000 / max(1, stats['photos'])
+                results[mode][f'{metric}_mb_per_100k'] = round(per_100k / 2 ** 20, 1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de latence des routes du portfolio')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--photos', type=int)
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--messages', type=int)
+    parser.add_argument('--visitors', type=int)
+    parser.add_argument('--variants', action='store_true', help="Générer les variantes d'images des photos")
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--driver', choices=['client', 'wsgi', 'both'], default='both')
+    parser.add_argument('--iterations', type=int, default=200, help='Requêtes par scénario')
+    parser.add_argument('--concurrency', type=int, default=4, help='Clients simultanés (serveur WSGI)')
+    parser.add_argument('--only', help='Ne lancer que les scénarios dont le nom contient ce texte')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='Enregistrer les résultats (JSON) dans ce fichier')
+    parser.add_argument('--compare', help='Comparer à une référence JSON enregistrée avec --save')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Hausse de p95 tolérée (0.25 = +25 %%)')
+    parser.add_argument('--min-delta', type=float, default=1.0, help='Hausse de p95 ignorée en dessous (ms)')
+    parser.add_argument('--keep', action='store_true', help='Conserver le dossier de données généré')
+    parser.add_argument('--memory', action='store_true',
+                        help='Mesurer la mémoire de la galerie (dicts / PhotoRecord) au lieu des routes')
+    parser.add_argument('--memory-child', nargs=3, metavar=('MODE', 'FICHIER', 'MESURE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    # Chemins donnés par rapport au dossier de l'appelant (le benchmark change de dossier)
+    for name in ('save', 'compare'):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    if args.memory_child:
+        print(json.dumps(measure_memory(*args.memory_child)))
+        return
+    if args.memory:
+        count = args.photos or 100000
+        print(f"Mémoire de la galerie ({count} photos{', avec variantes' if args.variants else ''}), par 100 000 photos :")
+        results = memory_benchmark(count, args.variants, args.seed)
+        print(f"{'représentation':<46} {'objets (Mo)':>12} {'RSS (Mo)':>10}")
+        for stats in results.values():
+            print(f"{stats['label']:<46} {stats['traced_mb_per_100k']:>12.1f} {stats['rss_mb_per_100k']:>10.1f}")
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump({'meta': {'date': datetime.now().isoformat(timespec='seconds'), 'revision': git_revision(),
+                                    'python': platform.python_version(), 'photos': count,
+                                    'variants': args.variants},
+                           'memory': results}, f, indent=2, ensure_ascii=False)
+        return
+
+    scale = dict(PRESETS[args.preset])
+    for key in scale:
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+
+    # Les chemins de l'application sont relatifs au dossier courant
+    directory = tempfile.mkdtemp(prefix='portfolio-bench-')
+    caller_directory = os.getcwd()
+    os.chdir(directory)
+    print(f"Génération des données ({scale}) dans {directory}...")
+    start = time.perf_counter()
+    photos, users, messages = build_store(directory, args.backend, scale, args.seed, args.variants)
+    print(f"  terminé en {time.perf_counter() - start:.1f} s")
+
+    # Bouchon local de l'Admin API Cloudinary pour /rebuild-gallery
+    from cloudinary_stub import StubAdminApi, make_handler
+    from http.server import ThreadingHTTPServer
+    stub = StubAdminApi([StubAdminApi.make_resource(photo['public_id']) for photo in photos])
+    stub_server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(stub))
+    threading.Thread(target=stub_server.serve_forever, daemon=True).start()
+
+    os.environ.update({
+        'STORAGE_BACKEND': args.backend,
+        'SQLITE_PATH': os.path.join(directory, 'portfolio.db'),
+        'CLOUDINARY_CLOUD_NAME': 'bench',
+        'CLOUDINARY_API_KEY': 'bench',
+        'CLOUDINARY_API_SECRET': 'bench',
+        'CLOUDINARY_UPLOAD_PREFIX': f'http://127.0.0.1:{stub_server.server_port}',
+        # Flux SSE activé pour mesurer /api/messages/stream (désactivé par défaut, voir config.py)
+        'UNREAD_PUSH': '1',
+        # Un flux SSE fermé par le client ne libère sa place qu'au réveil suivant
+        'UNREAD_MAX_SUBSCRIBERS': str(max(1000, args.iterations * 2)),
+    })
+    start = time.perf_counter()
+    import app as portfolio
+    portfolio.create_app()
+    print(f"Démarrage de l'application : {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    missing = uncovered_routes(portfolio.app)
+    if missing:
+        print(f"Routes sans scénario : {', '.join(missing)}")
+
+    drivers = []
+    if args.driver in ('client', 'both'):
+        drivers.append(TestClientDriver(portfolio.app))
+    if args.driver in ('wsgi', 'both'):
+        drivers.append(WsgiDriver(portfolio.app))
+
+    results = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'backend': args.backend,
+            'scale': scale,
+            'iterations': args.iterations,
+            'concurrency': args.concurrency,
+        },
+        'routes': {}
+    }
+    ctx = BenchContext(photos, users, messages)
+    ctx.job_id = portfolio.job_queue.submit('rebuild_gallery', {'full': False})
+    scenarios = [s for s in SCENARIOS if not args.only or args.only in s.name]
+    for driver in drivers:
+        print(f"\n[{driver.name}]")
+        print(f"{'scénario':<48} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'err':>4}")
+        for scenario in scenarios:
+            concurrency = args.concurrency if driver.name == 'wsgi' else 1
+            stats = run_scenario(driver, scenario, ctx, args.iterations, concurrency)
+            results['routes'][f'{driver.name} {scenario.name}'] = stats
+            print(f"{scenario.name:<48} {stats['throughput_rps']:>9.1f} {stats['p50_ms']:>7.2f}ms "
+                  f"{stats['p95_ms']:>7.2f}ms {stats['p99_ms']:>7.2f}ms {stats['errors']:>4}")
+        if hasattr(driver, 'close'):
+            driver.close()
+    stub_server.shutdown()
+
+    # Écritures en attente faites dans le dossier de données, pas dans celui de l'appelant
+    portfolio.job_runner.stop()
+    portfolio.visit_tracker.flush()
+    if portfolio.snapshot_publisher is not None:
+        portfolio.snapshot_publisher.flush()
+    os.chdir(caller_directory)
+    if not args.keep:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nRésultats enregistrés dans {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"\nRégressions (p95 au-delà de +{args.tolerance:.0%}) :")
+            for key, before, after in regressions:
+                print(f"  {key}: {before:.2f} ms -> {after:.2f} ms")
+            sys.exit(1)
+        print(f"\nAucune régression par rapport à {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,4 @@
 import urllib.request
-import time
-
-print('Attente de 3 secondes pour que le JS s\'execute...')
-time.sleep(3)
 
 try:
     response = urllib.request.urlopen('http://127.0.0.1:5000/')
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Bouchon local de l'Admin API Cloudinary (listing et suppression des images), pour les tests.
+
+Utilisation en serveur HTTP, avec le vrai SDK :
+
+    python cloudinary_stub.py --count 2000 --port 8001
+    CLOUDINARY_UPLOAD_PREFIX=http://127.0.0.1:8001 python app.py
+
+ou directement en Python : `CloudinarySync(store, api=StubAdminApi.generate(2000))`.
+"""
+import argparse
+import json
+import random
+import string
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MAX_RESULTS = 500
+
+
+class StubAdminApi:
+    """Reproduit `cloudinary.api.resources` et `delete_resources` sur une liste d'images en mémoire.
+
+    Comme l'API réelle : avec `prefix`, les résultats sont triés par public_id ;
+    sans prefix, par date de création (`direction`, `start_at`). La pagination
+    passe par un `next_cursor` opaque.
+    """
+
+    def __init__(self, images=None, latency=0.0):
+        self.images = list(images or [])
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def generate(cls, count, prefix='portfolio/', latency=0.0, seed=0):
+        """Crée `count` images aux public_id aléatoires, comme les uploads Cloudinary."""
+        rng = random.Random(seed)
+        alphabet = string.ascii_lowercase + string.digits
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        resources = []
+        for i in range(count):
+            created = start + timedelta(minutes=i)
+            resources.append(cls.make_resource(
+                prefix + ''.join(rng.choice(alphabet) for _ in range(20)), created))
+        return cls(resources, latency)
+
+    @staticmethod
+    def make_resource(public_id, created=None):
+        created = created or datetime.now(timezone.utc)
+        return {
+            'public_id': public_id,
+            'format': 'jpg',
+            'resource_type': 'image',
+            'type': 'upload',
+            'created_at': created.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'bytes': 0,
+            'width': 1600,
+            'height': 1067
+        }
+
+    def add(self, public_id):
+        with self._lock:
+            self.images.append(self.make_resource(public_id))
+
+    def remove(self, public_id):
+        with self._lock:
+            self.images = [r for r in self.images if r['public_id'] != public_id]
+
+    def resources(self, type='upload', resource_type='image', max_results=10, prefix=None,
+                  next_cursor=None, start_at=None, direction=None, **options):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            matching = [r for r in self.images if r['type'] == type and r['resource_type'] == resource_type]
+        if prefix:
+            matching = sorted((r for r in matching if r['public_id'].startswith(prefix)),
+                              key=lambda r: r['public_id'])
+        else:
+            if start_at:
+                matching = [r for r in matching if r['created_at'] >= start_at]
+            matching.sort(key=lambda r: r['created_at'], reverse=direction not in ('asc', 1, '1'))
+        offset = int(next_cursor or 0)
+        limit = min(int(max_results), MAX_RESULTS)
+        page = matching[offset:offset + limit]
+        result = {'resources': page}
+        if offset + limit < len(matching):
+            result['next_cursor'] = str(offset + limit)
+        return result
+
+    def delete_resources(self, public_ids, type='upload', resource_type='image', **options):
+        if self.latency:
+            time.sleep(self.latency)
+        public_ids = set(public_ids)
+        with self._lock:
+            self.calls += 1
+            existing = {r['public_id'] for r in self.images
+                        if r['type'] == type and r['resource_type'] == resource_type}
+            self.images = [r for r in self.images if r['public_id'] not in public_ids]
+        return {'deleted': {public_id: 'deleted' if public_id in existing else 'not_found'
+                            for public_id in public_ids}}
+
+
+def make_handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            # /v1_1/<cloud_name>/resources/<resource_type>/<type>
+            parts = url.path.strip('/').split('/')
+            if len(parts) != 5 or parts[2] != 'resources':
+                self._reply(404, {'error': {'message': 'Not found'}})
+                return
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            result = api.resources(type=parts[4], resource_type=parts[3], **params)
+            self._reply(200, result)
+
+        def do_DELETE(self):
+            url = urlparse(self.path)
+            parts = url.path.strip('/').split('/')
+            if len(parts) != 5 or parts[2] != 'resources':
+                self._reply(404, {'error': {'message': 'Not found'}})
+                return
+            public_ids = parse_qs(url.query).get('public_ids[]', [])
+            self._reply(200, api.delete_resources(public_ids, type=parts[4], resource_type=parts[3]))
+
+        def _reply(self, status, data):
+            body = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(api, host='127.0.0.1', port=8001):
+    """Démarre le serveur HTTP du bouchon (bloquant)."""
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    print(f"Bouchon Admin API sur http://{host}:{port} ({len(api.images)} images)")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bouchon local de l'Admin API Cloudinary")
+    parser.add_argument('--count', type=int, default=1000, help="Nombre d'images simulées")
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.05, help='Latence simulée par appel (secondes)')
+    args = parser.parse_args()
+    serve(StubAdminApi.generate(args.count, latency=args.latency), port=args.port)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Synchronisation de la galerie avec les images du dossier portfolio/ sur Cloudinary."""
+import json
+import string
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from image_variants import build_variants, default_build_url
+from json_writer import JsonWriter, file_lock
+
+# Maximum autorisé par l'Admin API pour une page de resources
+PAGE_SIZE = 500
+# Premiers caractères possibles d'un public_id (après le préfixe du dossier) : ceux des
+# public_id générés par Cloudinary et ceux des noms choisis à l'upload (majuscules, '-', '_')
+DEFAULT_SHARDS = string.digits + string.ascii_letters + '-_'
+# Marge appliquée au `since` des synchronisations incrémentales (horloges, uploads en cours)
+SINCE_OVERLAP = timedelta(minutes=5)
+
+
+def parse_timestamp(value):
+    """Convertit un horodatage Cloudinary ('2024-01-15T10:20:30Z') en datetime UTC."""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc)
+
+
+def format_timestamp(moment):
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class CloudinarySync:
+    """Synchronise la galerie avec Cloudinary sans perdre les métadonnées.
+
+    Les images distantes sont comparées aux photos locales par public_id :
+    seules les nouvelles images sont ajoutées (catégorie par défaut) et seules
+    les images disparues sont retirées ; titres, descriptions et catégories
+    des autres photos sont conservés.
+
+    - Synchronisation complète : toutes les pages de l'Admin API sont lues en
+      suivant `next_cursor`. Si le dossier tient en une page, un seul appel
+      suffit ; sinon le listing est découpé par premier caractère du public_id
+      (`shards`) et les découpes sont lues en parallèle (au plus `max_workers`
+      appels simultanés). Les premiers caractères vus dans la première page
+      ou dans la galerie locale s'ajoutent aux découpes. Le listing non
+      découpé est parcouru en même temps : les images qu'aucune découpe n'a
+      vues (premier caractère inattendu) y sont reprises et signalées.
+    - Synchronisation incrémentale : seules les images créées depuis la
+      dernière synchronisation (`start_at`) sont lues ; elle ne fait
+      qu'ajouter. Une synchronisation complète est refaite au plus tard
+      toutes les `full_sync_interval` secondes.
+
+    `api` est le module `cloudinary.api` par défaut ; n'importe quel objet
+    ayant une méthode `resources(**params)` convient (stub local).
+    """
+
+    def __init__(self, gallery_store, api=None, prefix='portfolio/', state_file='sync_state.json',
+                 max_workers=4, shards=DEFAULT_SHARDS, full_sync_interval=86400, build_url=default_build_url):
+        if api is None:
+            import cloudinary.api
+            api = cloudinary.api
+        self._gallery_store = gallery_store
+        self._api = api
+        self._build_url = build_url
+        self.prefix = prefix
+        self.state_file = state_file
+        self.max_workers = max_workers
+        self.shards = shards
+        self.full_sync_interval = full_sync_interval
+        self._writer = JsonWriter()
+        self._lock = threading.Lock()
+        self.stats = {'syncs': 0, 'full_syncs': 0, 'api_calls': 0, 'added': 0, 'removed': 0, 'unsharded': 0,
+                      'last_duration_ms': 0.0, 'last_mode': None}
+
+    # --- État (dernière synchronisation) ---
+    def load_state(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        self._writer.write_atomic(self.state_file, self._writer.dumps(state), lock=False)
+
+    # --- Listing distant ---
+    def _fetch(self, params):
+        """Un appel à l'Admin API. Retourne (resources, next_cursor)."""
+        result = self._api.resources(type='upload', resource_type='image', max_results=PAGE_SIZE, **params)
+        with self._lock:
+            self.stats['api_calls'] += 1
+        return result.get('resources', []), result.get('next_cursor')
+
+    def _list_pages(self, params, next_cursor=None):
+        """Suit `next_cursor` jusqu'à la dernière page."""
+        resources = []
+        while True:
+            page_params = dict(params, next_cursor=next_cursor) if next_cursor else params
+            page, next_cursor = self._fetch(page_params)
+            resources.extend(page)
+            if not next_cursor:
+                return resources
+
+    def list_all(self, known_public_ids=()):
+        """Toutes les images du dossier.
+
+        `known_public_ids` (public_id de la galerie locale) complète les découpes.
+        Retourne (resources, covers) où `covers(public_id)` indique si le
+        public_id faisait partie du listing (pour ne retirer que ce qui a été vu) ;
+        le listing est toujours complet, la fonction est gardée pour l'appelant.
+        """
+        first_page, next_cursor = self._fetch({'prefix': self.prefix})
+        if not next_cursor:
+            return first_page, lambda public_id: True
+        if not self.shards:
+            return first_page + self._list_pages({'prefix': self.prefix}, next_cursor), lambda public_id: True
+
+        # Plusieurs pages : lecture parallèle par premier caractère du public_id
+        start = len(self.prefix)
+        covered = set(self.shards)
+        for public_id in [resource['public_id'] for resource in first_page] + list(known_public_ids):
+            if public_id and public_id.startswith(self.prefix) and len(public_id) > start:
+                covered.add(public_id[start])
+        with ThreadPoolExecutor(max_workers=self.max_workers + 1) as pool:
+            # Parcours complet par next_cursor, en même temps que les découpes : garantit qu'aucune image n'est oubliée
+            walk = pool.submit(self._list_pages, {'prefix': self.prefix}, next_cursor)
+            pages = pool.map(lambda shard: self._list_pages({'prefix': self.prefix + shard}), sorted(covered))
+            # Dédoublonnées si l'API compare les préfixes sans tenir compte de la casse
+            by_public_id = {resource['public_id']: resource for page in pages for resource in page}
+            missed = [resource for resource in first_page + walk.result()
+                      if resource['public_id'] not in by_public_id]
+        if missed:
+            characters = sorted({resource['public_id'][start:start + 1] for resource in missed})
+            print(f"Synchronisation : {len(missed)} image(s) hors des découpes "
+                  f"(premiers caractères {''.join(characters)!r}), reprises du listing complet")
+            with self._lock:
+                self.stats['unsharded'] += len(missed)
+            for resource in missed:
+                by_public_id[resource['public_id']] = resource
+        return list(by_public_id.values()), lambda public_id: True
+
+    def list_since(self, since):
+        """Images du dossier créées depuis `since` (horodatage ISO)."""
+        resources = self._list_pages({'start_at': since, 'direction': 'asc'})
+        return [resource for resource in resources if resource['public_id'].startswith(self.prefix)]
+
+    # --- Synchronisation ---
+    def _new_photo(self, resource):
+        return {
+            'id': str(uuid.uuid4()),
+            'public_id': resource['public_id'],
+            'url': self._build_url(resource['public_id']),
+            'variants': build_variants(resource['public_id'], self._build_url),
+            'uploaded_at': resource.get('created_at', ''),
+            'categories': ['Non catégorisé'],  # Catégorie par défaut
+            'description': '',
+            'title': ''
+        }
+
+    def sync(self, full=False, since=None):
+        """Synchronise la galerie. Retourne un résumé (mode, ajoutées, retirées, total)."""
+        start = time.perf_counter()
+        # Un seul worker synchronise à la fois ; les autres attendent puis relisent l'état
+        with file_lock(self.state_file):
+            state = self.load_state()
+            if since is None and not full:
+                last_full = state.get('last_full_sync', 0)
+                if state.get('since') and time.time() - last_full < self.full_sync_interval:
+                    since = state['since']
+
+            local_ids = {photo.get('public_id') for photo in self._gallery_store.all()}
+            if since:
+                mode = 'incremental'
+                resources = self.list_since(since)
+                removed_public_ids = set()
+            else:
+                mode = 'full'
+                resources, covers = self.list_all(local_ids)
+                remote_ids = {resource['public_id'] for resource in resources}
+                removed_public_ids = {
+                    public_id for public_id in local_ids
+                    if public_id and public_id not in remote_ids
+                    and public_id.startswith(self.prefix) and covers(public_id)
+                }
+
+            # URLs et variantes calculées seulement pour les images inconnues
+            new_photos = [self._new_photo(resource) for resource in resources
+                          if resource['public_id'] not in local_ids]
+            added, removed = self._gallery_store.merge_remote(new_photos, removed_public_ids)
+
+            # Prochain `since` : date de création la plus récente vue, moins une marge
+            created = [parse_timestamp(r['created_at']) for r in resources if r.get('created_at')]
+            if created:
+                watermark = format_timestamp(max(created) - SINCE_OVERLAP)
+                state['since'] = max(watermark, state.get('since') or '')
+            if mode == 'full':
+                state['last_full_sync'] = time.time()
+            self._save_state(state)
+
+        duration_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.stats['syncs'] += 1
+            if mode == 'full':
+                self.stats['full_syncs'] += 1
+            self.stats['added'] += len(added)
+            self.stats['removed'] += len(removed)
+            self.stats['last_duration_ms'] = duration_ms
+            self.stats['last_mode'] = mode
+        return {
+            'mode': mode,
+            'added': len(added),
+            'removed': len(removed),
+            'count': len(self._gallery_store.all())
+        }
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
@@ -4,7 +4,42 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class Config:
+    """Configuration lue dans l'environnement (et .env), passée à app.create_app()."""
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+    # Mot de passe admin (défini dans .env, valeur par défaut pour dev)
+    ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'admin123')
+    # Cloudinary : mode dégradé si une des trois valeurs manque
     CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME')
     CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY')
     CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET')
-    SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key')
\ No newline at end of file
+    CLOUDINARY_SYNC_CONCURRENCY = int(os.environ.get('CLOUDINARY_SYNC_CONCURRENCY', '4'))
+    CLOUDINARY_FULL_SYNC_INTERVAL = int(os.environ.get('CLOUDINARY_FULL_SYNC_INTERVAL', '86400'))
+    # Backend de stockage : 'json' ou 'sqlite'
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', 'portfolio.db')
+    # Fichiers JSON compacts (sans indentation) : plus petits et plus rapides à écrire
+    JSON_COMPACT = os.environ.get('JSON_COMPACT', '0') == '1'
+    MIGRATE_ON_STARTUP = os.environ.get('MIGRATE_ON_STARTUP', '1') == '1'
+    # Snapshot de la galerie partagé entre les workers (vide pour le désactiver)
+    GALLERY_SNAPSHOT = os.environ.get('GALLERY_SNAPSHOT', 'gallery.snap')
+    # Délai (secondes) pendant lequel les modifications de la galerie sont regroupées avant publication
+    GALLERY_SNAPSHOT_DELAY = float(os.environ.get('GALLERY_SNAPSHOT_DELAY', '0.5'))
+    # Charger les données et compiler les templates avant la première requête
+    WARMUP = os.environ.get('WARMUP', '1') == '1'
+    # Afficher les durées de démarrage de chaque worker (toujours dans /admin/metrics)
+    STARTUP_LOG = os.environ.get('STARTUP_LOG', '0') == '1'
+    # Visiteurs uniques : 'hll' (estimation à taille fixe) ou 'exact' (liste complète)
+    VISITS_UNIQUE_MODE = os.environ.get('VISITS_UNIQUE_MODE', 'hll')
+    VISITS_FLUSH_INTERVAL = float(os.environ.get('VISITS_FLUSH_INTERVAL', '10'))
+    # SSE et long-polling des messages non lus : chaque client garde une requête ouverte.
+    # À n'activer qu'avec des workers threadés ou asynchrones (gunicorn gthread/gevent) ;
+    # par défaut, le navigateur interroge simplement /api/messages/unread toutes les 30 s.
+    UNREAD_PUSH = os.environ.get('UNREAD_PUSH', '0') == '1'
+    UNREAD_MAX_SUBSCRIBERS = int(os.environ.get('UNREAD_MAX_SUBSCRIBERS', '20'))
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '0'))
+    JOBS_DB = os.environ.get('JOBS_DB', 'jobs.db')
+    JOB_RUNNER = os.environ.get('JOB_RUNNER', 'thread')
+    JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', '2'))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+    # Les suppressions rapprochées sont regroupées pendant ce délai (secondes) en un seul appel
+    REMOTE_DELETE_DELAY = float(os.environ.get('REMOTE_DELETE_DELAY', '5'))
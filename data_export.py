@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Export et import des données en NDJSON (un enregistrement JSON par ligne).
+
+    python data_export.py export [--output export.ndjson.gz] [--gzip]
+    python data_export.py import export.ndjson.gz [--resume]
+
+La première ligne est un en-tête, puis un enregistrement par ligne :
+
+    {"type": "header", "format": 1, "schema_version": 1, "exported_at": "..."}
+    {"type": "photo", "id": "...", "data": {...}}
+    {"type": "user", "id": "nom", "data": {...}}
+    {"type": "message", "id": "...", "data": {...}}
+
+Les enregistrements sont lus et écrits un par un : la mémoire utilisée ne
+dépend pas de la taille des données (hors réécriture des fichiers JSON,
+voir JsonStorage.import_records). À l'import, les ids déjà présents sont
+ignorés ; l'avancement est noté dans `<fichier>.progress` et `--resume`
+reprend après la dernière ligne enregistrée. Les fichiers `.gz` sont
+compressés / décompressés automatiquement.
+"""
+import argparse
+import gzip
+import itertools
+import json
+import os
+from datetime import datetime
+
+from migrations import MIGRATIONS, SCHEMA_VERSION, run_migrations
+from photo_record import json_default
+
+FORMAT_VERSION = 1
+# Ordre d'export : les photos d'abord, référencées par les messages
+KINDS = ('photo', 'user', 'message')
+
+
+def export_lines(storage):
+    """Lignes NDJSON (str terminées par '\\n') de tout le contenu du stockage."""
+    header = {
+        'type': 'header',
+        'format': FORMAT_VERSION,
+        'schema_version': storage.schema_version(),
+        'exported_at': datetime.now().isoformat(),
+    }
+    yield json.dumps(header) + '\n'
+    for kind in KINDS:
+        for record_id, record in storage.iter_records(kind):
+            yield json.dumps({'type': kind, 'id': record_id, 'data': record}, default=json_default) + '\n'
+
+
+def open_file(path, mode):
+    """Ouvre en texte, avec (dé)compression gzip selon l'extension ou le contenu."""
+    if 'r' in mode:
+        with open(path, 'rb') as f:
+            compressed = f.read(2) == b'\x1f\x8b'
+    else:
+        compressed = path.endswith('.gz')
+    if compressed:
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def export_file(storage, path):
+    """Écrit l'export dans `path`. Retourne le nombre d'enregistrements."""
+    count = -1  # sans compter l'en-tête
+    with open_file(path, 'w') as f:
+        for line in export_lines(storage):
+            f.write(line)
+            count += 1
+    return count
+
+
+def migrate_record(kind, data, from_version):
+    """Met un enregistrement exporté d'un schéma antérieur au schéma courant."""
+    collections = {'photo': [], 'user': {}, 'message': []}
+    if kind == 'user':
+        collections['user'] = {'_': data}
+    else:
+        collections[kind].append(data)
+    for version, _, migrate in MIGRATIONS:
+        if version > from_version:
+            migrate(collections['photo'], collections['user'], collections['message'])
+    return data
+
+
+def read_progress(path):
+    try:
+        with open(path, 'r') as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_progress(path, line_number):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(str(line_number))
+    os.replace(tmp_path, path)
+
+
+def import_file(storage, path, resume=False):
+    """Importe un export NDJSON dans `storage`. Retourne {type: (importés, ignorés)}.
+
+    Le stockage est d'abord mis au schéma courant. Les enregistrements sont
+    passés par lots de `storage.import_batch_size` ; après chaque lot, le
+    numéro de la dernière ligne traitée est écrit dans `<path>.progress`.
+    """
+    run_migrations(storage)
+    progress_path = path + '.progress'
+    start = read_progress(progress_path) if resume else 0
+    totals = {kind: [0, 0] for kind in KINDS}
+
+    with open_file(path, 'r') as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get('type') != 'header' or header.get('format') != FORMAT_VERSION:
+            raise ValueError(f"{path} n'est pas un export au format {FORMAT_VERSION}")
+        if header.get('schema_version', 0) > SCHEMA_VERSION:
+            raise ValueError(f"Export au schéma {header['schema_version']}, plus récent que "
+                             f"le schéma courant ({SCHEMA_VERSION})")
+        from_version = header.get('schema_version', 0)
+        # Dernière ligne dont l'enregistrement a été passé au stockage
+        state = {'line': start}
+
+        def entries():
+            for line_number, line in enumerate(f, 2):
+                if line_number <= start or not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get('type') not in totals:
+                    raise ValueError(f"Ligne {line_number} : type inconnu {entry.get('type')!r}")
+                data = entry['data']
+                if from_version < SCHEMA_VERSION:
+                    data = migrate_record(entry['type'], data, from_version)
+                yield entry['type'], line_number, (entry['id'], data)
+
+        def records(group):
+            for _, line_number, record in group:
+                state['line'] = line_number
+                yield record
+
+        batch_size = storage.import_batch_size
+        for kind, group in itertools.groupby(entries(), key=lambda entry: entry[0]):
+            group_records = records(group)
+            while True:
+                batch = list(itertools.islice(group_records, batch_size)) if batch_size else group_records
+                imported, skipped = storage.import_records(kind, batch)
+                totals[kind][0] += imported
+                totals[kind][1] += skipped
+                write_progress(progress_path, state['line'])
+                if not batch_size or len(batch) < batch_size:
+                    break
+
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    return {kind: tuple(counts) for kind, counts in totals.items()}
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+    from storage import create_storage
+
+    parser = argparse.ArgumentParser(description='Export / import NDJSON des données du portfolio')
+    parser.add_argument('--backend', default=os.getenv('STORAGE_BACKEND', 'json'))
+    parser.add_argument('--db', default=os.getenv('SQLITE_PATH', 'portfolio.db'))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help='Exporter toutes les données')
+    export_parser.add_argument('--output', help='Fichier de sortie (défaut : export-<date>.ndjson[.gz])')
+    export_parser.add_argument('--gzip', action='store_true', help='Compresser (implicite pour un fichier .gz)')
+    import_parser = subparsers.add_parser('import', help='Importer un export (ids existants ignorés)')
+    import_parser.add_argument('file')
+    import_parser.add_argument('--resume', action='store_true',
+                               help="Reprendre après la dernière ligne notée dans <fichier>.progress")
+    args = parser.parse_args()
+
+    storage = create_storage(args.backend, args.db)
+    if args.command == 'export':
+        output = args.output or f"export-{datetime.now():%Y%m%d-%H%M%S}.ndjson"
+        if args.gzip and not output.endswith('.gz'):
+            output += '.gz'
+        count = export_file(storage, output)
+        print(f"{count} enregistrements exportés dans {output}")
+    else:
+        totals = import_file(storage, args.file, resume=args.resume)
+        for kind, (imported, skipped) in totals.items():
+            print(f"{kind}: {imported} importé(s), {skipped} déjà présent(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""Snapshot de la galerie partagé entre les workers (fichiers mappés en mémoire).
+
+Un worker qui modifie la galerie publie un snapshot immuable : la galerie
+déjà sérialisée en JSON, la liste des catégories, un tableau par catégorie
+(avec leurs variantes gzip) et un index des photos par id. Les autres
+workers le lisent avec `mmap` et servent /gallery, /categories et
+/gallery/<id> par tranches du fichier, sans parser ni garder la galerie
+en mémoire (les pages sont partagées par le cache du système).
+
+    gallery.snap        fichier de contrôle : MAGIC + numéro de version (16 octets)
+    gallery.snap.<N>    snapshot de la version N (jamais modifié)
+
+Les modifications ne publient pas directement : SnapshotPublisher regroupe
+celles d'une même rafale (lot, synchronisation) et publie une seule fois,
+en tâche de fond. Entre-temps, les lecteurs voient que le snapshot ne
+correspond plus au stockage et utilisent le cache de leur worker.
+
+La publication écrit `gallery.snap.<N+1>`, puis incrémente le numéro dans
+le fichier de contrôle, sous `file_lock`. Les lecteurs comparent ce numéro à
+celui du snapshot qu'ils ont ouvert à chaque requête et passent au nouveau
+fichier d'un seul remplacement de référence ; l'ancien mapping reste valide
+tant qu'une réponse l'utilise, même une fois le fichier supprimé.
+"""
+import atexit
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from gallery_store import sort_key
+from json_writer import file_lock
+from response_cache import GZIP_MIN_SIZE, CachedBody
+
+CONTROL_MAGIC = b'PFGSCTL1'
+SNAPSHOT_MAGIC = b'PFGSNAP1'
+# MAGIC, version
+CONTROL = struct.Struct('<8sQ')
+# MAGIC, version, début et longueur de l'index JSON, début et nombre d'entrées de la table des photos
+HEADER = struct.Struct('<8sQQQQQ')
+# Table des photos, triée par hash d'id : hash, début et longueur du JSON de la photo, début et longueur de l'id
+PHOTO_ENTRY = struct.Struct('<QQIQI')
+# Séparateur des éléments d'un tableau, comme json.dumps (mêmes octets, donc même ETag, que le cache des réponses)
+ITEM_SEPARATOR = b', '
+# Photos les plus récentes indexées à part (premières pages rendues dans le HTML)
+RECENT_PHOTOS = 100
+# Nombre d'essais si un snapshot est remplacé (et supprimé) pendant qu'on l'ouvre
+OPEN_ATTEMPTS = 3
+
+
+def id_hash(photo_id):
+    return int.from_bytes(hashlib.blake2b(photo_id, digest_size=8).digest(), 'little')
+
+
+def signature_key(signature):
+    """Forme comparable (et enregistrable) d'une signature du stockage."""
+    return json.dumps(signature)
+
+
+class SnapshotBuilder:
+    """Construit le contenu d'un fichier de snapshot, section par section."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = HEADER.size
+
+    def add(self, data):
+        """Ajoute des octets ; retourne leur position dans le fichier."""
+        offset = self.offset
+        self.chunks.append(data)
+        self.offset += len(data)
+        return offset
+
+    def add_section(self, body):
+        """Ajoute un corps de réponse JSON et sa variante gzip : [début, longueur, début gzip, longueur gzip, etag]."""
+        offset = self.add(body)
+        gzip_offset = gzip_length = 0
+        if len(body) >= GZIP_MIN_SIZE:
+            compressed = gzip.compress(body, compresslevel=6, mtime=0)
+            gzip_offset, gzip_length = self.add(compressed), len(compressed)
+        return [offset, len(body), gzip_offset, gzip_length, hashlib.sha1(body).hexdigest()]
+
+
+def build_snapshot(version, photos, categories, signature, dumps):
+    """Octets d'un snapshot (liste de morceaux). `dumps` sérialise comme les routes JSON."""
+    builder = SnapshotBuilder()
+    photo_bodies = [dumps(photo).encode('utf-8') for photo in photos]
+
+    # Galerie complète : chaque photo est une tranche de ce tableau
+    gallery = b'[' + ITEM_SEPARATOR.join(photo_bodies) + b']'
+    gallery_section = builder.add_section(gallery)
+    entries = []
+    position = gallery_section[0] + 1
+    for photo, body in zip(photos, photo_bodies):
+        entries.append((photo['id'].encode('utf-8'), position, len(body)))
+        position += len(body) + len(ITEM_SEPARATOR)
+
+    # Positions des photos les plus récentes, avec leur clé de tri (curseur de la page suivante)
+    recent = sorted(zip(photos, entries), key=lambda item: sort_key(item[0]), reverse=True)[:RECENT_PHOTOS]
+
+    by_category = {category: [] for category in categories}
+    for photo, body in zip(photos, photo_bodies):
+        for category in photo['categories']:
+            if category in by_category:
+                by_category[category].append(body)
+    index = {
+        'version': version,
+        'signature': signature,
+        'photos': len(photos),
+        'gallery': gallery_section,
+        'recent': [[offset, length, list(sort_key(photo))] for photo, (_, offset, length) in recent],
+        'categories': builder.add_section(dumps(categories).encode('utf-8')),
+        'by_category': {category: builder.add_section(b'[' + ITEM_SEPARATOR.join(bodies) + b']')
+                        for category, bodies in by_category.items()},
+    }
+
+    table = []
+    for photo_id, offset, length in entries:
+        table.append((id_hash(photo_id), offset, length, builder.add(photo_id), len(photo_id)))
+    table.sort()
+    table_offset = builder.add(b''.join(PHOTO_ENTRY.pack(*entry) for entry in table))
+    index_body = json.dumps(index).encode('utf-8')
+    index_offset = builder.add(index_body)
+    header = HEADER.pack(SNAPSHOT_MAGIC, version, index_offset, len(index_body), table_offset, len(table))
+    return [header] + builder.chunks
+
+
+class SnapshotView:
+    """Snapshot ouvert (lecture seule) : corps de réponse servis par tranches du mapping."""
+
+    def __init__(self, mapped):
+        magic, self.version, index_offset, index_length, self._table_offset, self._table_count = \
+            HEADER.unpack_from(mapped, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError('Snapshot de galerie invalide')
+        self._mapped = mapped
+        self._data = memoryview(mapped)
+        index = json.loads(bytes(self._data[index_offset:index_offset + index_length]))
+        self.signature = index['signature']
+        self.photo_count = index['photos']
+        self._gallery = index['gallery']
+        self._categories = index['categories']
+        self._by_category = index['by_category']
+        self._recent = index.get('recent', [])
+        self.size = len(mapped)
+
+    def _body(self, section):
+        offset, length, gzip_offset, gzip_length, etag = section
+        gzip_body = self._data[gzip_offset:gzip_offset + gzip_length] if gzip_length else None
+        return CachedBody(self.version, self._data[offset:offset + length], etag=etag,
+                          gzip_body=gzip_body, compress=False)
+
+    def gallery(self):
+        return self._body(self._gallery)
+
+    def categories(self):
+        return self._body(self._categories)
+
+    def category_names(self):
+        """Liste des catégories (dans l'ordre de /categories)."""
+        return list(self._by_category)
+
+    def category(self, name):
+        """Photos d'une catégorie (tableau vide si elle n'existe pas)."""
+        section = self._by_category.get(name)
+        if section is None:
+            return CachedBody(self.version, b'[]', compress=False)
+        return self._body(section)
+
+    def recent(self, limit):
+        """Première page de la galerie (plus récentes d'abord), comme GalleryStore.page.
+
+        Retourne (photos, clé de la dernière photo ou None), ou None si la page
+        dépasse les photos indexées dans le snapshot.
+        """
+        if limit > len(self._recent) and self.photo_count > len(self._recent):
+            return None
+        selected = self._recent[:limit]
+        photos = [json.loads(bytes(self._data[offset:offset + length])) for offset, length, _ in selected]
+        has_more = self.photo_count > len(selected)
+        next_key = tuple(selected[-1][2]) if has_more and selected else None
+        return photos, next_key
+
+    def photo(self, photo_id):
+        """Photo par id, ou None si elle n'est pas dans ce snapshot."""
+        raw_id = photo_id.encode('utf-8')
+        target = id_hash(raw_id)
+        low, high = 0, self._table_count
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from('<Q', self._mapped, self._table_offset + middle * PHOTO_ENTRY.size)[0] < target:
+                low = middle + 1
+            else:
+                high = middle
+        # Ids de même hash : comparer les ids enregistrés
+        for i in range(low, self._table_count):
+            entry_hash, offset, length, id_offset, id_length = PHOTO_ENTRY.unpack_from(
+                self._mapped, self._table_offset + i * PHOTO_ENTRY.size)
+            if entry_hash != target:
+                break
+            if self._data[id_offset:id_offset + id_length] == raw_id:
+                return CachedBody(self.version, self._data[offset:offset + length], compress=False)
+        return None
+
+
+class GallerySnapshot:
+    """Publie et lit le snapshot partagé de la galerie (voir l'en-tête du module)."""
+
+    def __init__(self, path, dumps=json.dumps):
+        self.path = path
+        self._dumps = dumps
+        self._control = None
+        self._view = None
+        self._lock = threading.Lock()
+        self.stats = {'publishes': 0, 'swaps': 0, 'last_publish_ms': 0.0}
+
+    def _data_path(self, version):
+        return f'{self.path}.{version}'
+
+    def _control_version(self):
+        """Numéro de version publié (0 si aucun snapshot n'a encore été publié)."""
+        control = self._control
+        if control is None:
+            with self._lock:
+                if self._control is None:
+                    try:
+                        with open(self.path, 'rb') as f:
+                            if os.fstat(f.fileno()).st_size < CONTROL.size:
+                                return 0
+                            self._control = mmap.mmap(f.fileno(), CONTROL.size, access=mmap.ACCESS_READ)
+                    except FileNotFoundError:
+                        return 0
+                control = self._control
+        magic, version = CONTROL.unpack_from(control, 0)
+        return version if magic == CONTROL_MAGIC else 0
+
+    def current(self):
+        """Snapshot publié le plus récent, ou None s'il n'y en a pas."""
+        for _ in range(OPEN_ATTEMPTS):
+            version = self._control_version()
+            if not version:
+                return None
+            view = self._view
+            if view is not None and view.version == version:
+                return view
+            try:
+                with open(self._data_path(version), 'rb') as f:
+                    view = SnapshotView(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            except FileNotFoundError:
+                # Remplacé entre-temps par une version plus récente
+                continue
+            if view.version != version:
+                continue
+            # L'ancien mapping est libéré quand plus aucune réponse ne l'utilise
+            self._view = view
+            self.stats['swaps'] += 1
+            return view
+        return None
+
+    def publish(self, photos, categories, signature):
+        """Écrit un nouveau snapshot et le rend visible à tous les workers.
+
+        Si le snapshot publié correspond déjà à `signature` (un autre worker
+        vient de le faire), rien n'est écrit. Retourne la version publiée.
+        """
+        start = time.perf_counter()
+        signature = signature_key(signature)
+        with file_lock(self.path):
+            view = self.current()
+            if view is not None and view.signature == signature:
+                return view.version
+            version = self._control_version() + 1
+            chunks = build_snapshot(version, photos, categories, signature, self._dumps)
+            data_path = self._data_path(version)
+            tmp_path = data_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, data_path)
+            self._write_control(version)
+            self._remove_older(version)
+        self.stats['publishes'] += 1
+        self.stats['last_publish_ms'] = (time.perf_counter() - start) * 1000
+        return version
+
+    def _write_control(self, version):
+        """Met à jour le numéro de version sur place (les lecteurs gardent le même mapping)."""
+        try:
+            f = open(self.path, 'r+b')
+        except FileNotFoundError:
+            f = open(self.path, 'w+b')
+        with f:
+            if os.fstat(f.fileno()).st_size < CONTROL.size:
+                f.write(CONTROL.pack(CONTROL_MAGIC, version))
+            else:
+                f.seek(8)
+                f.write(struct.pack('<Q', version))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _remove_older(self, version):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        prefix = os.path.basename(self.path) + '.'
+        for name in os.listdir(directory):
+            suffix = name[len(prefix):]
+            if name.startswith(prefix) and suffix.isdigit() and int(suffix) < version:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    # Windows : fichier encore mappé, supprimé à une prochaine publication
+                    pass
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        view = self._view
+        stats['version'] = view.version if view is not None else 0
+        stats['photos'] = view.photo_count if view is not None else 0
+        stats['size'] = view.size if view is not None else 0
+        return stats
+
+
+class SnapshotPublisher:
+    """Publie le snapshot en tâche de fond, une fois par rafale de modifications.
+
+    `schedule()` marque le snapshot comme périmé. Un thread attend `delay`
+    secondes, pour regrouper les modifications rapprochées, puis publie
+    l'état retourné par `get_state()` (None : rien à publier pour l'instant).
+    """
+
+    def __init__(self, snapshot, get_state, delay=0.5):
+        self.snapshot = snapshot
+        self.get_state = get_state
+        self.delay = delay
+        self._cond = threading.Condition()
+        self._dirty = False
+        self._thread = None
+        self.stats = {'scheduled': 0, 'coalesced': 0, 'errors': 0}
+        atexit.register(self.flush)
+
+    def schedule(self):
+        with self._cond:
+            if self._dirty:
+                self.stats['coalesced'] += 1
+                return
+            self._dirty = True
+            self.stats['scheduled'] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='gallery-snapshot', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty:
+                    self._cond.wait()
+            # Laisser le temps aux modifications suivantes d'arriver
+            time.sleep(self.delay)
+            self.flush()
+
+    def flush(self):
+        """Publie immédiatement si une publication est en attente."""
+        with self._cond:
+            if not self._dirty:
+                return
+            self._dirty = False
+        try:
+            state = self.get_state()
+            if state is not None:
+                self.snapshot.publish(*state)
+        except Exception as e:
+            # Les lecteurs retombent sur le cache de leur worker
+            self.stats['errors'] += 1
+            print(f"Erreur lors de la publication du snapshot de la galerie: {e}")
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats['pending'] = self._dirty
+            return stats
@@ -0,0 +1,537 @@
+# -*- coding: utf-8 -*-
+"""Cache en mémoire de la galerie, au-dessus du backend de stockage."""
+import base64
+import bisect
+import json
+import threading
+
+from photo_record import PhotoRecord
+from search_index import SearchIndex
+
+
+def photo_categories(photo):
+    """Catégories d'une photo (toujours une liste depuis la migration de schéma 1)."""
+    return photo['categories']
+
+
+def sort_key(photo):
+    """Clé de tri stable d'une photo : (date d'upload, id)."""
+    return (photo.get('uploaded_at') or '', photo.get('id') or '')
+
+
+def encode_cursor(key):
+    """Encode une clé de tri en curseur opaque pour l'API."""
+    raw = json.dumps(list(key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, types=(str, str)):
+    """Décode un curseur de l'API. Lève ValueError s'il est invalide.
+
+    `types` donne le type attendu de chaque élément de la clé.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Curseur invalide')
+    if not (isinstance(key, list) and len(key) == len(types)
+            and all(isinstance(k, t) for k, t in zip(key, types))):
+        raise ValueError('Curseur invalide')
+    return tuple(key)
+
+
+def project(photo, fields):
+    """Ne garde que les champs demandés d'une photo (tous si fields est vide).
+
+    Un champ pointé ('variants.grid') ne garde qu'une clé d'un champ dictionnaire.
+    """
+    if not fields:
+        return photo
+    projected = {}
+    for field in fields:
+        if field in photo:
+            projected[field] = photo[field]
+        elif '.' in field:
+            parent, child = field.split('.', 1)
+            value = photo.get(parent)
+            if isinstance(value, dict) and child in value:
+                projected.setdefault(parent, {})[child] = value[child]
+    return projected
+
+
+class GalleryStore:
+    """Garde la galerie parsée en mémoire et ne la relit que si elle a changé.
+
+    Le cache est invalidé quand la signature du stockage change (mtime/taille
+    du fichier JSON, compteur de version en SQLite), par exemple après une
+    écriture d'un autre worker, ou quand le compteur interne `version` est
+    incrémenté via `invalidate()`.
+
+    Un index inversé catégorie -> ids de photos est maintenu à chaque écriture,
+    pour que le filtrage et le comptage par catégorie ne parcourent pas
+    toute la galerie. Une liste triée de clés (uploaded_at, id) sert à la
+    pagination par curseur, qui reste stable même si des photos sont ajoutées
+    entre deux pages. Un index de recherche plein texte (titre, description,
+    catégories) est tenu à jour de la même façon.
+
+    Les photos sont gardées sous forme de PhotoRecord (voir photo_record.py) :
+    les dicts reçus sont convertis à l'entrée, et les photos retournées se
+    lisent comme des dicts jusqu'à leur sérialisation.
+
+    `on_change()` est appelé après chaque écriture terminée, hors du verrou
+    (publication du snapshot partagé, voir gallery_snapshot.py).
+    """
+
+    def __init__(self, storage, on_change=None):
+        self._storage = storage
+        self._on_change = on_change
+        self._lock = threading.RLock()
+        self._photos = None
+        self._by_id = {}
+        # Position d'insertion de chaque photo, pour conserver l'ordre de la galerie
+        self._positions = {}
+        self._next_position = 0
+        # catégorie -> {photo_id: position}
+        self._by_category = {}
+        # Clés (uploaded_at, id) triées, pour la pagination
+        self._sorted_keys = []
+        self._search = SearchIndex()
+        self._signature = None
+        self._loaded_version = None
+        # Écritures différées en cours (JSON) : le cache fait foi jusqu'à leur fin
+        self._pending_writes = 0
+        self._last_ticket = None
+        self.version = 0
+        self.stats = {'hits': 0, 'misses': 0, 'reloads': 0, 'writes': 0}
+
+    def _set_photos(self, photos):
+        self._photos = [PhotoRecord.from_dict(photo) for photo in photos]
+        self._by_id = {}
+        self._positions = {}
+        self._next_position = 0
+        self._by_category = {}
+        self._sorted_keys = []
+        self._search.clear()
+        for photo in self._photos:
+            self._index_photo(photo, keep_sorted=False)
+        self._sorted_keys.sort()
+        self._search.finish_bulk()
+
+    def _index_photo(self, photo, keep_sorted=True):
+        photo_id = photo.get('id')
+        self._by_id[photo_id] = photo
+        position = self._positions.get(photo_id)
+        if position is None:
+            position = self._positions[photo_id] = self._next_position
+            self._next_position += 1
+        for category in photo_categories(photo):
+            self._by_category.setdefault(category, {})[photo_id] = position
+        if keep_sorted:
+            bisect.insort(self._sorted_keys, sort_key(photo))
+        else:
+            self._sorted_keys.append(sort_key(photo))
+        self._search.add(photo, keep_sorted=keep_sorted)
+
+    def _unindex_photo(self, photo):
+        photo_id = photo.get('id')
+        key = sort_key(photo)
+        i = bisect.bisect_left(self._sorted_keys, key)
+        if i < len(self._sorted_keys) and self._sorted_keys[i] == key:
+            del self._sorted_keys[i]
+        self._search.remove(photo_id)
+        for category in photo_categories(photo):
+            ids = self._by_category.get(category)
+            if ids is None:
+                continue
+            ids.pop(photo_id, None)
+            if not ids:
+                del self._by_category[category]
+
+    def _replace_photo(self, old, new, in_list=True):
+        """Remplace une photo par sa nouvelle version (même id) dans les index et la liste.
+
+        Les photos ne sont jamais modifiées sur place : une liste déjà retournée
+        (ou en cours de sérialisation pour le snapshot) ne voit pas d'état intermédiaire.
+        Avec in_list=False, l'appelant reconstruit la liste (lots).
+        """
+        self._unindex_photo(old)
+        self._index_photo(new)
+        if not in_list:
+            return
+        for i, photo in enumerate(self._photos):
+            if photo is old:
+                self._photos[i] = new
+                break
+
+    def _discard_unsaved(self):
+        """Écriture échouée : recharge le cache depuis le stockage (sous le verrou).
+
+        Le fichier n'a pas été remplacé : le recharger annule les modifications
+        non écrites, avec leurs entrées dans les index.
+        """
+        self.version += 1
+        self._loaded_version = self.version
+        try:
+            photos = self._storage.load_photo_records()
+            signature = self._storage.gallery_signature()
+        except Exception as e:
+            print(f"Erreur lors du rechargement de la galerie: {e}")
+            self._signature = None
+            return
+        self._set_photos(photos)
+        # D'autres écritures en cours : relire le stockage une fois qu'elles seront finies
+        self._signature = None if self._pending_writes else signature
+
+    def _ensure_loaded(self):
+        """Recharge le cache si le stockage ou la version ont changé."""
+        if self._photos is not None and self._pending_writes:
+            self.stats['hits'] += 1
+            return
+        signature = self._storage.gallery_signature()
+        if (self._photos is not None and signature == self._signature
+                and self._loaded_version == self.version):
+            self.stats['hits'] += 1
+            return
+
+        self.stats['misses'] += 1
+        try:
+            photos = self._storage.load_photo_records()
+        except Exception as e:
+            print(f"Erreur lors du chargement de la galerie: {e}")
+            # Garder la dernière version valide plutôt que de vider la galerie
+            if self._photos is None:
+                self._set_photos([])
+            return
+        if self._photos is not None:
+            self.stats['reloads'] += 1
+        self._set_photos(photos)
+        # Chaque rechargement compte comme une nouvelle version des données
+        self.version += 1
+        self._signature = signature
+        self._loaded_version = self.version
+
+    def _written(self, ticket):
+        """Met à jour la version et la signature après une écriture (sous le verrou)."""
+        self.version += 1
+        self.stats['writes'] += 1
+        self._loaded_version = self.version
+        if ticket is None:
+            self._signature = self._storage.gallery_signature()
+        else:
+            self._pending_writes += 1
+            self._last_ticket = ticket
+
+    def _wait(self, ticket):
+        """Attend la fin d'une écriture différée (hors du verrou, pour permettre le regroupement)."""
+        if ticket is None:
+            return
+        try:
+            ticket.wait()
+        except Exception:
+            with self._lock:
+                self._pending_writes -= 1
+                self._discard_unsaved()
+            raise
+        with self._lock:
+            self._pending_writes -= 1
+            if not self._pending_writes and self._signature is not None:
+                self._signature = self._last_ticket.signature
+
+    def _changed(self):
+        if self._on_change is not None:
+            self._on_change()
+
+    def all(self):
+        """Retourne la liste des photos en cache (à ne pas modifier directement)."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._photos
+
+    def get(self, photo_id):
+        """Retourne une photo par son id, ou None."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._by_id.get(photo_id)
+
+    def get_many(self, photo_ids):
+        """Retourne {id: photo} pour les ids connus (les autres sont ignorés)."""
+        with self._lock:
+            self._ensure_loaded()
+            return {photo_id: self._by_id[photo_id] for photo_id in photo_ids if photo_id in self._by_id}
+
+    def by_category(self, category):
+        """Retourne les photos d'une catégorie, dans l'ordre de la galerie."""
+        with self._lock:
+            self._ensure_loaded()
+            ids = self._by_category.get(category)
+            if not ids:
+                return []
+            return [self._by_id[photo_id] for photo_id in sorted(ids, key=ids.get)]
+
+    def sorted_photos(self, descending=False, category=None):
+        """Retourne les photos (d'une catégorie éventuelle) triées par date d'upload."""
+        with self._lock:
+            keys = self._keys_for(category)
+            if descending:
+                keys = reversed(keys)
+            return [self._by_id[key[1]] for key in keys]
+
+    def page(self, limit, after=None, descending=True, category=None):
+        """Retourne une page de photos triées par date d'upload.
+
+        `after` est la clé de tri de la dernière photo de la page précédente.
+        Retourne (photos, clé de la dernière photo ou None s'il n'y a plus de page).
+        """
+        with self._lock:
+            keys = self._keys_for(category)
+            if descending:
+                end = bisect.bisect_left(keys, after) if after else len(keys)
+                start = max(0, end - limit)
+                selected = keys[start:end][::-1]
+                has_more = start > 0
+            else:
+                start = bisect.bisect_right(keys, after) if after else 0
+                selected = keys[start:start + limit]
+                has_more = start + limit < len(keys)
+            photos = [self._by_id[key[1]] for key in selected]
+            next_key = selected[-1] if has_more and selected else None
+            return photos, next_key
+
+    def search(self, query, limit, after=None, category=None):
+        """Recherche plein texte, résultats classés par pertinence puis par date.
+
+        `after` est la clé (score, uploaded_at, id) du dernier résultat de la
+        page précédente. Retourne (photos, clé du dernier résultat ou None).
+        """
+        with self._lock:
+            self._ensure_loaded()
+            scores = self._search.search(query)
+            if category:
+                in_category = self._by_category.get(category, {})
+                scores = {photo_id: score for photo_id, score in scores.items() if photo_id in in_category}
+
+            ranked = [(round(score, 3),) + sort_key(self._by_id[photo_id])
+                      for photo_id, score in scores.items()]
+            if after:
+                ranked = [key for key in ranked if key < after]
+            ranked.sort(reverse=True)
+
+            selected = ranked[:limit]
+            photos = [self._by_id[key[2]] for key in selected]
+            next_key = selected[-1] if len(ranked) > limit else None
+            return photos, next_key
+
+    def _keys_for(self, category):
+        """Clés triées de toute la galerie ou d'une seule catégorie."""
+        self._ensure_loaded()
+        if not category:
+            return self._sorted_keys
+        ids = self._by_category.get(category, {})
+        return sorted(sort_key(self._by_id[photo_id]) for photo_id in ids)
+
+    def categories(self):
+        """Retourne la liste triée des catégories utilisées."""
+        with self._lock:
+            self._ensure_loaded()
+            return sorted(self._by_category)
+
+    def category_counts(self):
+        """Retourne le nombre de photos par catégorie."""
+        with self._lock:
+            self._ensure_loaded()
+            return {category: len(ids) for category, ids in self._by_category.items()}
+
+    def add(self, photo):
+        """Ajoute une photo et persiste la galerie."""
+        photo = PhotoRecord.from_dict(photo)
+        with self._lock:
+            self._ensure_loaded()
+            self._photos.append(photo)
+            self._index_photo(photo)
+            try:
+                ticket = self._storage.add_photo(photo, self._photos)
+            except Exception:
+                self._discard_unsaved()
+                raise
+            self._written(ticket)
+        self._wait(ticket)
+        self._changed()
+        return photo
+
+    def update(self, photo_id, changes):
+        """Met à jour les champs d'une photo. Retourne la photo ou None si absente."""
+        with self._lock:
+            self._ensure_loaded()
+            old = self._by_id.get(photo_id)
+            if old is None:
+                return None
+            photo = PhotoRecord(old.to_dict())
+            photo.update(changes)
+            self._replace_photo(old, photo)
+            try:
+                ticket = self._storage.update_photo(photo, self._photos)
+            except Exception:
+                self._discard_unsaved()
+                raise
+            self._written(ticket)
+        self._wait(ticket)
+        self._changed()
+        return photo
+
+    def delete(self, photo_id):
+        """Supprime une photo. Retourne True si elle existait."""
+        with self._lock:
+            self._ensure_loaded()
+            photo = self._by_id.pop(photo_id, None)
+            if photo is None:
+                return False
+            self._unindex_photo(photo)
+            del self._positions[photo_id]
+            self._photos = [p for p in self._photos if p.get('id') != photo_id]
+            try:
+                ticket = self._storage.delete_photo(photo_id, self._photos)
+            except Exception:
+                self._discard_unsaved()
+                raise
+            self._written(ticket)
+        self._wait(ticket)
+        self._changed()
+        return True
+
+    def _apply_changes(self, added, updated, removed):
+        """Met à jour les index et persiste un lot en une écriture (sous le verrou).
+
+        `updated` contient les nouvelles versions des photos modifiées, déjà
+        réindexées mais pas encore placées dans la liste.
+        """
+        for photo in removed:
+            self._unindex_photo(photo)
+            del self._by_id[photo['id']]
+            del self._positions[photo['id']]
+        removed_ids = [photo['id'] for photo in removed]
+        if removed_ids or updated:
+            removed_set = set(removed_ids)
+            replaced = {photo['id']: photo for photo in updated}
+            self._photos = [replaced.get(p.get('id'), p) for p in self._photos if p.get('id') not in removed_set]
+        for photo in added:
+            self._photos.append(photo)
+            self._index_photo(photo)
+        try:
+            ticket = self._storage.apply_photo_changes(added, updated, removed_ids, self._photos)
+        except Exception:
+            self._discard_unsaved()
+            raise
+        self._written(ticket)
+        return ticket
+
+    def apply_batch(self, new_photos=(), updates=(), deleted_ids=()):
+        """Ajoute, modifie et supprime des photos en un seul lot (une seule écriture).
+
+        `updates` est une liste de (photo_id, changements). Retourne trois listes
+        de résultats dans l'ordre des éléments reçus : les photos ajoutées, les
+        photos modifiées (None si introuvable) et les suppressions (True si la
+        photo existait).
+        """
+        ticket = None
+        changed = False
+        with self._lock:
+            self._ensure_loaded()
+            updated = {}
+            update_results = []
+            for photo_id, changes in updates:
+                photo = self._by_id.get(photo_id)
+                if photo is not None:
+                    old, photo = photo, PhotoRecord(photo.to_dict())
+                    photo.update(changes)
+                    self._replace_photo(old, photo, in_list=False)
+                    updated[photo_id] = photo
+                update_results.append(photo)
+
+            removed = {}
+            delete_results = []
+            for photo_id in deleted_ids:
+                photo = self._by_id.get(photo_id)
+                delete_results.append(photo is not None and photo_id not in removed)
+                if photo is not None:
+                    removed[photo_id] = photo
+
+            added = [PhotoRecord.from_dict(photo) for photo in new_photos]
+            changed = bool(added or updated or removed)
+            if changed:
+                ticket = self._apply_changes(
+                    added,
+                    [photo for photo_id, photo in updated.items() if photo_id not in removed],
+                    list(removed.values()))
+        self._wait(ticket)
+        if changed:
+            self._changed()
+        return added, update_results, delete_results
+
+    def merge_remote(self, new_photos, removed_public_ids):
+        """Applique une synchronisation : ajoute les photos dont le public_id est
+        inconnu et retire celles dont le public_id a disparu, en une seule écriture.
+
+        Les autres photos (titres, descriptions, catégories) ne sont pas touchées.
+        Retourne (photos ajoutées, photos retirées).
+        """
+        ticket = None
+        with self._lock:
+            self._ensure_loaded()
+            known = {photo.get('public_id') for photo in self._photos}
+            added = []
+            for photo in new_photos:
+                if photo['public_id'] not in known:
+                    known.add(photo['public_id'])
+                    added.append(PhotoRecord.from_dict(photo))
+            removed = [photo for photo in self._photos if photo.get('public_id') in removed_public_ids]
+            if added or removed:
+                ticket = self._apply_changes(added, [], removed)
+        self._wait(ticket)
+        if added or removed:
+            self._changed()
+        return added, removed
+
+    def replace_all(self, photos):
+        """Remplace toute la galerie (reconstruction depuis Cloudinary)."""
+        with self._lock:
+            self._set_photos(photos)
+            try:
+                ticket = self._storage.save_photos(self._photos)
+            except Exception:
+                self._discard_unsaved()
+                raise
+            self._written(ticket)
+        self._wait(ticket)
+        self._changed()
+
+    def current_version(self):
+        """Version des données en cache, après vérification du stockage."""
+        with self._lock:
+            self._ensure_loaded()
+            return self.version
+
+    def snapshot_state(self):
+        """(photos, catégories, signature du stockage) cohérents entre eux, pour un snapshot.
+
+        Retourne None pendant une écriture différée : la signature du fichier
+        n'est pas encore connue (le snapshot sera publié à la fin de l'écriture).
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._pending_writes:
+                return None
+            return list(self._photos), sorted(self._by_category), self._signature
+
+    def invalidate(self):
+        """Force un rechargement depuis le stockage au prochain accès."""
+        with self._lock:
+            self.version += 1
+
+    def get_stats(self):
+        """Compteurs du cache (hits/misses/reloads/writes) et version courante."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['version'] = self.version
+            stats['photos'] = len(self._photos) if self._photos is not None else 0
+            return stats
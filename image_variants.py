@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Variantes d'images redimensionnées (Cloudinary) pour chaque photo.
+
+Chaque préréglage donne plusieurs largeurs ; les URLs sont calculées une
+fois, stockées dans `photo['variants']` et servies par /gallery sous une
+forme directement utilisable dans `<img srcset>` :
+
+    {'grid': {'src': '<url 600w>', 'srcset': '<url> 400w, <url> 600w, <url> 800w', 'width': 600}, ...}
+
+Recalculer les variantes des photos existantes :
+
+    python image_variants.py backfill [--force]
+"""
+import argparse
+import os
+
+# Toutes les variantes sont servies en format et qualité automatiques (WebP/AVIF, q_auto)
+BASE_TRANSFORMATION = {'fetch_format': 'auto', 'quality': 'auto'}
+
+# largeurs : candidates du srcset ; default : largeur de `src`
+PRESETS = {
+    'thumbnail': {'widths': [160, 320], 'default': 160,
+                  'transformation': {'crop': 'fill', 'aspect_ratio': '1:1', 'gravity': 'auto'}},
+    'grid': {'widths': [400, 600, 800], 'default': 600,
+             'transformation': {'crop': 'fill', 'aspect_ratio': '4:3', 'gravity': 'auto'}},
+    'slider': {'widths': [960, 1440, 1920], 'default': 1440,
+               'transformation': {'crop': 'limit'}},
+    'fullscreen': {'widths': [1280, 1920, 2560], 'default': 1920,
+                   'transformation': {'crop': 'limit'}},
+}
+
+
+def default_build_url(public_id, **transformation):
+    import cloudinary
+    return cloudinary.CloudinaryImage(public_id).build_url(secure=True, **transformation)
+
+
+def build_variants(public_id, build_url=default_build_url):
+    """Calcule les URLs de toutes les variantes d'une image."""
+    variants = {}
+    for name, preset in PRESETS.items():
+        urls = {}
+        for width in preset['widths']:
+            urls[width] = build_url(public_id, width=width, **preset['transformation'], **BASE_TRANSFORMATION)
+        variants[name] = {
+            'src': urls[preset['default']],
+            'srcset': ', '.join(f'{url} {width}w' for width, url in urls.items()),
+            'width': preset['default']
+        }
+    return variants
+
+
+def add_variants(photo, build_url=default_build_url, force=False):
+    """Ajoute les variantes à une photo si besoin. Retourne True si la photo a changé."""
+    if not photo.get('public_id') or (photo.get('variants') and not force):
+        return False
+    photo['variants'] = build_variants(photo['public_id'], build_url)
+    return True
+
+
+def backfill(storage, force=False, build_url=default_build_url):
+    """Calcule les variantes des photos qui n'en ont pas, en une seule écriture."""
+    photos = storage.load_photos()
+    changed = sum(add_variants(photo, build_url, force) for photo in photos)
+    if changed:
+        ticket = storage.save_photos(photos)
+        if ticket is not None:
+            ticket.wait()
+    return changed, len(photos)
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+    from storage import create_storage
+
+    parser = argparse.ArgumentParser(description="Variantes d'images du portfolio")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    backfill_parser = subparsers.add_parser('backfill', help='Calculer les variantes des photos existantes')
+    backfill_parser.add_argument('--force', action='store_true', help='Recalculer aussi les variantes existantes')
+    backfill_parser.add_argument('--backend', default=os.getenv('STORAGE_BACKEND', 'json'))
+    backfill_parser.add_argument('--db', default=os.getenv('SQLITE_PATH', 'portfolio.db'))
+    args = parser.parse_args()
+
+    if args.command == 'backfill':
+        storage = create_storage(args.backend, args.db)
+        changed, total = backfill(storage, force=args.force)
+        print(f"Variantes calculées pour {changed} photo(s) sur {total}")
+
+
+if __name__ == '__main__':
+    main()
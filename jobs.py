@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""File de tâches d'arrière-plan (synchronisation Cloudinary, suppressions distantes, variantes).
+
+Les tâches sont enregistrées dans une petite base SQLite (`jobs.db`), quel
+que soit le backend de stockage : tous les workers gunicorn voient le même
+état (`GET /admin/jobs/<id>`) et un processus séparé peut les exécuter.
+
+- JOB_RUNNER=thread (défaut) : chaque worker exécute les tâches dans ses
+  propres threads (au plus JOB_CONCURRENCY à la fois).
+- JOB_RUNNER=external : les workers web ne font qu'enregistrer les tâches ;
+  elles sont exécutées par `python jobs.py worker`.
+
+Une tâche qui échoue est relancée après un délai croissant (1 s, 2 s, 4 s...,
+au plus `max_backoff`) jusqu'à `max_attempts` tentatives. Une tâche
+« running » dont le processus a disparu (pas de nouvelle depuis `lease`
+secondes) est reprise par un autre exécutant.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL,
+    progress TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, run_after);
+"""
+
+# Statuts : queued -> running -> done | failed (running -> queued en cas de nouvelle tentative)
+
+
+class JobQueue:
+    """Tâches persistées dans SQLite, partagées entre processus."""
+
+    def __init__(self, path='jobs.db', max_attempts=5, lease=600, keep_finished=7 * 86400):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.keep_finished = keep_finished
+        self._local = threading.local()
+        # Réveille les exécutants de ce processus dès qu'une tâche est ajoutée
+        self.wakeup = threading.Event()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _job_from_row(self, row):
+        return {
+            'id': row['id'],
+            'type': row['type'],
+            'params': json.loads(row['params']),
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'max_attempts': row['max_attempts'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+            'run_after': row['run_after'],
+            'progress': json.loads(row['progress']) if row['progress'] else None,
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+        }
+
+    def submit(self, job_type, params=None, delay=0, batch_key=None, max_batch=1000):
+        """Ajoute une tâche et retourne son id.
+
+        Avec `batch_key`, la liste `params[batch_key]` est ajoutée à une tâche
+        du même type encore en attente (tant qu'elle reste sous `max_batch`
+        éléments) au lieu de créer une nouvelle tâche : des suppressions
+        rapprochées partent ainsi en un seul appel.
+        """
+        params = dict(params or {})
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if batch_key:
+                row = conn.execute(
+                    "SELECT id, params FROM jobs WHERE type = ? AND status = 'queued' AND attempts = 0 "
+                    "ORDER BY created_at DESC LIMIT 1", (job_type,)).fetchone()
+                if row is not None:
+                    queued = json.loads(row['params'])
+                    items = queued.get(batch_key, []) + [item for item in params.get(batch_key, [])
+                                                         if item not in queued.get(batch_key, [])]
+                    if len(items) <= max_batch:
+                        queued[batch_key] = items
+                        conn.execute('UPDATE jobs SET params = ? WHERE id = ?', (json.dumps(queued), row['id']))
+                        return row['id']
+            job_id = str(uuid.uuid4())
+            conn.execute(
+                'INSERT INTO jobs (id, type, params, max_attempts, run_after, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, job_type, json.dumps(params), self.max_attempts, now + delay, now)
+            )
+        self.wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._job_from_row(row) if row else None
+
+    def recent(self, limit=50):
+        rows = self._connect().execute('SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,))
+        return [self._job_from_row(row) for row in rows]
+
+    def counts(self):
+        """Nombre de tâches par statut."""
+        rows = self._connect().execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')
+        return {row['status']: row['n'] for row in rows}
+
+    def claim(self):
+        """Prend la prochaine tâche prête (ou abandonnée). Retourne le job ou None."""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE (status = 'queued' AND run_after <= ?) "
+                "OR (status = 'running' AND heartbeat_at < ?) ORDER BY run_after LIMIT 1",
+                (now, now - self.lease)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, heartbeat_at = ? "
+                "WHERE id = ?", (now, now, row['id']))
+        job = self._job_from_row(row)
+        job['attempts'] += 1
+        return job
+
+    def next_run_at(self):
+        """Date de la prochaine tâche en attente (None s'il n'y en a pas)."""
+        row = self._connect().execute("SELECT MIN(run_after) AS t FROM jobs WHERE status = 'queued'").fetchone()
+        return row['t']
+
+    def heartbeat(self, job_ids):
+        """Signale que ces tâches sont toujours en cours (voir `lease`)."""
+        with self._connect() as conn:
+            conn.executemany("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                             [(time.time(), job_id) for job_id in job_ids])
+
+    def set_progress(self, job_id, progress):
+        with self._connect() as conn:
+            conn.execute('UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ?',
+                         (json.dumps(progress), time.time(), job_id))
+
+    def finish(self, job_id, result):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ? WHERE id = ?",
+                         (json.dumps(result), time.time(), job_id))
+
+    def fail(self, job_id, error, retry_at=None):
+        """Enregistre un échec : nouvelle tentative à `retry_at`, ou échec définitif."""
+        with self._connect() as conn:
+            if retry_at is not None:
+                conn.execute("UPDATE jobs SET status = 'queued', error = ?, run_after = ? WHERE id = ?",
+                             (error, retry_at, job_id))
+            else:
+                conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                             (error, time.time(), job_id))
+
+    def purge(self):
+        """Supprime les tâches terminées depuis plus de `keep_finished` secondes."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                         (time.time() - self.keep_finished,))
+
+
+class Job:
+    """Tâche en cours d'exécution, passée aux fonctions d'exécution."""
+
+    def __init__(self, queue, data):
+        self._queue = queue
+        self.id = data['id']
+        self.type = data['type']
+        self.params = data['params']
+        self.attempts = data['attempts']
+        self._last_progress = 0.0
+
+    def progress(self, done, total, force=False, **extra):
+        """Enregistre l'avancement (au plus deux fois par seconde, sauf `force`)."""
+        now = time.monotonic()
+        if not force and now - self._last_progress < 0.5 and done < total:
+            return
+        self._last_progress = now
+        self._queue.set_progress(self.id, dict(extra, done=done, total=total))
+
+
+class JobRunner:
+    """Exécute les tâches de la file dans `concurrency` threads.
+
+    `handlers` associe chaque type de tâche à une fonction `handler(job)` qui
+    retourne un résultat sérialisable en JSON ou lève une exception.
+    """
+
+    def __init__(self, queue, handlers, concurrency=2, poll_interval=2.0, base_backoff=1.0, max_backoff=300.0):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._threads = []
+        self._running = set()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {'started': 0, 'succeeded': 0, 'retried': 0, 'failed': 0, 'running': 0}
+
+    def start(self):
+        """Démarre les threads d'exécution (une seule fois par processus)."""
+        with self._lock:
+            if self._threads:
+                return
+            self.queue.purge()
+            for i in range(self.concurrency):
+                thread = threading.Thread(target=self._loop, name=f'job-runner-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self.queue.wakeup.set()
+
+    def backoff(self, attempts):
+        """Délai avant la tentative suivante : exponentiel, plafonné, avec un peu d'aléa."""
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once()
+            except Exception as e:
+                print(f"Erreur de la file de tâches: {e}")
+                ran = False
+            if ran:
+                continue
+            # Rien à faire : attendre un ajout dans ce processus, la prochaine tâche prévue ou le sondage
+            timeout = self.poll_interval
+            next_run = self.queue.next_run_at()
+            if next_run is not None:
+                timeout = max(0.0, min(timeout, next_run - time.time()))
+            self.queue.wakeup.wait(timeout)
+            self.queue.wakeup.clear()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.queue.lease / 4):
+            with self._lock:
+                running = list(self._running)
+            if running:
+                try:
+                    self.queue.heartbeat(running)
+                except Exception as e:
+                    print(f"Erreur de la file de tâches: {e}")
+
+    def run_once(self):
+        """Exécute une tâche prête. Retourne False s'il n'y en avait pas."""
+        data = self.queue.claim()
+        if data is None:
+            return False
+        job = Job(self.queue, data)
+        with self._lock:
+            self.stats['started'] += 1
+            self.stats['running'] += 1
+            self._running.add(job.id)
+        try:
+            handler = self.handlers.get(job.type)
+            if handler is None:
+                raise ValueError(f"Type de tâche inconnu: {job.type}")
+            result = handler(job)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job.attempts < data['max_attempts']:
+                self.queue.fail(job.id, error, retry_at=time.time() + self.backoff(job.attempts))
+                outcome = 'retried'
+            else:
+                self.queue.fail(job.id, error)
+                outcome = 'failed'
+            print(f"Tâche {job.type} {job.id} en échec (tentative {job.attempts}/{data['max_attempts']}): {error}")
+        else:
+            self.queue.finish(job.id, result)
+            outcome = 'succeeded'
+        with self._lock:
+            self.stats[outcome] += 1
+            self.stats['running'] -= 1
+            self._running.discard(job.id)
+        return True
+
+    def run_forever(self):
+        """Exécution dans un processus dédié (`python jobs.py worker`)."""
+        self.start()
+        try:
+            while not self._stop.is_set():
+                self.queue.purge()
+                self._stop.wait(3600)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['threads'] = len(self._threads)
+        stats['queue'] = self.queue.counts()
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="File de tâches d'arrière-plan du portfolio")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    worker_parser = subparsers.add_parser('worker', help='Exécuter les tâches (avec JOB_RUNNER=external côté web)')
+    worker_parser.add_argument('--concurrency', type=int, default=int(os.getenv('JOB_CONCURRENCY', '2')))
+    list_parser = subparsers.add_parser('list', help='Afficher les dernières tâches')
+    list_parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        # L'application fournit les fonctions d'exécution et les stores partagés
+        os.environ['JOB_RUNNER'] = 'external'
+        import app
+        app.create_app()
+        app.job_runner.concurrency = args.concurrency
+        print(f"Exécution des tâches de {app.job_queue.path} ({args.concurrency} à la fois)")
+        app.job_runner.run_forever()
+    else:
+        queue = JobQueue(os.getenv('JOBS_DB', 'jobs.db'))
+        for job in queue.recent(args.limit):
+            progress = job['progress'] or {}
+            print(f"{job['id']}  {job['type']:<18} {job['status']:<8} tentative {job['attempts']}/{job['max_attempts']}"
+                  f"  {progress.get('done', '')}/{progress.get('total', '')}  {job['error'] or ''}")
+
+
+if __name__ == '__main__':
+    main()
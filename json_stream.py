@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Lecture incrémentale des fichiers JSON du stockage (sans tout charger en mémoire).
+
+    with open('messages.json') as f:
+        for message in JsonStream(f).iter_array():
+            ...
+
+Seul l'élément en cours de lecture est gardé en mémoire, avec un tampon de
+`chunk_size` caractères.
+"""
+import json
+
+WHITESPACE = ' \t\r\n'
+
+
+class JsonStream:
+    """Parcourt un tableau ou un objet JSON de premier niveau élément par élément."""
+
+    def __init__(self, f, chunk_size=65536):
+        self._f = f
+        self.chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Lit un bloc de plus. Retourne False en fin de fichier."""
+        if self._eof:
+            return False
+        chunk = self._f.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Prochain caractère significatif ('' en fin de fichier)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"JSON invalide : {' ou '.join(repr(c) for c in chars)} attendu, {char!r} trouvé")
+        self._pos += 1
+        return char
+
+    def value(self):
+        """Décode la prochaine valeur complète."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # Valeur coupée par la fin du tampon : lire la suite
+                if not self._fill():
+                    raise
+                continue
+            # Un nombre en fin de tampon peut continuer dans le bloc suivant
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def iter_array(self):
+        """Éléments du tableau qui commence à la position courante."""
+        self._expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self._expect(',]') == ']':
+                return
+
+    def iter_keys(self):
+        """Clés de l'objet qui commence à la position courante.
+
+        Après chaque clé, l'appelant doit lire la valeur (`value()` ou `iter_array()`).
+        """
+        self._expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self._expect(':')
+            yield key
+            if self._expect(',}') == '}':
+                return
+
+    def iter_items(self):
+        """Paires (clé, valeur) de l'objet qui commence à la position courante."""
+        for key in self.iter_keys():
+            yield key, self.value()
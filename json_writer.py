@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Écriture des fichiers JSON : remplacement atomique, verrou inter-processus et regroupement."""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from photo_record import json_default
+
+try:
+    import fcntl
+except ImportError:
+    # Pas de verrou inter-processus hors Unix (développement sous Windows)
+    fcntl = None
+
+# Umask du processus (lu une fois : os.umask ne permet pas de le lire sans le modifier)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _file_mode(path):
+    """Droits à donner au fichier remplaçant `path` : ceux du fichier existant, sinon 0666 moins l'umask."""
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+@contextmanager
+def file_lock(path):
+    """Verrou exclusif inter-processus (fcntl) sur un fichier `<path>.lock`."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class WriteTicket:
+    """Écriture en attente ; `wait()` bloque jusqu'à ce qu'elle soit sur disque."""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.signature = None
+        self.error = None
+        self._done = threading.Event()
+
+    def _finish(self, signature=None, error=None):
+        self.signature = signature
+        self.error = error
+        self.payload = None
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class JsonWriter:
+    """Écrit les fichiers JSON de façon atomique et regroupe les écritures rapprochées.
+
+    Chaque écriture passe par un fichier temporaire, fsync puis os.replace,
+    sous un verrou fcntl : un lecteur d'un autre worker voit toujours soit
+    l'ancien fichier complet, soit le nouveau. Les écritures soumises sur un
+    même fichier pendant `window` secondes (ou pendant qu'une écriture est en
+    cours) sont fusionnées : seul le contenu le plus récent est écrit, une fois.
+    """
+
+    def __init__(self, compact=False, window=0.005):
+        self.compact = compact
+        self.window = window
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._thread = None
+        self.stats = {'writes': 0, 'coalesced': 0, 'errors': 0,
+                      'total_latency_ms': 0.0, 'max_latency_ms': 0.0, 'last_latency_ms': 0.0}
+        atexit.register(self.flush)
+
+    def dumps(self, data):
+        """Sérialise en JSON (compact, ou indenté comme historiquement)."""
+        if self.compact:
+            return json.dumps(data, separators=(',', ':'), default=json_default).encode('utf-8')
+        return json.dumps(data, indent=2, default=json_default).encode('utf-8')
+
+    def submit(self, path, data):
+        """Planifie l'écriture de `data` (sérialisé tout de suite) et retourne un WriteTicket."""
+        payload = self.dumps(data)
+        with self._cond:
+            ticket = self._pending.get(path)
+            if ticket is not None:
+                # Une écriture est déjà prévue pour ce fichier : on remplace son contenu
+                ticket.payload = payload
+                self.stats['coalesced'] += 1
+                return ticket
+            ticket = self._pending[path] = WriteTicket(payload)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='json-writer', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return ticket
+
+    def write(self, path, data):
+        """Écrit `data` et attend que ce soit sur disque."""
+        self.submit(path, data).wait()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # Laisser le temps aux écritures proches d'être regroupées
+            time.sleep(self.window)
+            self.flush()
+
+    def flush(self):
+        """Écrit immédiatement toutes les écritures en attente."""
+        with self._cond:
+            pending, self._pending = self._pending, {}
+        for path, ticket in pending.items():
+            try:
+                signature = self.write_atomic(path, ticket.payload)
+            except Exception as e:
+                print(f"Erreur lors de l'écriture de {path}: {e}")
+                with self._cond:
+                    self.stats['errors'] += 1
+                ticket._finish(error=e)
+            else:
+                ticket._finish(signature=signature)
+
+    def write_atomic(self, path, payload, lock=True):
+        """Remplace `path` par `payload` de façon atomique. Retourne la signature du nouveau fichier.
+
+        `payload` est un bytes, ou un itérable de bytes écrit au fil de l'eau
+        (réécriture en flux d'un gros fichier, voir JsonStorage.import_records).
+        Avec lock=False, l'appelant doit déjà détenir `file_lock(path)`.
+        """
+        start = time.perf_counter()
+        if lock:
+            with file_lock(path):
+                signature = self._replace(path, payload)
+        else:
+            signature = self._replace(path, payload)
+        latency_ms = (time.perf_counter() - start) * 1000
+        with self._cond:
+            self.stats['writes'] += 1
+            self.stats['total_latency_ms'] += latency_ms
+            self.stats['last_latency_ms'] = latency_ms
+            self.stats['max_latency_ms'] = max(self.stats['max_latency_ms'], latency_ms)
+        return signature
+
+    def _replace(self, path, payload):
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                # mkstemp crée le fichier en 0600 : garder les droits du fichier remplacé
+                if hasattr(os, 'fchmod'):
+                    os.fchmod(f.fileno(), _file_mode(path))
+                if isinstance(payload, bytes):
+                    f.write(payload)
+                else:
+                    for chunk in payload:
+                        f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        # Signature prise sous le verrou : c'est bien notre fichier
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats['pending'] = len(self._pending)
+            stats['compact'] = self.compact
+            stats['avg_latency_ms'] = stats['total_latency_ms'] / stats['writes'] if stats['writes'] else 0.0
+            return stats
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Cache en mémoire des messages, indexés par destinataire, avec compteurs de non lus."""
+import threading
+
+
+class MessageStore:
+    """Boîtes de réception en mémoire au-dessus du backend de stockage.
+
+    Les messages sont indexés par destinataire et un compteur de messages non
+    lus est tenu à jour à chaque envoi et à chaque lecture, pour que le badge
+    de la barre de navigation ne parcoure jamais les messages. Comme pour la
+    galerie, le cache est rechargé si la signature du stockage change.
+
+    `on_unread_change(username)` est appelé quand le nombre de non lus d'un
+    utilisateur change dans ce worker (notifications temps réel).
+    """
+
+    def __init__(self, storage, on_unread_change=None):
+        self._storage = storage
+        self._on_unread_change = on_unread_change
+        self._lock = threading.RLock()
+        self._messages = None
+        self._by_id = {}
+        self._by_recipient = {}
+        self._unread = {}
+        self._signature = None
+        self._pending_writes = 0
+        self._last_ticket = None
+        self.version = 0
+        self.stats = {'hits': 0, 'misses': 0, 'reloads': 0, 'writes': 0}
+
+    def _set_messages(self, messages):
+        self._messages = messages
+        self._by_id = {}
+        self._by_recipient = {}
+        self._unread = {}
+        for message in messages:
+            self._index_message(message)
+
+    def _index_message(self, message):
+        self._by_id[str(message.get('id'))] = message
+        self._by_recipient.setdefault(message['to'], []).append(message)
+        if not message['read']:
+            self._unread[message['to']] = self._unread.get(message['to'], 0) + 1
+
+    def _ensure_loaded(self):
+        """Recharge les messages si le stockage a été modifié ailleurs."""
+        if self._messages is not None and self._pending_writes:
+            # Nos propres écritures sont en cours : le cache fait foi
+            self.stats['hits'] += 1
+            return
+        signature = self._storage.messages_signature()
+        if self._messages is not None and signature == self._signature:
+            self.stats['hits'] += 1
+            return
+
+        self.stats['misses'] += 1
+        try:
+            messages = self._storage.load_messages()
+        except Exception as e:
+            print(f"Erreur lors du chargement des messages: {e}")
+            if self._messages is None:
+                self._set_messages([])
+            return
+        if self._messages is not None:
+            self.stats['reloads'] += 1
+        self._set_messages(messages)
+        self.version += 1
+        self._signature = signature
+
+    def _written(self, ticket):
+        self.version += 1
+        self.stats['writes'] += 1
+        if ticket is None:
+            self._signature = self._storage.messages_signature()
+        else:
+            self._pending_writes += 1
+            self._last_ticket = ticket
+
+    def _wait(self, ticket):
+        """Attend une écriture différée, hors du verrou pour qu'elle puisse être regroupée."""
+        if ticket is None:
+            return
+        try:
+            ticket.wait()
+        except Exception:
+            with self._lock:
+                self._pending_writes -= 1
+                self._signature = None
+            raise
+        with self._lock:
+            self._pending_writes -= 1
+            if not self._pending_writes and self._signature is not None:
+                self._signature = self._last_ticket.signature
+
+    def all(self):
+        """Retourne tous les messages (à ne pas modifier directement)."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._messages
+
+    def for_user(self, username):
+        """Messages reçus par un utilisateur."""
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._by_recipient.get(username, []))
+
+    def page(self, username, page=1, per_page=20):
+        """Une page de la boîte de réception (plus récents d'abord).
+
+        Retourne (messages, total). Les messages sont des copies : leur état
+        'lu' reste celui d'avant un éventuel mark_read.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            inbox = self._by_recipient.get(username, [])
+            # L'index est dans l'ordre d'envoi : la page 1 est la fin de la liste
+            end = max(0, len(inbox) - (page - 1) * per_page)
+            start = max(0, end - per_page)
+            return [dict(message) for message in reversed(inbox[start:end])], len(inbox)
+
+    def unread_count(self, username):
+        """Nombre de messages non lus d'un utilisateur (compteur maintenu, O(1))."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._unread.get(username, 0)
+
+    def add(self, message):
+        """Ajoute un message et le persiste."""
+        with self._lock:
+            self._ensure_loaded()
+            self._messages.append(message)
+            self._index_message(message)
+            ticket = self._storage.add_message(message, self._messages)
+            self._written(ticket)
+        self._wait(ticket)
+        if self._on_unread_change:
+            self._on_unread_change(message['to'])
+        return message
+
+    def mark_read(self, username, message_ids=None):
+        """Marque comme lus les messages d'un utilisateur (tous, ou seulement `message_ids`).
+
+        Seuls les messages encore non lus sont réécrits. Retourne le nombre de
+        messages concernés (0 si aucun n'est trouvé).
+        """
+        ticket = None
+        with self._lock:
+            self._ensure_loaded()
+            if message_ids is None:
+                matched = self._by_recipient.get(username, [])
+            else:
+                messages = (self._by_id.get(str(message_id)) for message_id in message_ids)
+                matched = [message for message in messages if message is not None and message['to'] == username]
+
+            changed = [message for message in matched if not message['read']]
+            if changed:
+                for message in changed:
+                    message['read'] = True
+                self._unread[username] = self._unread.get(username, 0) - len(changed)
+                ticket = self._storage.update_messages(changed, self._messages)
+                self._written(ticket)
+        self._wait(ticket)
+        if changed and self._on_unread_change:
+            self._on_unread_change(username)
+        return len(matched)
+
+    def replace_all(self, messages):
+        """Remplace tous les messages."""
+        with self._lock:
+            self._set_messages(list(messages))
+            ticket = self._storage.save_messages(self._messages)
+            self._written(ticket)
+        self._wait(ticket)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['version'] = self.version
+            stats['messages'] = len(self._messages) if self._messages is not None else 0
+            return stats
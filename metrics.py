@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""Métriques de l'application, exposées au format texte Prometheus (/admin/metrics).
+
+- latence des routes (histogramme par route, méthode et statut)
+- tailles des requêtes et des réponses
+- lectures et écritures du stockage (nombre, durée, octets)
+- appels à l'API Cloudinary (latence, erreurs)
+
+Le temps de chaque requête est aussi découpé par phase (stockage, Cloudinary,
+reste) : au-delà de `slow_request_ms`, la requête est journalisée avec ce
+détail. Les métriques sont propres à chaque worker.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Bornes des histogrammes (secondes et octets)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# Méthodes du stockage mesurées (voir storage.Storage)
+STORAGE_OPERATIONS = (
+    'load_photos', 'load_photo_records', 'save_photos', 'add_photo', 'update_photo', 'delete_photo', 'apply_photo_changes',
+    'load_users', 'save_users', 'add_user',
+    'load_messages', 'save_messages', 'add_message', 'update_messages',
+    'record_visits', 'visit_counts', 'schema_version',
+)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, amount, values):
+        self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for values, total in sorted(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, values)} {_format_number(total)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # labels -> [compte par borne..., somme, total]
+        self._values = {}
+
+    def observe(self, value, values):
+        series = self._values.get(values)
+        if series is None:
+            series = self._values[values] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for values, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels, values, [('le', _format_number(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, values, [('le', '+Inf')])
+            lines.append(f'{self.name}_bucket{labels} {series[-1]}')
+            labels = _format_labels(self.labels, values)
+            lines.append(f'{self.name}_sum{labels} {_format_number(series[-2])}')
+            lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+class Metrics:
+    """Registre des métriques d'un worker et détail par phase de la requête en cours."""
+
+    def __init__(self, slow_request_ms=0):
+        self.slow_request_ms = slow_request_ms
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._metrics = {}
+        self.started_at = time.time()
+
+        self.request_latency = self.histogram(
+            'portfolio_request_duration_seconds', 'Durée des requêtes HTTP (jusqu\'aux en-têtes)',
+            ('route', 'method', 'status'))
+        self.request_size = self.histogram(
+            'portfolio_request_size_bytes', 'Taille du corps des requêtes', ('route', 'method'), SIZE_BUCKETS)
+        self.response_size = self.histogram(
+            'portfolio_response_size_bytes', 'Taille du corps des réponses (hors flux)',
+            ('route', 'method'), SIZE_BUCKETS)
+        self.slow_requests = self.counter(
+            'portfolio_slow_requests_total', 'Requêtes plus lentes que le seuil du journal', ('route',))
+        self.storage_latency = self.histogram(
+            'portfolio_storage_operation_duration_seconds', 'Durée des opérations du stockage',
+            ('backend', 'operation'))
+        self.storage_errors = self.counter(
+            'portfolio_storage_errors_total', 'Erreurs des opérations du stockage',
+            ('backend', 'operation', 'error'))
+        self.storage_read_bytes = self.histogram(
+            'portfolio_storage_read_bytes', 'Taille des fichiers JSON lus', ('file',), SIZE_BUCKETS)
+        self.file_write_latency = self.histogram(
+            'portfolio_file_write_duration_seconds', 'Durée des écritures atomiques de fichiers JSON', ('file',))
+        self.file_write_bytes = self.histogram(
+            'portfolio_file_write_bytes', 'Taille des fichiers JSON écrits', ('file',), SIZE_BUCKETS)
+        self.write_wait = self.histogram(
+            'portfolio_write_wait_seconds', 'Attente des écritures différées (regroupement et disque)', ('file',))
+        self.cloudinary_latency = self.histogram(
+            'portfolio_cloudinary_request_duration_seconds', 'Durée des appels à l\'API Cloudinary', ('call',))
+        self.cloudinary_errors = self.counter(
+            'portfolio_cloudinary_errors_total', 'Erreurs des appels à l\'API Cloudinary', ('call', 'error'))
+
+    # --- Déclaration et mise à jour ---
+    def counter(self, name, help, labels=()):
+        return self._metrics.setdefault(name, Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+    def observe(self, metric, value, *values):
+        with self._lock:
+            metric.observe(value, values)
+
+    def inc(self, metric, *values, amount=1):
+        with self._lock:
+            metric.inc(amount, values)
+
+    # --- Phases de la requête en cours ---
+    def start_request(self):
+        self._local.start = time.perf_counter()
+        self._local.phases = {}
+
+    def add_phase(self, name, seconds):
+        """Ajoute une durée à une phase de la requête en cours (s'il y en a une)."""
+        phases = getattr(self._local, 'phases', None)
+        if phases is not None:
+            total, count = phases.get(name, (0.0, 0))
+            phases[name] = (total + seconds, count + 1)
+
+    def finish_request(self, route, method, status, request_size=None, response_size=None):
+        """Enregistre la requête en cours. Retourne sa durée en secondes."""
+        start = getattr(self._local, 'start', None)
+        if start is None:
+            return None
+        duration = time.perf_counter() - start
+        phases = self._local.phases
+        self._local.start = self._local.phases = None
+
+        with self._lock:
+            self.request_latency.observe(duration, (route, method, str(status)))
+            if request_size:
+                self.request_size.observe(request_size, (route, method))
+            if response_size is not None:
+                self.response_size.observe(response_size, (route, method))
+        if self.slow_request_ms and duration * 1000 >= self.slow_request_ms:
+            self.inc(self.slow_requests, route)
+            self.log_slow_request(method, route, status, duration, phases)
+        return duration
+
+    def log_slow_request(self, method, route, status, duration, phases):
+        accounted = sum(total for total, _ in phases.values())
+        details = ', '.join(f'{name} {total * 1000:.1f} ms x{count}'
+                            for name, (total, count) in sorted(phases.items(), key=lambda item: -item[1][0]))
+        other = max(0.0, duration - accounted) * 1000
+        print(f"Requête lente : {method} {route} {status} en {duration * 1000:.1f} ms "
+              f"({details + ', ' if details else ''}reste {other:.1f} ms)")
+
+    @contextmanager
+    def timed(self, histogram, phase, *values, errors=None):
+        """Mesure un bloc : histogramme, phase de la requête et, en cas d'exception,
+        compteur d'erreurs (mêmes labels suivis du type de l'exception)."""
+        # Seul le bloc le plus externe compte comme phase (pas de double comptage)
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            if errors is not None:
+                self.inc(errors, *values, type(e).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self._local.depth = depth
+            self.observe(histogram, elapsed, *values)
+            if depth == 0:
+                self.add_phase(phase, elapsed)
+
+    # --- Branchements ---
+    def init_app(self, app):
+        """Mesure chaque requête de l'application Flask."""
+        from flask import request
+
+        @app.before_request
+        def metrics_start_request():
+            self.start_request()
+
+        @app.after_request
+        def metrics_finish_request(response):
+            route = request.url_rule.rule if request.url_rule is not None else 'inconnue'
+            response_size = None if response.is_streamed else response.calculate_content_length()
+            self.finish_request(route, request.method, response.status_code,
+                                request.content_length, response_size)
+            return response
+
+        @app.teardown_request
+        def metrics_failed_request(error):
+            # after_request n'est pas appelé si la vue lève une exception non gérée
+            if error is not None:
+                route = request.url_rule.rule if request.url_rule is not None else 'inconnue'
+                self.finish_request(route, request.method, 500, request.content_length)
+
+    def instrument_storage(self, storage):
+        """Mesure les opérations d'un backend de stockage (et ses écritures de fichiers JSON)."""
+        backend = type(storage).__name__
+        # Taille des fichiers lus par les chargements du stockage JSON
+        read_files = {
+            'load_photos': getattr(storage, 'gallery_file', None),
+            'load_photo_records': getattr(storage, 'gallery_file', None),
+            'load_users': getattr(storage, 'users_file', None),
+            'load_messages': getattr(storage, 'messages_file', None),
+        }
+        for operation in STORAGE_OPERATIONS:
+            method = getattr(storage, operation, None)
+            if method is None:
+                continue
+            setattr(storage, operation, self._wrap_storage(method, backend, operation, read_files.get(operation)))
+        writer = getattr(storage, 'writer', None)
+        if writer is not None:
+            self.instrument_writer(writer)
+        return storage
+
+    def _wrap_storage(self, method, backend, operation, read_file):
+        phase = f'storage.{operation}'
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            with self.timed(self.storage_latency, phase, backend, operation, errors=self.storage_errors):
+                result = method(*args, **kwargs)
+            if read_file:
+                try:
+                    self.observe(self.storage_read_bytes, os.path.getsize(read_file), os.path.basename(read_file))
+                except OSError:
+                    pass
+            return result
+        return wrapper
+
+    def instrument_writer(self, writer):
+        """Mesure les écritures d'un JsonWriter : durée et taille par fichier, et attente
+        des écritures différées par les requêtes."""
+        write_atomic = writer.write_atomic
+        submit = writer.submit
+
+        @wraps(write_atomic)
+        def wrapper(path, payload, lock=True):
+            name = os.path.basename(path)
+            if isinstance(payload, bytes):
+                self.observe(self.file_write_bytes, len(payload), name)
+                with self.timed(self.file_write_latency, 'file.write', name):
+                    return write_atomic(path, payload, lock=lock)
+            # Écriture en flux (itérable de morceaux) : taille comptée au passage
+            size = 0
+
+            def counted():
+                nonlocal size
+                for chunk in payload:
+                    size += len(chunk)
+                    yield chunk
+            with self.timed(self.file_write_latency, 'file.write', name):
+                signature = write_atomic(path, counted(), lock=lock)
+            self.observe(self.file_write_bytes, size, name)
+            return signature
+        writer.write_atomic = wrapper
+
+        @wraps(submit)
+        def submit_wrapper(path, data):
+            return TimedTicket(submit(path, data), self, os.path.basename(path))
+        writer.submit = submit_wrapper
+        return writer
+
+    def instrument_api(self, api, prefix):
+        """Enveloppe un module d'API (ex. cloudinary.api) : chaque appel est mesuré."""
+        return InstrumentedApi(api, self, prefix)
+
+    # --- Export ---
+    def render(self, extra_lines=()):
+        """Toutes les métriques au format texte Prometheus."""
+        with self._lock:
+            lines = []
+            for metric in self._metrics.values():
+                lines.extend(metric.render())
+        lines.extend(['# HELP portfolio_uptime_seconds Durée depuis le démarrage du worker',
+                      '# TYPE portfolio_uptime_seconds gauge',
+                      f'portfolio_uptime_seconds {time.time() - self.started_at:.3f}'])
+        lines.extend(extra_lines)
+        return '\n'.join(lines) + '\n'
+
+
+class TimedTicket:
+    """WriteTicket dont l'attente est mesurée (phase 'storage.wait')."""
+
+    def __init__(self, ticket, metrics, name):
+        self._ticket = ticket
+        self._metrics = metrics
+        self._name = name
+
+    def wait(self):
+        with self._metrics.timed(self._metrics.write_wait, 'storage.wait', self._name):
+            return self._ticket.wait()
+
+    def __getattr__(self, name):
+        return getattr(self._ticket, name)
+
+
+class InstrumentedApi:
+    """Mandataire d'un module d'API : latence et erreurs de chaque fonction appelée."""
+
+    def __init__(self, api, metrics, prefix):
+        self._api = api
+        self._metrics = metrics
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        attribute = getattr(self._api, name)
+        if not callable(attribute):
+            return attribute
+        metrics = self._metrics
+        call = f'{self._prefix}.{name}'
+
+        @wraps(attribute)
+        def wrapper(*args, **kwargs):
+            with metrics.timed(metrics.cloudinary_latency, f'cloudinary.{name}', call,
+                               errors=metrics.cloudinary_errors):
+                return attribute(*args, **kwargs)
+        return wrapper
+
+
+def gauge_lines(name, help, values, label=None):
+    """Lignes Prometheus d'une jauge calculée à la demande (valeur unique ou {label: valeur})."""
+    return _computed_lines('gauge', name, help, values, label)
+
+
+def counter_lines(name, help, values, label=None):
+    """Comme gauge_lines, pour un total cumulé tenu ailleurs (nom en `_total`)."""
+    return _computed_lines('counter', name, help, values, label)
+
+
+def _computed_lines(kind, name, help, values, label):
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+    if label is None:
+        lines.append(f'{name} {_format_number(values)}')
+    else:
+        for key, value in sorted(values.items()):
+            lines.append(f'{name}{_format_labels((label,), (key,))} {_format_number(value)}')
+    return lines
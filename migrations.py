@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Migrations du schéma des données (photos, utilisateurs, messages).
+
+Le numéro de schéma est enregistré dans le stockage (`schema_version` dans
+data.json, table meta en SQLite). Les migrations sont appliquées une seule
+fois, au démarrage de l'application ou en ligne de commande :
+
+    python migrations.py [--check]
+
+Les lectures supposent ensuite que les données sont au schéma courant.
+"""
+import argparse
+import json
+import os
+
+from photo_record import json_default
+
+
+def migrate_v1(photos, users, messages):
+    """Catégories en liste, titre, description et état 'lu' toujours présents."""
+    for photo in photos:
+        # Ancien format avec 'category' (chaîne) : convertir en 'categories' (liste)
+        if 'category' in photo and 'categories' not in photo:
+            category = photo.pop('category')
+            photo['categories'] = [category] if category else ['Non catégorisé']
+        elif not photo.get('categories'):
+            photo['categories'] = ['Non catégorisé']
+        elif not isinstance(photo['categories'], list):
+            photo['categories'] = [photo['categories']]
+        photo.setdefault('description', '')
+        photo.setdefault('title', '')
+    for message in messages:
+        message.setdefault('read', False)
+
+
+# (version, description, fonction) dans l'ordre d'application
+MIGRATIONS = [
+    (1, 'Catégories en liste ; titre, description et lu par défaut', migrate_v1),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def pending_migrations(storage):
+    """Migrations restant à appliquer sur ce stockage."""
+    current = storage.schema_version()
+    return [migration for migration in MIGRATIONS if migration[0] > current]
+
+
+def fingerprint(data):
+    """Forme comparable de données chargées, pour savoir si une migration les a modifiées."""
+    return json.dumps(data, sort_keys=True, default=json_default)
+
+
+def run_migrations(storage):
+    """Met le stockage au schéma courant. Retourne les migrations appliquées.
+
+    Un verrou empêche deux workers de migrer en même temps ; le second
+    trouve le schéma déjà à jour et ne fait rien. Seules les données
+    modifiées par une migration sont réécrites (pas de users.json ou
+    messages.json vides créés pour rien).
+    """
+    with storage.migration_lock():
+        pending = pending_migrations(storage)
+        if not pending:
+            return []
+        photos = storage.load_photos()
+        users = storage.load_users()
+        messages = storage.load_messages()
+        before = [fingerprint(data) for data in (photos, users, messages)]
+        for version, description, migrate in pending:
+            print(f"Migration du schéma vers la version {version} : {description}")
+            migrate(photos, users, messages)
+        tickets = []
+        if fingerprint(users) != before[1]:
+            tickets.append(storage.save_users(users))
+        if fingerprint(messages) != before[2]:
+            tickets.append(storage.save_messages(messages))
+        if fingerprint(photos) != before[0]:
+            tickets.append(storage.save_photos(photos))
+        for ticket in tickets:
+            if ticket is not None:
+                ticket.wait()
+        # Le numéro de schéma n'est écrit qu'une fois toutes les données migrées
+        storage.set_schema_version(SCHEMA_VERSION)
+        return pending
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+    from storage import create_storage
+
+    parser = argparse.ArgumentParser(description='Migrations du schéma des données du portfolio')
+    parser.add_argument('--backend', default=os.getenv('STORAGE_BACKEND', 'json'))
+    parser.add_argument('--db', default=os.getenv('SQLITE_PATH', 'portfolio.db'))
+    parser.add_argument('--check', action='store_true', help='Afficher les migrations en attente sans les appliquer')
+    args = parser.parse_args()
+
+    storage = create_storage(args.backend, args.db)
+    if args.check:
+        pending = pending_migrations(storage)
+        print(f"Schéma actuel : {storage.schema_version()}, schéma courant : {SCHEMA_VERSION}")
+        for version, description, _ in pending:
+            print(f"  en attente : {version} - {description}")
+        return
+    applied = run_migrations(storage)
+    print(f"{len(applied)} migration(s) appliquée(s), schéma en version {SCHEMA_VERSION}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Notifications des changements de messages non lus (Server-Sent Events et long-polling)."""
+import threading
+import time
+
+
+class UnreadNotifier:
+    """Réveille les connexions en attente quand le nombre de non lus d'un utilisateur change.
+
+    Les changements faits dans ce worker sont signalés par `notify()` ; ceux
+    faits par un autre worker sont détectés en revérifiant le compteur toutes
+    les `check_interval` secondes. Le nombre d'abonnés simultanés est borné
+    pour ne pas bloquer tous les workers synchrones avec des connexions longues.
+    """
+
+    def __init__(self, max_subscribers=20):
+        self.max_subscribers = max_subscribers
+        self._condition = threading.Condition()
+        self._versions = {}
+        self._subscribers = 0
+        self.stats = {'notifications': 0, 'rejected': 0}
+
+    def notify(self, username):
+        """Signale un changement pour un utilisateur."""
+        with self._condition:
+            self._versions[username] = self._versions.get(username, 0) + 1
+            self.stats['notifications'] += 1
+            self._condition.notify_all()
+
+    def version(self, username):
+        with self._condition:
+            return self._versions.get(username, 0)
+
+    def wait(self, username, seen_version, timeout):
+        """Attend un changement après `seen_version`. Retourne la nouvelle version ou None."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._versions.get(username, 0) == seen_version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            return self._versions.get(username, 0)
+
+    def acquire(self):
+        """Réserve une place d'abonné. Retourne False si la limite est atteinte."""
+        with self._condition:
+            if self._subscribers >= self.max_subscribers:
+                self.stats['rejected'] += 1
+                return False
+            self._subscribers += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self._subscribers -= 1
+
+    def get_stats(self):
+        with self._condition:
+            stats = dict(self.stats)
+            stats['subscribers'] = self._subscribers
+            stats['max_subscribers'] = self.max_subscribers
+            return stats
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Représentation compacte des photos gardées en mémoire par GalleryStore.
+
+Un dict par photo répète les mêmes clés et les mêmes noms de catégories
+dans chaque photo de chaque worker. PhotoRecord range les champs connus dans
+des `__slots__` et les catégories sous forme d'identifiants entiers (noms
+internés une seule fois par processus). Un PhotoRecord se lit comme un dict
+(`photo['title']`, `photo.get('variants')`, `'url' in photo`) et n'est
+reconverti en dict qu'à la sérialisation (`to_dict()`).
+
+Mesure de la mémoire : `python bench.py --memory`.
+"""
+import threading
+
+# Champs rangés dans les slots ; les autres clés éventuelles vont dans `_extra`
+FIELDS = ('id', 'public_id', 'url', 'uploaded_at', 'title', 'description', 'variants')
+# Ordre des clés à la sérialisation (celui des fichiers existants)
+KEY_ORDER = ('id', 'public_id', 'url', 'uploaded_at', 'categories', 'description', 'title', 'variants')
+
+_MISSING = object()
+
+
+class CategoryTable:
+    """Noms de catégories internés : nom <-> identifiant entier."""
+
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+        self._lock = threading.Lock()
+
+    def intern(self, name):
+        category_id = self._ids.get(name)
+        if category_id is None:
+            with self._lock:
+                category_id = self._ids.get(name)
+                if category_id is None:
+                    category_id = self._ids[name] = len(self._names)
+                    self._names.append(name)
+        return category_id
+
+    def name(self, category_id):
+        return self._names[category_id]
+
+    def __len__(self):
+        return len(self._names)
+
+
+# Table partagée par toutes les photos du processus (les ids ne sont jamais réutilisés)
+CATEGORIES = CategoryTable()
+
+
+class PhotoRecord:
+    """Photo en mémoire : champs dans des slots, catégories en identifiants."""
+
+    __slots__ = FIELDS + ('_category_ids', '_extra')
+
+    def __init__(self, data):
+        self._category_ids = ()
+        self._extra = None
+        for key, value in data.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, photo):
+        """Convertit un dict (ou retourne tel quel un PhotoRecord)."""
+        return photo if isinstance(photo, cls) else cls(photo)
+
+    @property
+    def categories(self):
+        return [CATEGORIES.name(category_id) for category_id in self._category_ids]
+
+    @categories.setter
+    def categories(self, names):
+        self._category_ids = tuple(CATEGORIES.intern(name) for name in names)
+
+    # --- Lecture et écriture comme un dict ---
+    def __getitem__(self, key):
+        if key == 'categories':
+            return self.categories
+        if key in FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key == 'categories':
+            self.categories = value
+        elif key in FIELDS:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __contains__(self, key):
+        if key == 'categories':
+            return True
+        if key in FIELDS:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def update(self, changes):
+        for key, value in changes.items():
+            self[key] = value
+
+    def keys(self):
+        keys = [key for key in KEY_ORDER if key == 'categories' or hasattr(self, key)]
+        if self._extra:
+            keys.extend(self._extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        """Dict équivalent, pour la sérialisation (JSON, templates, API)."""
+        photo = {}
+        for key in KEY_ORDER:
+            if key == 'categories':
+                photo[key] = self.categories
+            else:
+                value = getattr(self, key, _MISSING)
+                if value is not _MISSING:
+                    photo[key] = value
+        if self._extra:
+            photo.update(self._extra)
+        return photo
+
+    def __eq__(self, other):
+        if isinstance(other, PhotoRecord):
+            other = other.to_dict()
+        return isinstance(other, dict) and self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'PhotoRecord({self.to_dict()!r})'
+
+
+def json_default(value):
+    """Hook `default` de json.dumps : sérialise les PhotoRecord."""
+    if isinstance(value, PhotoRecord):
+        return value.to_dict()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Cache des réponses JSON pré-sérialisées (corps brut + variante gzip + ETag)."""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, request
+
+# En dessous de cette taille, la compression gzip ne vaut pas le coup
+GZIP_MIN_SIZE = 1024
+# Taille des morceaux envoyés pour un corps lu dans un fichier mappé
+SEND_CHUNK_SIZE = 64 * 1024
+
+
+class CachedBody:
+    """Corps JSON sérialisé une seule fois pour une version des données.
+
+    `body` peut être une tranche (memoryview) d'un fichier mappé, avec son
+    etag et sa variante gzip déjà calculés (voir gallery_snapshot.py).
+    """
+
+    def __init__(self, version, body, etag=None, gzip_body=None, compress=True):
+        self.version = version
+        self.body = body
+        self.etag = etag or hashlib.sha1(body).hexdigest()
+        if gzip_body is None and compress and len(body) >= GZIP_MIN_SIZE:
+            gzip_body = gzip.compress(body, mtime=0)
+        self.gzip_body = gzip_body
+
+    def to_response(self, cache_control, vary=None):
+        """Construit la réponse HTTP, en 304 si le client a déjà cette version."""
+        accepts_gzip = self.gzip_body is not None and 'gzip' in request.headers.get('Accept-Encoding', '')
+        etag = self.etag + '-gz' if accepts_gzip else self.etag
+
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': cache_control,
+            'Vary': ', '.join(['Accept-Encoding'] + (vary or [])),
+        }
+
+        if_none_match = request.headers.get('If-None-Match', '')
+        if if_none_match:
+            tags = [tag.strip().removeprefix('W/').strip('"') for tag in if_none_match.split(',')]
+            if '*' in tags or self.etag in tags or self.etag + '-gz' in tags:
+                return Response(status=304, headers=headers)
+
+        body = self.body
+        if accepts_gzip:
+            headers['Content-Encoding'] = 'gzip'
+            body = self.gzip_body
+        if isinstance(body, memoryview):
+            # WSGI n'accepte que des bytes : la tranche est copiée morceau par morceau à l'envoi
+            headers['Content-Length'] = str(len(body))
+            body = iter_chunks(body)
+        return Response(body, mimetype='application/json', headers=headers)
+
+
+def iter_chunks(view, chunk_size=SEND_CHUNK_SIZE):
+    for start in range(0, len(view), chunk_size):
+        yield bytes(view[start:start + chunk_size])
+
+
+class ResponseCache:
+    """Cache LRU des corps de réponse, indexé par (route, paramètres) et invalidé par version."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, key, version):
+        """Retourne le corps en cache pour cette version, ou None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    def put(self, key, version, data):
+        """Sérialise `data` et le met en cache pour cette version."""
+        body = current_app.json.dumps(data).encode('utf-8')
+        entry = CachedBody(version, body)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+            return stats
+
+
+def cached_json(cache, version, key=None, cache_control='public, no-cache', vary=None):
+    """Décorateur : met en cache la réponse JSON d'une route tant que `version()` ne change pas.
+
+    La route retourne directement les données à sérialiser ; si elle retourne
+    une réponse Flask (ou un tuple réponse/statut, ex. erreur 400), celle-ci est
+    renvoyée telle quelle sans être mise en cache.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            current_version = version()
+            cache_key = (f.__name__, request.query_string, key() if key else None)
+            entry = cache.get(cache_key, current_version)
+            if entry is None:
+                result = f(*args, **kwargs)
+                if isinstance(result, (Response, tuple)):
+                    return result
+                entry = cache.put(cache_key, current_version, result)
+            return entry.to_response(cache_control, vary)
+        return decorated_function
+    return decorator
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Index inversé de recherche plein texte sur les photos (titre, description, catégories)."""
+import bisect
+import re
+import unicodedata
+
+# Poids de chaque champ dans le score d'une photo
+FIELD_WEIGHTS = {'title': 3.0, 'categories': 2.0, 'description': 1.0}
+
+# Un préfixe rapporte moins qu'un mot complet
+PREFIX_FACTOR = 0.5
+
+# Ligatures que la décomposition Unicode ne sépare pas
+LIGATURES = {'œ': 'oe', 'æ': 'ae', 'ß': 'ss'}
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Met en minuscules et retire les accents ("Été à Noël" -> "ete a noel")."""
+    text = text.lower()
+    for ligature, replacement in LIGATURES.items():
+        text = text.replace(ligature, replacement)
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    """Découpe un texte normalisé en mots."""
+    return TOKEN_RE.findall(normalize(text or ''))
+
+
+class SearchIndex:
+    """Index mot -> {photo_id: poids}, avec recherche par préfixe.
+
+    La liste triée des mots permet de trouver tous les mots commençant par un
+    préfixe par dichotomie, sans parcourir tout le vocabulaire.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._doc_tokens = {}
+        self._tokens = []
+
+    def clear(self):
+        self._postings = {}
+        self._doc_tokens = {}
+        self._tokens = []
+
+    def add(self, photo, keep_sorted=True):
+        """Indexe (ou réindexe) une photo."""
+        photo_id = photo.get('id')
+        self.remove(photo_id)
+
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = photo.get(field)
+            if isinstance(value, list):
+                value = ' '.join(str(v) for v in value)
+            for token in tokenize(value):
+                weights[token] = weights.get(token, 0.0) + weight
+
+        self._doc_tokens[photo_id] = weights
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                if keep_sorted:
+                    bisect.insort(self._tokens, token)
+                else:
+                    self._tokens.append(token)
+            postings[photo_id] = weight
+
+    def finish_bulk(self):
+        """Trie le vocabulaire après des ajouts faits avec keep_sorted=False."""
+        self._tokens.sort()
+
+    def remove(self, photo_id):
+        """Retire une photo de l'index."""
+        weights = self._doc_tokens.pop(photo_id, None)
+        if not weights:
+            return
+        for token in weights:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(photo_id, None)
+            if not postings:
+                del self._postings[token]
+                i = bisect.bisect_left(self._tokens, token)
+                if i < len(self._tokens) and self._tokens[i] == token:
+                    del self._tokens[i]
+
+    def _matching_tokens(self, prefix):
+        i = bisect.bisect_left(self._tokens, prefix)
+        while i < len(self._tokens) and self._tokens[i].startswith(prefix):
+            yield self._tokens[i]
+            i += 1
+
+    def search(self, query):
+        """Retourne {photo_id: score} des photos contenant tous les mots de la requête."""
+        terms = tokenize(query)
+        if not terms:
+            return {}
+
+        scores = None
+        for term in terms:
+            term_scores = {}
+            for token in self._matching_tokens(term):
+                factor = 1.0 if token == term else PREFIX_FACTOR
+                for photo_id, weight in self._postings[token].items():
+                    score = weight * factor
+                    if score > term_scores.get(photo_id, 0.0):
+                        term_scores[photo_id] = score
+
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {photo_id: score + term_scores[photo_id]
+                          for photo_id, score in scores.items() if photo_id in term_scores}
+            if not scores:
+                return {}
+        return scores
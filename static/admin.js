@@ -3,15 +3,40 @@
 // Variables globales
 let allPhotos = [];
 
-// Fonction pour uploader une image directement vers Cloudinary
+// Nombre d'uploads simultanés vers Cloudinary
+const UPLOAD_CONCURRENCY = 3;
+
+// Upload d'un fichier directement vers Cloudinary
+async function uploadToCloudinary(file, signatureData) {
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('api_key', signatureData.api_key);
+    formData.append('timestamp', signatureData.timestamp);
+    formData.append('signature', signatureData.signature);
+    formData.append('folder', signatureData.folder);
+
+    const cloudinaryResponse = await fetch(`https://api.cloudinary.com/v1_1/${signatureData.cloud_name}/image/upload`, {
+        method: 'POST',
+        body: formData
+    });
+
+    if (!cloudinaryResponse.ok) {
+        throw new Error('Erreur lors de l\'upload vers Cloudinary');
+    }
+    return cloudinaryResponse.json();
+}
+
+// Fonction pour uploader une ou plusieurs images directement vers Cloudinary,
+// puis les enregistrer dans la galerie en un seul appel
 async function uploadImage() {
     const fileInput = document.getElementById('imageInput');
     const titleInput = document.getElementById('titleInput');
     const descriptionInput = document.getElementById('descriptionInput');
     const categoryInput = document.getElementById('categoryInput');
     const statusDiv = document.getElementById('status');
+    const files = Array.from(fileInput.files);
 
-    if (!fileInput.files[0]) {
+    if (!files.length) {
         statusDiv.textContent = 'Veuillez sélectionner une image.';
         statusDiv.className = 'text-sm text-red-600 mt-2';
         return;
@@ -29,52 +54,60 @@ async function uploadImage() {
 
         const signatureData = await signatureResponse.json();
 
-        // Préparer les données pour l'upload Cloudinary
-        const formData = new FormData();
-        formData.append('file', fileInput.files[0]);
-        formData.append('api_key', signatureData.api_key);
-        formData.append('timestamp', signatureData.timestamp);
-        formData.append('signature', signatureData.signature);
-        formData.append('folder', signatureData.folder);
-
-        statusDiv.textContent = 'Upload vers Cloudinary...';
-
-        // Upload vers Cloudinary
-        const cloudinaryResponse = await fetch(`https://api.cloudinary.com/v1_1/${signatureData.cloud_name}/image/upload`, {
-            method: 'POST',
-            body: formData
-        });
-
-        if (!cloudinaryResponse.ok) {
-            throw new Error('Erreur lors de l\'upload vers Cloudinary');
+        // Upload vers Cloudinary, quelques fichiers à la fois
+        const uploaded = [];
+        let failed = 0;
+        let next = 0;
+        const worker = async () => {
+            while (next < files.length) {
+                const file = files[next++];
+                try {
+                    uploaded.push(await uploadToCloudinary(file, signatureData));
+                } catch (error) {
+                    console.error('Erreur upload:', file.name, error);
+                    failed++;
+                }
+                statusDiv.textContent = `Upload vers Cloudinary... ${uploaded.length + failed}/${files.length}`;
+            }
+        };
+        await Promise.all(Array.from({ length: Math.min(UPLOAD_CONCURRENCY, files.length) }, worker));
+
+        if (!uploaded.length) {
+            throw new Error('Aucune image n\'a pu être envoyée vers Cloudinary');
         }
 
-        const cloudinaryData = await cloudinaryResponse.json();
-
         statusDiv.textContent = 'Ajout à la galerie...';
 
-        // Ajouter à la galerie locale
-        const addResponse = await fetch('/add-photo', {
+        // Ajouter toutes les images à la galerie locale en un seul appel
+        const addResponse = await fetch('/batch-photos', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({
-                public_id: cloudinaryData.public_id,
-                created_at: cloudinaryData.created_at,
-                title: titleInput.value.trim(),
-                description: descriptionInput.value.trim(),
-                category: categoryInput.value
+                add: uploaded.map(cloudinaryData => ({
+                    public_id: cloudinaryData.public_id,
+                    created_at: cloudinaryData.created_at,
+                    title: titleInput.value.trim(),
+                    description: descriptionInput.value.trim(),
+                    category: categoryInput.value
+                }))
             })
         });
 
         if (addResponse.ok) {
-            statusDiv.textContent = 'Image ajoutée avec succès !';
-            statusDiv.className = 'text-sm text-green-600 mt-2';
+            const data = await addResponse.json();
+            const rejected = data.results.add.filter(result => !result.success).length;
+            const added = uploaded.length - rejected;
+            failed += rejected;
+            statusDiv.textContent = failed
+                ? `${added} image(s) ajoutée(s), ${failed} en erreur.`
+                : (added > 1 ? `${added} images ajoutées avec succès !` : 'Image ajoutée avec succès !');
+            statusDiv.className = failed ? 'text-sm text-orange-600 mt-2' : 'text-sm text-green-600 mt-2';
             fileInput.value = '';
             titleInput.value = '';
             descriptionInput.value = '';
-            // Recharger la page pour voir la nouvelle image
+            // Recharger la page pour voir les nouvelles images
             setTimeout(() => location.reload(), 1500);
         } else {
             const errorData = await addResponse.json();
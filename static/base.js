@@ -30,40 +30,125 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-    // Update unread message count
-    updateUnreadCount();
-
-    // Update unread count every 30 seconds
-    setInterval(updateUnreadCount, 30000);
+    // Nombre de messages non lus : polling simple, ou SSE / long-polling avec UNREAD_PUSH=1
+    startUnreadUpdates();
 });
 
-async function updateUnreadCount() {
+let lastUnreadCount = null;
+
+function isUserLoggedIn() {
     const sessionData = document.getElementById('session-data');
-    if (!sessionData || sessionData.dataset.userLoggedIn !== 'true') {
+    return sessionData && sessionData.dataset.userLoggedIn === 'true';
+}
+
+function isUnreadPushEnabled() {
+    const sessionData = document.getElementById('session-data');
+    return sessionData && sessionData.dataset.unreadPush === 'true';
+}
+
+function startUnreadUpdates() {
+    if (!isUserLoggedIn()) {
         return;
     }
 
+    // Sans workers threadés / asynchrones côté serveur, pas de connexion gardée ouverte
+    if (!isUnreadPushEnabled()) {
+        pollUnreadCount();
+        setInterval(pollUnreadCount, 30000);
+        return;
+    }
+
+    if (!window.EventSource) {
+        longPollUnreadCount();
+        return;
+    }
+
+    const source = new EventSource('/api/messages/stream');
+    source.addEventListener('unread', (event) => {
+        renderUnreadCount(JSON.parse(event.data).unread);
+    });
+    source.onerror = () => {
+        // Le navigateur se reconnecte seul ; si le flux est refusé (ex. 503), passer au long-polling
+        if (source.readyState === EventSource.CLOSED) {
+            longPollUnreadCount();
+        }
+    };
+}
+
+async function pollUnreadCount() {
     try {
         const response = await fetch('/api/messages/unread');
-        const data = await response.json();
+        renderUnreadCount((await response.json()).unread);
+    } catch (error) {
+        console.error('Erreur lors de la récupération du nombre de messages non lus:', error);
+    }
+}
 
-        const badges = [
-            document.getElementById('unreadBadge'),
-            document.getElementById('menuUnreadBadge'),
-            document.getElementById('mobileUnreadBadge')
-        ];
-
-        badges.forEach(badge => {
-            if (badge) {
-                if (data.unread > 0) {
-                    badge.textContent = data.unread > 99 ? '99+' : data.unread;
-                    badge.classList.remove('hidden');
-                } else {
-                    badge.classList.add('hidden');
-                }
-            }
-        });
+async function longPollUnreadCount() {
+    try {
+        const url = lastUnreadCount === null
+            ? '/api/messages/unread'
+            : `/api/messages/unread?wait=25&since=${lastUnreadCount}`;
+        const response = await fetch(url);
+        const data = await response.json();
+        renderUnreadCount(data.unread);
+        setTimeout(longPollUnreadCount, 0);
     } catch (error) {
         console.error('Erreur lors de la récupération du nombre de messages non lus:', error);
+        // Repli sur un polling toutes les 30 secondes
+        setTimeout(longPollUnreadCount, 30000);
     }
-}
\ No newline at end of file
+}
+
+function renderUnreadCount(unread) {
+    lastUnreadCount = unread;
+
+    const badges = [
+        document.getElementById('unreadBadge'),
+        document.getElementById('menuUnreadBadge'),
+        document.getElementById('mobileUnreadBadge')
+    ];
+
+    badges.forEach(badge => {
+        if (badge) {
+            if (unread > 0) {
+                badge.textContent = unread > 99 ? '99+' : unread;
+                badge.classList.remove('hidden');
+            } else {
+                badge.classList.add('hidden');
+            }
+        }
+    });
+}
+
+// Données incluses dans la page par le serveur (<script type="application/json">), ou null
+function readInitialData(id) {
+    const script = document.getElementById(id);
+    return script ? JSON.parse(script.textContent) : null;
+}
+
+// Variantes d'images (thumbnail, grid, slider, fullscreen) calculées côté serveur.
+// Les photos sans variantes retombent sur l'URL d'origine.
+function applyVariant(img, photo, name, sizes) {
+    const variant = photo.variants && photo.variants[name];
+    if (!variant) {
+        img.removeAttribute('srcset');
+        img.src = photo.url;
+        return;
+    }
+    img.srcset = variant.srcset;
+    img.sizes = sizes;
+    img.src = variant.src;
+}
+
+function variantUrl(photo, name, targetWidth) {
+    const variant = photo.variants && photo.variants[name];
+    if (!variant) return photo.url;
+    // Plus petite largeur du srcset couvrant la largeur affichée
+    const candidates = variant.srcset.split(', ').map(entry => {
+        const [url, width] = entry.split(' ');
+        return { url, width: parseInt(width, 10) };
+    });
+    const match = candidates.find(candidate => candidate.width >= targetWidth);
+    return (match || candidates[candidates.length - 1]).url;
+}
@@ -1,8 +1,15 @@
 // Gallery-specific JavaScript
 
 // Variables globales
+const PAGE_SIZE = 24;
+const GRID_FIELDS = 'id,url,title,description,variants.grid,variants.slider,variants.fullscreen';
+const GRID_SIZES = '(min-width: 1280px) 25vw, (min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw';
 let allPhotos = [];
 let currentPhoto = null;
+let currentCategory = '';
+let currentSearch = '';
+let nextCursor = null;
+let searchTimeout = null;
 
 // Fonctions globales
 function openModal(photo) {
@@ -12,7 +19,7 @@ function openModal(photo) {
     const modalTitle = document.getElementById('modalTitle');
     const modalText = document.getElementById('modalText');
 
-    modalImage.src = photo.url;
+    applyVariant(modalImage, photo, 'slider', '90vw');
     modalTitle.textContent = photo.title || 'Sans titre';
     modalText.textContent = photo.description || 'Aucune description disponible.';
     modal.classList.remove('hidden');
@@ -36,7 +43,7 @@ function openFullscreen() {
     fullscreenDiv.style.display = 'flex';
 
     const img = document.createElement('img');
-    img.src = currentPhoto.url;
+    applyVariant(img, currentPhoto, 'fullscreen', '100vw');
     img.className = 'max-w-full max-h-full object-contain';
     img.alt = currentPhoto.title || 'Photo';
 
@@ -90,55 +97,66 @@ async function loadCategories() {
     }
 }
 
-async function loadGallery(category = '') {
+async function loadGallery(category = '', append = false) {
     const galleryDiv = document.getElementById('gallery');
-    galleryDiv.innerHTML = '<div class="col-span-full text-center text-gray-500 py-8">Chargement...</div>';
+    if (!append) {
+        currentCategory = category;
+        currentSearch = document.getElementById('searchInput').value.trim();
+        nextCursor = null;
+        galleryDiv.innerHTML = '<div class="col-span-full text-center text-gray-500 py-8">Chargement...</div>';
+    }
 
     try {
-        const url = category ? `/gallery?category=${encodeURIComponent(category)}` : '/gallery';
+        const params = new URLSearchParams({ limit: PAGE_SIZE, fields: GRID_FIELDS, sort: '-uploaded_at' });
+        if (currentCategory) params.set('category', currentCategory);
+        if (append && nextCursor) params.set('cursor', nextCursor);
+
+        // Recherche côté serveur (titre, description, catégories)
+        let url = `/gallery?${params}`;
+        if (currentSearch) {
+            params.delete('sort');
+            params.set('q', currentSearch);
+            url = `/gallery/search?${params}`;
+        }
+
         const response = await fetch(url);
-        const gallery = await response.json();
+        const page = await response.json();
 
-        console.log('Galerie chargée:', gallery);
-        allPhotos = gallery;
-        displayGallery(gallery);
+        allPhotos = append ? allPhotos.concat(page.photos) : page.photos;
+        nextCursor = page.next_cursor;
+        displayGallery(allPhotos);
+        updateLoadMoreButton();
     } catch (error) {
         console.error('Erreur chargement galerie:', error);
         galleryDiv.innerHTML = '<div class="col-span-full text-center text-red-600 py-8">Impossible de charger la galerie.</div>';
     }
 }
 
+function updateLoadMoreButton() {
+    const loadMoreBtn = document.getElementById('loadMoreBtn');
+    if (!loadMoreBtn) return;
+    loadMoreBtn.classList.toggle('hidden', !nextCursor);
+}
+
 function displayGallery(gallery) {
     const galleryDiv = document.getElementById('gallery');
-    const searchInput = document.getElementById('searchInput');
-    const searchTerm = searchInput ? searchInput.value.toLowerCase().trim() : '';
-
-    // Filtrer par terme de recherche
-    let filteredGallery = gallery;
-    if (searchTerm) {
-        filteredGallery = gallery.filter(photo => {
-            const title = (photo.title || '').toLowerCase();
-            return title.includes(searchTerm);
-        });
-    }
-
     galleryDiv.innerHTML = '';
 
-    if (!filteredGallery.length) {
-        const message = searchTerm
-            ? 'Aucune photo trouvée avec ce titre.'
+    if (!gallery.length) {
+        const message = currentSearch
+            ? 'Aucune photo ne correspond à cette recherche.'
             : 'Aucune photo dans cette catégorie.';
         galleryDiv.innerHTML = `<div class="col-span-full text-center text-gray-500 py-8">${message}</div>`;
         return;
     }
 
-    filteredGallery.forEach(photo => {
+    gallery.forEach(photo => {
         const div = document.createElement('div');
         div.className = 'relative group overflow-hidden rounded-lg shadow-md hover:shadow-xl transition-all duration-300 transform hover:-translate-y-1 cursor-pointer';
         div.onclick = () => openModal(photo);
 
         const img = document.createElement('img');
-        img.src = photo.url;
+        applyVariant(img, photo, 'grid', GRID_SIZES);
         img.className = 'w-full h-64 object-cover';
         img.alt = 'Photo portfolio';
         img.loading = 'lazy';
@@ -148,15 +166,28 @@ function displayGallery(gallery) {
     });
 }
 
+// Photos rendues côté serveur : ouvrir le modal au clic
+function bindGalleryItems() {
+    document.querySelectorAll('#gallery [data-photo-index]').forEach(div => {
+        div.onclick = () => openModal(allPhotos[div.dataset.photoIndex]);
+    });
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     // Event listener pour le filtre de catégorie
     document.getElementById('categoryFilter').addEventListener('change', (e) => {
         loadGallery(e.target.value);
     });
 
+    // Bouton pour charger la page suivante
+    document.getElementById('loadMoreBtn').addEventListener('click', () => {
+        loadGallery(currentCategory, true);
+    });
+
     // Event listener pour la recherche
-    document.getElementById('searchInput').addEventListener('input', (e) => {
-        displayGallery(allPhotos);
+    document.getElementById('searchInput').addEventListener('input', () => {
+        clearTimeout(searchTimeout);
+        searchTimeout = setTimeout(() => loadGallery(currentCategory), 250);
     });
 
     // Fermer le modal en cliquant en dehors
@@ -167,6 +198,16 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Première page et catégories incluses dans la page (voir gallery_page())
+    const initialPage = readInitialData('initialGallery');
+    if (initialPage) {
+        allPhotos = initialPage.photos;
+        nextCursor = initialPage.next_cursor;
+        bindGalleryItems();
+        updateLoadMoreButton();
+        return;
+    }
+
     // Chargement initial
     loadCategories();
     loadGallery();
@@ -28,6 +28,17 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Photos incluses dans la page (voir index()) : pas de requête avant le slider
+    const initialPage = readInitialData('initialGallery');
+    if (initialPage) {
+        sliderPhotos = initialPage.photos;
+        initSlider();
+        document.querySelectorAll('#gallery [data-photo-index]').forEach(div => {
+            div.onclick = () => openModal(sliderPhotos[div.dataset.photoIndex]);
+        });
+        return;
+    }
+
     // Chargement initial
     loadGallery();
 });
@@ -48,7 +59,7 @@ function initSlider() {
     sliderPhotos.forEach((photo, index) => {
         const slide = document.createElement('div');
         slide.className = 'min-w-full h-full flex-shrink-0 cursor-pointer';
-        slide.style.backgroundImage = `url(${photo.url})`;
+        slide.style.backgroundImage = `url(${variantUrl(photo, 'slider', window.innerWidth * (window.devicePixelRatio || 1))})`;
         slide.style.backgroundSize = 'cover';
         slide.style.backgroundPosition = 'center';
         slide.onclick = () => openModal(photo);
@@ -94,7 +105,7 @@ function openModal(photo) {
     const modalTitle = document.getElementById('modalTitle');
     const modalText = document.getElementById('modalText');
 
-    modalImage.src = photo.url;
+    applyVariant(modalImage, photo, 'slider', '90vw');
     modalTitle.textContent = photo.title || 'Sans titre';
     modalText.textContent = photo.description || 'Aucune description disponible.';
     modal.classList.remove('hidden');
@@ -117,7 +128,7 @@ function openFullscreen() {
     fullscreenDiv.className = 'fixed inset-0 bg-black z-[9999] flex items-center justify-center';
 
     const img = document.createElement('img');
-    img.src = currentPhoto.url;
+    applyVariant(img, currentPhoto, 'fullscreen', '100vw');
     img.className = 'max-w-full max-h-full object-contain';
     img.alt = currentPhoto.title || 'Photo';
 
@@ -152,11 +163,12 @@ async function loadGallery() {
     galleryDiv.innerHTML = '<div class="col-span-full text-center text-gray-500">Chargement...</div>';
 
     try {
-        const response = await fetch('/gallery');
-        const gallery = await response.json();
+        // Seules les 6 photos les plus récentes sont utiles (slider + aperçu)
+        const response = await fetch('/gallery?limit=6&fields=id,url,title,description,variants.grid,variants.slider,variants.fullscreen&sort=-uploaded_at');
+        const gallery = (await response.json()).photos;
 
         // Charger les 6 dernières photos pour le slider
-        sliderPhotos = gallery.slice(-6).reverse();
+        sliderPhotos = gallery;
         initSlider();
 
         galleryDiv.innerHTML = '';
@@ -171,7 +183,7 @@ async function loadGallery() {
             div.onclick = () => openModal(photo);
 
             const img = document.createElement('img');
-            img.src = photo.url;
+            applyVariant(img, photo, 'grid', '(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw');
             img.className = 'w-full h-64 object-cover';
             img.alt = 'Photo portfolio';
             img.loading = 'lazy';
@@ -101,15 +101,15 @@ function openMessage(messageId) {
     if (message.photo_ids && message.photo_ids.length > 0) {
         const photoContainer = document.getElementById('modalPhoto');
         const photoImg = document.getElementById('modalPhotoImg');
-        const galleryData = document.getElementById('gallery-data');
-        const gallery = JSON.parse(galleryData.dataset.gallery);
+        // Seules les photos jointes aux messages de la page sont fournies, indexées par id
+        const photos = JSON.parse(document.getElementById('photos-data').dataset.photos);
 
         const firstPhotoId = message.photo_ids[0];
-        const photo = gallery.find(p => p.id === firstPhotoId);
+        const photo = photos[firstPhotoId];
 
         if (photo && photo.url) {
             photoContainer.classList.remove('hidden');
-            photoImg.src = photo.url;
+            applyVariant(photoImg, photo, 'grid', '(min-width: 768px) 600px, 100vw');
             photoImg.alt = photo.title || `Photo ${firstPhotoId}`;
             if (message.photo_ids.length > 1) {
                 const indicator = document.createElement('div');
@@ -119,6 +119,7 @@ function openMessage(messageId) {
             }
         } else {
             photoContainer.classList.remove('hidden');
+            photoImg.removeAttribute('srcset');
             photoImg.src = 'data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMjAwIiBoZWlnaHQ9IjIwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iMTAwJSIgaGVpZ2h0PSIxMDAlIiBmaWxsPSIjZGRkIi8+PHRleHQgeD0iNTAlIiB5PSI1MCUiIGZvbnQtc2l6ZT0iMTgiIHRleHQtYW5jaG9yPSJtaWRkbGUiIGR5PSIuM2VtIiBmaWxsPSIjOTk5Ij5QaG90byBub24gdHJvdXZlPC90ZXh0Pjwvc3ZnPg==';
             photoImg.alt = 'Photo non trouvée';
         }
@@ -0,0 +1,947 @@
+# -*- coding: utf-8 -*-
+"""Couche de stockage : fichiers JSON (par défaut) ou base SQLite.
+
+Usage en ligne de commande pour importer les fichiers JSON existants
+(migrés au préalable vers le schéma courant) :
+    python storage.py import-json --db portfolio.db
+"""
+import argparse
+import itertools
+import json
+import os
+import sqlite3
+import threading
+
+from json_stream import JsonStream
+from json_writer import JsonWriter, file_lock
+from photo_record import PhotoRecord, json_default
+from visits import BUCKET_P, HyperLogLog, compaction_cutoffs, merge_bucket
+
+
+class Storage:
+    """Interface commune des backends de stockage.
+
+    Les opérations unitaires (ajout de photo, de message, etc.) ont une
+    implémentation par défaut qui recharge et réécrit toute la collection ;
+    les backends capables de mieux faire (SQLite) les surchargent.
+
+    Les méthodes d'écriture peuvent retourner un WriteTicket quand l'écriture
+    est différée (fichiers JSON) : l'appelant doit alors appeler `wait()`,
+    idéalement après avoir relâché ses propres verrous. Elles retournent None
+    quand l'écriture est déjà faite.
+    """
+
+    # --- Schéma (voir migrations.py) ---
+    def schema_version(self):
+        """Numéro de schéma des données (0 avant tout versionnement)."""
+        raise NotImplementedError
+
+    def set_schema_version(self, version):
+        raise NotImplementedError
+
+    def migration_lock(self):
+        """Verrou inter-processus pris pendant les migrations."""
+        raise NotImplementedError
+
+    # --- Galerie ---
+    def gallery_signature(self):
+        """Valeur qui change à chaque modification de la galerie (même par un autre worker)."""
+        raise NotImplementedError
+
+    def load_photos(self):
+        raise NotImplementedError
+
+    def load_photo_records(self):
+        """Photos sous forme de PhotoRecord (cache de la galerie).
+
+        Les backends convertissent au fil de la lecture plutôt qu'après coup,
+        pour ne pas garder en mémoire la galerie en dicts et en PhotoRecord à la fois.
+        """
+        return [PhotoRecord(photo) for photo in self.load_photos()]
+
+    def save_photos(self, photos):
+        raise NotImplementedError
+
+    def add_photo(self, photo, photos):
+        """Persiste une nouvelle photo. `photos` est la galerie complète après ajout."""
+        return self.save_photos(photos)
+
+    def update_photo(self, photo, photos):
+        return self.save_photos(photos)
+
+    def delete_photo(self, photo_id, photos):
+        return self.save_photos(photos)
+
+    def apply_photo_changes(self, added, updated, deleted_ids, photos):
+        """Persiste un lot d'ajouts, de modifications et de suppressions en une écriture."""
+        return self.save_photos(photos)
+
+    # --- Utilisateurs ---
+    def users_signature(self):
+        raise NotImplementedError
+
+    def load_users(self):
+        raise NotImplementedError
+
+    def save_users(self, users):
+        raise NotImplementedError
+
+    def add_user(self, username, record):
+        """Ajoute un utilisateur. Retourne False si le nom existe déjà (insensible à la casse)."""
+        users = self.load_users()
+        username_lower = username.lower()
+        for existing_username in users:
+            if existing_username.lower() == username_lower:
+                return False
+        users[username] = record
+        ticket = self.save_users(users)
+        if ticket is not None:
+            ticket.wait()
+        return True
+
+    # --- Messages ---
+    def messages_signature(self):
+        raise NotImplementedError
+
+    def load_messages(self):
+        raise NotImplementedError
+
+    def save_messages(self, messages):
+        raise NotImplementedError
+
+    def add_message(self, message, messages):
+        """Persiste un nouveau message. `messages` est la liste complète après ajout."""
+        return self.save_messages(messages)
+
+    def update_messages(self, changed, messages):
+        """Persiste des messages modifiés (ex. marqués comme lus)."""
+        return self.save_messages(messages)
+
+    # --- Statistiques de visites ---
+    # unique_mode : 'hll' (sketch HyperLogLog de taille fixe) ou 'exact' (liste des visiteurs)
+    unique_mode = 'hll'
+
+    def record_visits(self, visitor_ids, total, sketch=None, buckets=None):
+        """Ajoute un lot de visites : `total` visites de l'ensemble `visitor_ids`.
+
+        `sketch` est un HyperLogLog optionnel à fusionner (import).
+        `buckets` ({(page, clé horaire): (total, visiteurs)}) est ajouté aux
+        tranches horaires et journalières, compactées au passage (voir visits.py).
+        """
+        raise NotImplementedError
+
+    def visit_counts(self):
+        """Retourne (visiteurs uniques, visites totales) depuis les agrégats, sans lire les visiteurs."""
+        raise NotImplementedError
+
+    def visit_buckets(self, granularity, start, end):
+        """Tranches 'hour' ou 'day' de clé comprise entre `start` et `end` (inclus).
+
+        Retourne [{'page', 'start', 'total', 'unique'}].
+        """
+        raise NotImplementedError
+
+    # --- Export / import en flux (voir data_export.py) ---
+    # Taille des lots passés à import_records (None : toute la collection en une fois)
+    import_batch_size = None
+
+    def iter_records(self, kind):
+        """Paires (id, données) d'une collection : 'photo', 'user' ou 'message'.
+
+        Les backends surchargent pour lire un enregistrement à la fois.
+        """
+        if kind == 'photo':
+            return ((photo.get('id'), photo) for photo in self.load_photos())
+        if kind == 'user':
+            return iter(self.load_users().items())
+        if kind == 'message':
+            return ((message.get('id'), message) for message in self.load_messages())
+        raise ValueError(f"Collection inconnue: {kind}")
+
+    def import_records(self, kind, records):
+        """Ajoute les paires (id, données) dont l'id n'existe pas encore.
+
+        Les noms d'utilisateurs sont comparés sans tenir compte de la casse.
+        Retourne (importés, ignorés).
+        """
+        imported = skipped = 0
+        if kind == 'user':
+            users = self.load_users()
+            known = {username.lower() for username in users}
+            for username, record in records:
+                if username.lower() in known:
+                    skipped += 1
+                    continue
+                known.add(username.lower())
+                users[username] = record
+                imported += 1
+            ticket = self.save_users(users) if imported else None
+        else:
+            items = self.load_photos() if kind == 'photo' else self.load_messages()
+            known = {item.get('id') for item in items}
+            for record_id, record in records:
+                if record_id in known:
+                    skipped += 1
+                    continue
+                known.add(record_id)
+                items.append(record)
+                imported += 1
+            ticket = None
+            if imported:
+                ticket = self.save_photos(items) if kind == 'photo' else self.save_messages(items)
+        if ticket is not None:
+            ticket.wait()
+        return imported, skipped
+
+
+def file_signature(path):
+    """Signature (mtime, taille, inode) d'un fichier, ou None s'il n'existe pas."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class JsonStorage(Storage):
+    """Stockage historique : un fichier JSON par collection, réécrit à chaque modification.
+
+    Les écritures passent par un JsonWriter (remplacement atomique, verrou
+    fcntl, regroupement des écritures rapprochées) ; `compact=True` écrit
+    les fichiers sans indentation.
+    """
+
+    def __init__(self, gallery_file='data.json', users_file='users.json',
+                 messages_file='messages.json', stats_file='stats.json', unique_mode='hll',
+                 compact=False, rollups_file=None):
+        self.gallery_file = gallery_file
+        self.users_file = users_file
+        self.messages_file = messages_file
+        self.stats_file = stats_file
+        # Tranches horaires et journalières, à côté de stats.json
+        self.rollups_file = rollups_file or os.path.splitext(stats_file)[0] + '_rollups.json'
+        self.unique_mode = unique_mode
+        self.writer = JsonWriter(compact=compact)
+        # Numéro de schéma lu dans data.json, réécrit tel quel à chaque sauvegarde
+        self._schema_version = None
+
+    def _dump(self, path, data):
+        """Planifie l'écriture d'un fichier et retourne le WriteTicket."""
+        return self.writer.submit(path, data)
+
+    def gallery_signature(self):
+        return file_signature(self.gallery_file)
+
+    def _read_gallery(self, object_hook=None):
+        """Lit data.json : {schema_version, photos}."""
+        try:
+            with open(self.gallery_file, 'r') as f:
+                data = json.load(f, object_hook=object_hook)
+        except FileNotFoundError:
+            # Fichier n'existe pas encore
+            data = {'photos': []}
+        # Fichiers d'avant le versionnement : liste simple, ou dict sans numéro de schéma
+        if isinstance(data, list):
+            data = {'photos': data}
+        self._schema_version = data.get('schema_version', 0)
+        return data
+
+    def schema_version(self):
+        self._read_gallery()
+        return self._schema_version
+
+    def set_schema_version(self, version):
+        photos = self._read_gallery()['photos']
+        self._schema_version = version
+        self.save_photos(photos).wait()
+
+    def migration_lock(self):
+        return file_lock(self.gallery_file + '.migrate')
+
+    def load_photos(self):
+        # Les données sont supposées au schéma courant (migrations.py)
+        return self._read_gallery()['photos']
+
+    def load_photo_records(self):
+        # Chaque photo est convertie dès qu'elle est parsée (seules les photos ont un 'id')
+        return self._read_gallery(lambda obj: PhotoRecord(obj) if 'id' in obj else obj)['photos']
+
+    def save_photos(self, photos):
+        if self._schema_version is None:
+            self._read_gallery()
+        return self._dump(self.gallery_file, {'schema_version': self._schema_version, 'photos': photos})
+
+    def users_signature(self):
+        return file_signature(self.users_file)
+
+    def load_users(self):
+        try:
+            with open(self.users_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_users(self, users):
+        return self._dump(self.users_file, users)
+
+    def add_user(self, username, record):
+        # Relire, vérifier et écrire sous verrou : deux workers ne peuvent pas
+        # créer deux variantes de casse du même nom en même temps
+        with file_lock(self.users_file):
+            users = self.load_users()
+            username_lower = username.lower()
+            for existing_username in users:
+                if existing_username.lower() == username_lower:
+                    return False
+            users[username] = record
+            self.writer.write_atomic(self.users_file, self.writer.dumps(users), lock=False)
+        return True
+
+    def messages_signature(self):
+        return file_signature(self.messages_file)
+
+    def load_messages(self):
+        try:
+            with open(self.messages_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def save_messages(self, messages):
+        return self._dump(self.messages_file, messages)
+
+    # --- Export / import en flux ---
+    def _collection_file(self, kind):
+        files = {'photo': self.gallery_file, 'user': self.users_file, 'message': self.messages_file}
+        if kind not in files:
+            raise ValueError(f"Collection inconnue: {kind}")
+        return files[kind]
+
+    def _stream_file(self, kind, header=None):
+        """Enregistrements (id, données) lus un par un dans le fichier de la collection.
+
+        `header` (dict optionnel) reçoit les autres clés de premier niveau de
+        data.json (schema_version).
+        """
+        try:
+            f = open(self._collection_file(kind), 'r')
+        except FileNotFoundError:
+            return
+        with f:
+            stream = JsonStream(f)
+            if kind == 'user':
+                yield from stream.iter_items()
+                return
+            if kind == 'message' or stream.peek() == '[':
+                # messages.json, ou data.json d'avant le versionnement (liste simple)
+                for item in stream.iter_array():
+                    yield item.get('id'), item
+                return
+            for key in stream.iter_keys():
+                if key == 'photos':
+                    for photo in stream.iter_array():
+                        yield photo.get('id'), photo
+                else:
+                    value = stream.value()
+                    if header is not None:
+                        header[key] = value
+
+    def iter_records(self, kind):
+        return self._stream_file(kind)
+
+    def import_records(self, kind, records):
+        # Réécriture en flux sous verrou : les enregistrements existants sont
+        # recopiés un par un, puis les nouveaux ajoutés à la suite. Les
+        # écritures soumises entre-temps par ce processus écraseraient l'import :
+        # à lancer hors trafic, ou via un autre backend.
+        path = self._collection_file(kind)
+        counts = {'imported': 0, 'skipped': 0}
+
+        def key(record_id):
+            return record_id.lower() if kind == 'user' else record_id
+
+        def encode(record_id, record):
+            line = json.dumps(record, default=json_default)
+            if kind == 'user':
+                line = json.dumps(record_id) + ': ' + line
+            return line.encode('utf-8')
+
+        def chunks(known, new_records):
+            header = {}
+            yield b'{\n' if kind == 'user' else (b'{"photos": [\n' if kind == 'photo' else b'[\n')
+            separator = b''
+            for record_id, record in self._stream_file(kind, header):
+                yield separator + encode(record_id, record)
+                separator = b',\n'
+            for record_id, record in new_records:
+                if key(record_id) in known:
+                    counts['skipped'] += 1
+                    continue
+                known.add(key(record_id))
+                counts['imported'] += 1
+                yield separator + encode(record_id, record)
+                separator = b',\n'
+            if kind == 'photo':
+                # Numéro de schéma après les photos : il n'est connu qu'une fois le fichier relu
+                version = header.get('schema_version', self._schema_version or 0)
+                yield f'\n], "schema_version": {json.dumps(version)}}}\n'.encode('utf-8')
+            else:
+                yield b'\n}\n' if kind == 'user' else b'\n]\n'
+
+        with file_lock(path):
+            known = {key(record_id) for record_id, _ in self._stream_file(kind)}
+            # Ne réécrire le fichier que s'il y a au moins un enregistrement nouveau
+            records = iter(records)
+            for record_id, record in records:
+                if key(record_id) not in known:
+                    first = [(record_id, record)]
+                    break
+                counts['skipped'] += 1
+            else:
+                return 0, counts['skipped']
+            self.writer.write_atomic(path, chunks(known, itertools.chain(first, records)), lock=False)
+        return counts['imported'], counts['skipped']
+
+    def load_stats(self):
+        """Charge stats.json : ancien format (liste des visiteurs) ou sketch HyperLogLog."""
+        try:
+            with open(self.stats_file, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        unique_visits = set(data.get('unique_visits', []))
+        return {
+            'total_visits': data.get('total_visits', 0),
+            'unique_visits': unique_visits,
+            'hll': HyperLogLog.from_base64(data['hll']) if data.get('hll') else None,
+            'unique_count': data.get('unique_count', len(unique_visits)),
+        }
+
+    def save_stats(self, stats):
+        data = {
+            'total_visits': stats['total_visits'],
+            'unique_count': stats['unique_count'],
+        }
+        if stats['hll'] is not None:
+            data['hll'] = stats['hll'].to_base64()
+        else:
+            # Convertir le set en list pour JSON
+            data['unique_visits'] = list(stats['unique_visits'])
+        # Écriture synchrone : appelée sous le verrou de record_visits
+        self.writer.write_atomic(self.stats_file, self.writer.dumps(data), lock=False)
+
+    def record_visits(self, visitor_ids, total, sketch=None, buckets=None):
+        # Lecture-modification-écriture sous verrou pour ne pas perdre les lots des autres workers
+        with file_lock(self.stats_file):
+            self._record_visits(visitor_ids, total, sketch)
+            if buckets:
+                self._record_buckets(buckets)
+
+    def _record_visits(self, visitor_ids, total, sketch):
+        stats = self.load_stats()
+        stats['total_visits'] += total
+        if self.unique_mode == 'exact' and stats['hll'] is None and sketch is None:
+            stats['unique_visits'].update(visitor_ids)
+            stats['unique_count'] = len(stats['unique_visits'])
+        else:
+            if stats['hll'] is None:
+                # Conversion de l'ancienne liste de visiteurs vers le sketch
+                stats['hll'] = HyperLogLog()
+                for visitor_id in stats['unique_visits']:
+                    stats['hll'].add(visitor_id)
+                stats['unique_visits'] = set()
+            for visitor_id in visitor_ids:
+                stats['hll'].add(visitor_id)
+            if sketch is not None:
+                stats['hll'].merge(sketch)
+            stats['unique_count'] = stats['hll'].count()
+        self.save_stats(stats)
+
+    def visit_counts(self):
+        stats = self.load_stats()
+        return stats['unique_count'], stats['total_visits']
+
+    def load_rollups(self):
+        """Tranches : {'hour'|'day': {page: {clé: {'total', 'unique', 'hll'?}}}} (sketch en base64)."""
+        try:
+            with open(self.rollups_file, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        return {'hour': data.get('hour', {}), 'day': data.get('day', {})}
+
+    def _record_buckets(self, buckets):
+        rollups = self.load_rollups()
+        for (page, key), (total, visitor_ids) in buckets.items():
+            for granularity, bucket_key in (('hour', key), ('day', key[:10])):
+                stored = rollups[granularity].setdefault(page, {}).get(bucket_key, {})
+                bucket = {'total': stored.get('total', 0), 'unique': stored.get('unique', 0),
+                          'hll': HyperLogLog.from_base64(stored['hll'], BUCKET_P) if stored.get('hll') else None}
+                merge_bucket(bucket, total, visitor_ids)
+                stored = {'total': bucket['total'], 'unique': bucket['unique']}
+                if bucket['hll'] is not None:
+                    stored['hll'] = bucket['hll'].to_base64()
+                rollups[granularity][page][bucket_key] = stored
+        # Compactage : plus de sketch pour les tranches fermées, suppression des plus anciennes
+        for granularity, (compact_before, drop_before) in compaction_cutoffs().items():
+            for page, page_buckets in rollups[granularity].items():
+                for key in list(page_buckets):
+                    if key < drop_before:
+                        del page_buckets[key]
+                    elif key < compact_before:
+                        page_buckets[key].pop('hll', None)
+        self.writer.write_atomic(self.rollups_file, self.writer.dumps(rollups), lock=False)
+
+    def visit_buckets(self, granularity, start, end):
+        # Fichier de taille bornée par la durée de conservation des tranches
+        return [{'page': page, 'start': key, 'total': bucket['total'], 'unique': bucket['unique']}
+                for page, page_buckets in self.load_rollups()[granularity].items()
+                for key, bucket in page_buckets.items() if start <= key <= end]
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS photos (
+    id TEXT PRIMARY KEY,
+    public_id TEXT,
+    url TEXT,
+    uploaded_at TEXT,
+    title TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS photos_uploaded_at ON photos (uploaded_at, id);
+CREATE INDEX IF NOT EXISTS photos_public_id ON photos (public_id);
+CREATE TABLE IF NOT EXISTS photo_categories (
+    photo_id TEXT NOT NULL REFERENCES photos (id) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (photo_id, category)
+);
+CREATE INDEX IF NOT EXISTS photo_categories_category ON photo_categories (category);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY COLLATE NOCASE,
+    password TEXT NOT NULL,
+    created_at TEXT,
+    is_admin INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    sender TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    subject TEXT,
+    content TEXT,
+    photo_ids TEXT NOT NULL DEFAULT '[]',
+    timestamp TEXT,
+    read INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS messages_recipient ON messages (recipient, read);
+CREATE TABLE IF NOT EXISTS visits (
+    visitor_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS sketches (
+    name TEXT PRIMARY KEY,
+    registers BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS visit_buckets (
+    granularity TEXT NOT NULL,
+    start TEXT NOT NULL,
+    page TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    unique_count INTEGER NOT NULL DEFAULT 0,
+    sketch BLOB,
+    PRIMARY KEY (granularity, start, page)
+);
+"""
+
+PHOTO_COLUMNS = ('id', 'public_id', 'url', 'uploaded_at', 'title', 'description')
+USER_COLUMNS = ('password', 'created_at', 'is_admin')
+
+
+class SqliteStorage(Storage):
+    """Stockage SQLite en mode WAL, partagé sans perte entre les workers gunicorn.
+
+    Chaque thread a sa propre connexion. Des compteurs dans la table `meta`
+    sont incrémentés dans la même transaction que chaque écriture, ce qui
+    permet aux caches des autres workers de détecter les changements.
+    """
+
+    def __init__(self, path='portfolio.db', unique_mode='hll'):
+        self.path = path
+        self.unique_mode = unique_mode
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def _bump(self, conn, key, amount=1):
+        conn.execute(
+            'INSERT INTO meta (key, value) VALUES (?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = value + excluded.value',
+            (key, amount)
+        )
+
+    def _meta(self, key):
+        row = self._connect().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else 0
+
+    # --- Schéma ---
+    def schema_version(self):
+        return self._meta('schema_version')
+
+    def set_schema_version(self, version):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO meta (key, value) VALUES (?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value',
+                ('schema_version', version)
+            )
+
+    def migration_lock(self):
+        return file_lock(self.path + '.migrate')
+
+    # --- Galerie ---
+    def gallery_signature(self):
+        return self._meta('gallery_version')
+
+    def _photo_from_row(self, row, categories):
+        photo = json.loads(row['extra']) if row['extra'] else {}
+        for column in PHOTO_COLUMNS:
+            photo[column] = row[column]
+        photo['categories'] = categories
+        return photo
+
+    def _iter_photos(self):
+        conn = self._connect()
+        categories = {}
+        for row in conn.execute('SELECT photo_id, category FROM photo_categories ORDER BY photo_id, position'):
+            categories.setdefault(row['photo_id'], []).append(row['category'])
+        for row in conn.execute('SELECT * FROM photos ORDER BY rowid'):
+            yield self._photo_from_row(row, categories.get(row['id'], []))
+
+    def load_photos(self):
+        return list(self._iter_photos())
+
+    def load_photo_records(self):
+        return [PhotoRecord(photo) for photo in self._iter_photos()]
+
+    def _insert_photo(self, conn, photo):
+        extra = {k: v for k, v in photo.items() if k not in PHOTO_COLUMNS and k != 'categories'}
+        conn.execute(
+            'INSERT OR REPLACE INTO photos (id, public_id, url, uploaded_at, title, description, extra) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (photo.get('id'), photo.get('public_id'), photo.get('url'), photo.get('uploaded_at'),
+             photo.get('title', ''), photo.get('description', ''), json.dumps(extra) if extra else None)
+        )
+        self._insert_categories(conn, photo)
+
+    def _insert_categories(self, conn, photo):
+        conn.execute('DELETE FROM photo_categories WHERE photo_id = ?', (photo.get('id'),))
+        conn.executemany(
+            'INSERT OR IGNORE INTO photo_categories (photo_id, category, position) VALUES (?, ?, ?)',
+            [(photo.get('id'), category, i) for i, category in enumerate(photo.get('categories') or [])]
+        )
+
+    def save_photos(self, photos):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM photos')
+            for photo in photos:
+                self._insert_photo(conn, photo)
+            self._bump(conn, 'gallery_version')
+
+    def add_photo(self, photo, photos):
+        with self._connect() as conn:
+            self._insert_photo(conn, photo)
+            self._bump(conn, 'gallery_version')
+
+    def _update_photo(self, conn, photo):
+        extra = {k: v for k, v in photo.items() if k not in PHOTO_COLUMNS and k != 'categories'}
+        conn.execute(
+            'UPDATE photos SET public_id = ?, url = ?, uploaded_at = ?, title = ?, description = ?, extra = ? '
+            'WHERE id = ?',
+            (photo.get('public_id'), photo.get('url'), photo.get('uploaded_at'), photo.get('title', ''),
+             photo.get('description', ''), json.dumps(extra) if extra else None, photo.get('id'))
+        )
+        self._insert_categories(conn, photo)
+
+    def update_photo(self, photo, photos):
+        with self._connect() as conn:
+            self._update_photo(conn, photo)
+            self._bump(conn, 'gallery_version')
+
+    def delete_photo(self, photo_id, photos):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM photos WHERE id = ?', (photo_id,))
+            self._bump(conn, 'gallery_version')
+
+    def apply_photo_changes(self, added, updated, deleted_ids, photos):
+        # Une seule transaction : le lot est appliqué entièrement ou pas du tout
+        with self._connect() as conn:
+            for photo in added:
+                self._insert_photo(conn, photo)
+            for photo in updated:
+                self._update_photo(conn, photo)
+            conn.executemany('DELETE FROM photos WHERE id = ?', [(photo_id,) for photo_id in deleted_ids])
+            self._bump(conn, 'gallery_version')
+
+    # --- Utilisateurs ---
+    def users_signature(self):
+        return self._meta('users_version')
+
+    def _iter_users(self):
+        for row in self._connect().execute('SELECT * FROM users ORDER BY rowid'):
+            record = json.loads(row['extra']) if row['extra'] else {}
+            record.update(password=row['password'], created_at=row['created_at'],
+                          is_admin=bool(row['is_admin']))
+            yield row['username'], record
+
+    def load_users(self):
+        return dict(self._iter_users())
+
+    def _user_params(self, username, record):
+        extra = {k: v for k, v in record.items() if k not in USER_COLUMNS}
+        return (username, record.get('password'), record.get('created_at'),
+                int(bool(record.get('is_admin'))), json.dumps(extra) if extra else None)
+
+    def save_users(self, users):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM users')
+            conn.executemany(
+                'INSERT INTO users (username, password, created_at, is_admin, extra) VALUES (?, ?, ?, ?, ?)',
+                [self._user_params(username, record) for username, record in users.items()]
+            )
+            self._bump(conn, 'users_version')
+
+    def add_user(self, username, record):
+        # L'unicité insensible à la casse est garantie par COLLATE NOCASE
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT INTO users (username, password, created_at, is_admin, extra) VALUES (?, ?, ?, ?, ?)',
+                    self._user_params(username, record)
+                )
+                self._bump(conn, 'users_version')
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    # --- Messages ---
+    def _message_from_row(self, row):
+        return {
+            'id': row['id'],
+            'from': row['sender'],
+            'to': row['recipient'],
+            'subject': row['subject'],
+            'content': row['content'],
+            'photo_ids': json.loads(row['photo_ids']),
+            'timestamp': row['timestamp'],
+            'read': bool(row['read'])
+        }
+
+    def _message_params(self, message):
+        return (message.get('id'), message.get('from'), message.get('to'), message.get('subject'),
+                message.get('content'), json.dumps(message.get('photo_ids') or []),
+                message.get('timestamp'), int(bool(message.get('read', False))))
+
+    def messages_signature(self):
+        return self._meta('messages_version')
+
+    def load_messages(self):
+        return [self._message_from_row(row)
+                for row in self._connect().execute('SELECT * FROM messages ORDER BY rowid')]
+
+    def save_messages(self, messages):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM messages')
+            conn.executemany(
+                'INSERT INTO messages (id, sender, recipient, subject, content, photo_ids, timestamp, read) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [self._message_params(message) for message in messages]
+            )
+            self._bump(conn, 'messages_version')
+
+    def add_message(self, message, messages):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO messages (id, sender, recipient, subject, content, photo_ids, timestamp, read) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                self._message_params(message)
+            )
+            self._bump(conn, 'messages_version')
+
+    def update_messages(self, changed, messages):
+        with self._connect() as conn:
+            conn.executemany('UPDATE messages SET read = ? WHERE id = ?',
+                             [(int(bool(message.get('read'))), message.get('id')) for message in changed])
+            self._bump(conn, 'messages_version')
+
+    # --- Statistiques de visites ---
+    def record_visits(self, visitor_ids, total, sketch=None, buckets=None):
+        conn = self._connect()
+        with conn:
+            # Verrou d'écriture dès le début : la fusion du sketch est un read-modify-write
+            conn.execute('BEGIN IMMEDIATE')
+            if buckets:
+                self._record_buckets(conn, buckets)
+            self._bump(conn, 'total_visits', total)
+            if self.unique_mode == 'exact' and sketch is None:
+                cursor = conn.executemany('INSERT OR IGNORE INTO visits (visitor_id) VALUES (?)',
+                                          [(visitor_id,) for visitor_id in visitor_ids])
+                self._bump(conn, 'unique_visits', max(cursor.rowcount, 0))
+                return
+            row = conn.execute("SELECT registers FROM sketches WHERE name = 'visitors'").fetchone()
+            hll = HyperLogLog(registers=row['registers']) if row else HyperLogLog()
+            for visitor_id in visitor_ids:
+                hll.add(visitor_id)
+            if sketch is not None:
+                hll.merge(sketch)
+            conn.execute("INSERT OR REPLACE INTO sketches (name, registers) VALUES ('visitors', ?)",
+                         (bytes(hll.registers),))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('unique_visits', ?)",
+                         (hll.count(),))
+
+    def visit_counts(self):
+        return self._meta('unique_visits'), self._meta('total_visits')
+
+    def _record_buckets(self, conn, buckets):
+        for (page, key), (total, visitor_ids) in buckets.items():
+            for granularity, bucket_key in (('hour', key), ('day', key[:10])):
+                row = conn.execute('SELECT total, unique_count, sketch FROM visit_buckets '
+                                   'WHERE granularity = ? AND start = ? AND page = ?',
+                                   (granularity, bucket_key, page)).fetchone()
+                bucket = {'total': row['total'], 'unique': row['unique_count'],
+                          'hll': HyperLogLog(BUCKET_P, row['sketch']) if row['sketch'] else None} if row else {}
+                merge_bucket(bucket, total, visitor_ids)
+                conn.execute('INSERT OR REPLACE INTO visit_buckets (granularity, start, page, total, unique_count, sketch) '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             (granularity, bucket_key, page, bucket['total'], bucket['unique'],
+                              bytes(bucket['hll'].registers) if bucket['hll'] is not None else None))
+        for granularity, (compact_before, drop_before) in compaction_cutoffs().items():
+            conn.execute('DELETE FROM visit_buckets WHERE granularity = ? AND start < ?', (granularity, drop_before))
+            conn.execute('UPDATE visit_buckets SET sketch = NULL WHERE granularity = ? AND start < ? '
+                         'AND sketch IS NOT NULL', (granularity, compact_before))
+
+    def visit_buckets(self, granularity, start, end):
+        rows = self._connect().execute(
+            'SELECT page, start, total, unique_count FROM visit_buckets '
+            'WHERE granularity = ? AND start BETWEEN ? AND ?', (granularity, start, end))
+        return [{'page': row['page'], 'start': row['start'], 'total': row['total'], 'unique': row['unique_count']}
+                for row in rows]
+
+    # --- Export / import en flux ---
+    import_batch_size = 1000
+
+    def iter_records(self, kind):
+        if kind == 'photo':
+            return ((photo['id'], photo) for photo in self._iter_photos())
+        if kind == 'user':
+            return self._iter_users()
+        if kind == 'message':
+            return ((row['id'], self._message_from_row(row))
+                    for row in self._connect().execute('SELECT * FROM messages ORDER BY rowid'))
+        raise ValueError(f"Collection inconnue: {kind}")
+
+    def import_records(self, kind, records):
+        # Un lot = une transaction ; les ids existants (noms sans casse) sont ignorés
+        imported = skipped = 0
+        with self._connect() as conn:
+            for record_id, record in records:
+                if kind == 'photo':
+                    exists = conn.execute('SELECT 1 FROM photos WHERE id = ?', (record_id,)).fetchone()
+                    if not exists:
+                        self._insert_photo(conn, record)
+                elif kind == 'user':
+                    exists = conn.execute('INSERT OR IGNORE INTO users (username, password, created_at, is_admin, extra) '
+                                          'VALUES (?, ?, ?, ?, ?)',
+                                          self._user_params(record_id, record)).rowcount == 0
+                elif kind == 'message':
+                    exists = conn.execute('INSERT OR IGNORE INTO messages (id, sender, recipient, subject, content, '
+                                          'photo_ids, timestamp, read) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                          self._message_params(record)).rowcount == 0
+                else:
+                    raise ValueError(f"Collection inconnue: {kind}")
+                if exists:
+                    skipped += 1
+                else:
+                    imported += 1
+            if imported:
+                self._bump(conn, {'photo': 'gallery_version', 'user': 'users_version',
+                                  'message': 'messages_version'}[kind])
+        return imported, skipped
+
+    # --- Import ---
+    def import_json(self, source):
+        """Importe toutes les données d'un JsonStorage (remplace le contenu existant).
+
+        La source doit être au schéma courant (voir migrations.run_migrations).
+        """
+        self.save_photos(source.load_photos())
+        self.save_users(source.load_users())
+        self.save_messages(source.load_messages())
+        self.set_schema_version(source.schema_version())
+
+        stats = source.load_stats()
+        with self._connect() as conn:
+            conn.execute('DELETE FROM visits')
+            conn.execute('DELETE FROM sketches')
+            conn.execute("DELETE FROM meta WHERE key IN ('unique_visits', 'total_visits')")
+        self.record_visits(stats['unique_visits'], stats['total_visits'], sketch=stats['hll'])
+
+        rollups = source.load_rollups()
+        with self._connect() as conn:
+            conn.execute('DELETE FROM visit_buckets')
+            conn.executemany(
+                'INSERT INTO visit_buckets (granularity, start, page, total, unique_count, sketch) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(granularity, key, page, bucket['total'], bucket['unique'],
+                  bytes(HyperLogLog.from_base64(bucket['hll'], BUCKET_P).registers) if bucket.get('hll') else None)
+                 for granularity, pages in rollups.items()
+                 for page, page_buckets in pages.items() for key, bucket in page_buckets.items()])
+
+
+def create_storage(backend='json', sqlite_path='portfolio.db', unique_mode='hll', compact=False):
+    """Instancie le backend de stockage configuré ('json' ou 'sqlite')."""
+    if backend == 'sqlite':
+        return SqliteStorage(sqlite_path, unique_mode)
+    if backend == 'json':
+        return JsonStorage(unique_mode=unique_mode, compact=compact)
+    raise ValueError(f"Backend de stockage inconnu: {backend}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Outils de stockage du portfolio')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import-json', help='Importer les fichiers JSON dans SQLite')
+    import_parser.add_argument('--db', default=os.getenv('SQLITE_PATH', 'portfolio.db'))
+    import_parser.add_argument('--unique-mode', choices=['hll', 'exact'],
+                               default=os.getenv('VISITS_UNIQUE_MODE', 'hll'))
+    args = parser.parse_args()
+
+    if args.command == 'import-json':
+        from migrations import run_migrations
+        source = JsonStorage()
+        run_migrations(source)
+        target = SqliteStorage(args.db, args.unique_mode)
+        target.import_json(source)
+        unique, total = target.visit_counts()
+        print(f"Import terminé dans {args.db}: {len(target.load_photos())} photos, "
+              f"{len(target.load_users())} utilisateurs, {len(target.load_messages())} messages, "
+              f"{unique} visiteurs uniques, {total} visites")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Routes de l'application (app.py), créée par create_app() dans un dossier temporaire."""
+import os
+import threading
+import time
+
+import pytest
+
+import app as portfolio
+from config import Config
+
+
+class TestConfig(Config):
+    SECRET_KEY = 'test'
+    CLOUDINARY_CLOUD_NAME = 'test'
+    CLOUDINARY_API_KEY = 'test'
+    CLOUDINARY_API_SECRET = 'test'
+    WARMUP = False
+    # Tâches enregistrées mais jamais exécutées (pas d'appel à Cloudinary)
+    JOB_RUNNER = 'external'
+    UNREAD_PUSH = True
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    # Les fichiers de l'application sont relatifs au dossier courant. On ne revient pas
+    # au dossier d'origine : les écritures faites à la sortie du processus restent ici.
+    os.chdir(tmp_path_factory.mktemp('portfolio'))
+    application = portfolio.create_app(TestConfig)
+    application.testing = True
+    return application
+
+
+def login(client, username):
+    with client.session_transaction() as session:
+        session['user_logged_in'] = True
+        session['username'] = username
+
+
+@pytest.fixture
+def admin(app):
+    client = app.test_client()
+    login(client, portfolio.ADMINS[0])
+    return client
+
+
+def add_photo(client, public_id, **fields):
+    response = client.post('/add-photo', json=dict(fields, public_id=public_id))
+    assert response.status_code == 200
+    return response.get_json()['photo']
+
+
+def test_update_photo_rejects_non_object_body(admin):
+    photo = add_photo(admin, 'portfolio/body')
+    for body in ('null', '[1]', '"titre"'):
+        response = admin.put(f"/update-photo/{photo['id']}", data=body, content_type='application/json')
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'Objet JSON attendu'}
+
+    response = admin.post('/batch-photos', json={'add': [None], 'update': [['x']]})
+    results = response.get_json()['results']
+    assert results['add'][0] == {'success': False, 'error': 'Objet JSON attendu'}
+    assert results['update'][0]['success'] is False
+
+
+def test_metrics_export_cache_counters(admin):
+    admin.get('/gallery')
+    text = admin.get('/admin/metrics').get_data(as_text=True)
+
+    assert '# TYPE portfolio_cache_hits_total counter' in text
+    assert '# TYPE portfolio_cache_misses_total counter' in text
+    assert 'portfolio_cache_misses_total{cache="responses"}' in text
+    assert '# TYPE portfolio_photos gauge' in text
+
+
+def test_category_index_follows_update_and_delete(admin):
+    first = add_photo(admin, 'portfolio/idx-1', category='Index A')
+    second = add_photo(admin, 'portfolio/idx-2', category='Index A')
+
+    admin.put(f"/update-photo/{second['id']}", json={'categories': ['Index B']})
+    assert [photo['id'] for photo in admin.get('/gallery?category=Index A').get_json()] == [first['id']]
+    assert [photo['id'] for photo in admin.get('/gallery?category=Index B').get_json()] == [second['id']]
+    assert {'Index A', 'Index B'} <= set(admin.get('/categories').get_json())
+
+    assert admin.delete(f"/delete-photo/{second['id']}").status_code == 200
+    assert admin.get('/gallery?category=Index B').get_json() == []
+    assert 'Index B' not in admin.get('/categories').get_json()
+
+
+def test_etag_and_not_modified(admin):
+    add_photo(admin, 'portfolio/etag', category='Etag')
+    response = admin.get('/gallery?category=Etag')
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and etag
+
+    cached = admin.get('/gallery?category=Etag', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    # Une modification change l'ETag : l'ancien ne donne plus de 304
+    add_photo(admin, 'portfolio/etag-2', category='Etag')
+    changed = admin.get('/gallery?category=Etag', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert len(changed.get_json()) == 2
+
+
+def test_search_ignores_accents_and_case(admin):
+    photo = add_photo(admin, 'portfolio/eglise', title='Église de Montréal', description='Vue du fleuve')
+
+    for query in ('eglise montreal', 'ÉGLISE', 'Fleuve'):
+        response = admin.get(f'/gallery/search?q={query}')
+        assert response.status_code == 200
+        assert photo['id'] in [result['id'] for result in response.get_json()['photos']]
+    assert admin.get('/gallery/search?q=cathedrale').get_json()['photos'] == []
+    assert admin.get('/gallery/search').status_code == 400
+
+
+def test_cursor_pagination_is_stable(admin):
+    for i in range(25):
+        add_photo(admin, f'portfolio/page-{i}', category='Pages', created_at=f'2023-05-{i + 1:02d}T10:00:00Z')
+
+    seen = []
+    url = '/gallery?category=Pages&limit=10&sort=-uploaded_at'
+    response = admin.get(url).get_json()
+    seen += response['photos']
+    # Une photo ajoutée entre deux pages ne décale pas les suivantes
+    add_photo(admin, 'portfolio/page-new', category='Pages', created_at='2023-06-01T10:00:00Z')
+    while response['next_cursor']:
+        response = admin.get(f"{url}&cursor={response['next_cursor']}").get_json()
+        seen += response['photos']
+
+    dates = [photo['uploaded_at'] for photo in seen]
+    assert len(seen) == 25 and len({photo['id'] for photo in seen}) == 25
+    assert dates == sorted(dates, reverse=True)
+    assert admin.get('/gallery?limit=10&cursor=invalide').status_code == 400
+
+
+def register(app, username):
+    client = app.test_client()
+    response = client.post('/register', data={'username': username, 'password': 'secret1',
+                                              'confirm_password': 'secret1'})
+    assert response.status_code == 302
+    login(client, username)
+    return client
+
+
+def test_unread_long_poll_returns_on_new_message(app, admin):
+    client = register(app, 'lecteur')
+    assert client.get('/api/messages/unread').get_json() == {'unread': 0}
+
+    def send():
+        time.sleep(0.2)
+        admin.post('/send-message', data={'to_user': 'lecteur', 'subject': 'Bonjour', 'content': 'Message'})
+    sender = threading.Thread(target=send)
+    start = time.monotonic()
+    sender.start()
+    response = client.get('/api/messages/unread?since=0&wait=5')
+    elapsed = time.monotonic() - start
+    sender.join()
+
+    assert response.get_json() == {'unread': 1}
+    assert 0.1 < elapsed < 4
+    # Nombre déjà différent de `since` : réponse immédiate
+    start = time.monotonic()
+    assert client.get('/api/messages/unread?since=0&wait=5').get_json() == {'unread': 1}
+    assert time.monotonic() - start < 1
+
+
+def test_unread_wait_ignored_without_push(app, monkeypatch):
+    client = register(app, 'sondeur')
+    monkeypatch.setattr(portfolio.config, 'UNREAD_PUSH', False)
+
+    start = time.monotonic()
+    assert client.get('/api/messages/unread?since=0&wait=5').get_json() == {'unread': 0}
+    assert time.monotonic() - start < 1
+    assert client.get('/api/messages/stream').status_code == 404
+
+
+def test_jobs_limit_and_admin_only(app, admin):
+    job_ids = [portfolio.job_queue.submit('generate_variants', {'force': False}) for _ in range(3)]
+
+    assert len(admin.get('/admin/jobs?limit=2').get_json()['jobs']) == 2
+    assert len(admin.get('/admin/jobs?limit=0').get_json()['jobs']) == 1
+    for limit in ('abc', '1.5'):
+        response = admin.get(f'/admin/jobs?limit={limit}')
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'limit invalide'}
+    assert admin.get(f'/admin/jobs/{job_ids[0]}').get_json()['status'] == 'queued'
+
+    user = register(app, 'visiteur')
+    anonymous = app.test_client()
+    for path, method in (('/admin/jobs', 'get'), (f'/admin/jobs/{job_ids[0]}', 'get'), ('/rebuild-gallery', 'post')):
+        assert getattr(user, method)(path).status_code == 404
+        response = getattr(anonymous, method)(path)
+        assert response.status_code == 302 and '/user/login' in response.headers['Location']
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Synchronisation avec Cloudinary (cloudinary_sync.py) sur le bouchon de l'Admin API."""
+import os
+
+from cloudinary_stub import StubAdminApi
+from cloudinary_sync import CloudinarySync
+from gallery_store import GalleryStore
+from storage import JsonStorage
+
+
+def make_sync(directory, api):
+    storage = JsonStorage(os.path.join(directory, 'data.json'), os.path.join(directory, 'users.json'),
+                          os.path.join(directory, 'messages.json'), os.path.join(directory, 'stats.json'))
+    store = GalleryStore(storage)
+    sync = CloudinarySync(store, api=api, state_file=os.path.join(directory, 'sync_state.json'),
+                          build_url=lambda public_id, **options: 'https://example.test/' + public_id)
+    return store, sync
+
+
+def test_full_sync_lists_ids_outside_default_shards(tmp_path):
+    # Plus d'une page de public_id commençant par un chiffre : les autres ne sont pas dans la première page
+    api = StubAdminApi.generate(2000)
+    for public_id in ('portfolio/Zeta', 'portfolio/_special', 'portfolio/-tiret', 'portfolio/~tilde'):
+        api.add(public_id)
+    store, sync = make_sync(str(tmp_path), api)
+    # '~' n'est connu que par la galerie locale
+    store.add({'id': 'gone', 'public_id': 'portfolio/~gone', 'title': '', 'categories': ['Voyage']})
+
+    result = sync.sync(full=True)
+
+    local_ids = {photo['public_id'] for photo in store.all()}
+    assert local_ids == {resource['public_id'] for resource in api.images}
+    assert result['mode'] == 'full' and result['removed'] == 1
+
+
+def test_full_sync_finds_unknown_first_characters(tmp_path):
+    # Premier caractère absent des découpes, de la galerie locale et de la première page
+    api = StubAdminApi.generate(2000)
+    for public_id in ('portfolio/~tilde', 'portfolio/éclair'):
+        api.add(public_id)
+    store, sync = make_sync(str(tmp_path), api)
+
+    result = sync.sync(full=True)
+
+    local_ids = {photo['public_id'] for photo in store.all()}
+    assert {'portfolio/~tilde', 'portfolio/éclair'} <= local_ids
+    assert result['added'] == len(api.images)
+    assert sync.get_stats()['unsharded'] == 2
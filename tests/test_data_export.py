@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Export / import NDJSON (data_export.py) avec le stockage JSON instrumenté."""
+import os
+
+from data_export import export_file, import_file
+from metrics import Metrics
+from migrations import run_migrations
+from storage import JsonStorage, file_signature
+
+
+def make_storage(directory):
+    return JsonStorage(os.path.join(directory, 'data.json'), os.path.join(directory, 'users.json'),
+                       os.path.join(directory, 'messages.json'), os.path.join(directory, 'stats.json'))
+
+
+def fill(storage):
+    storage.save_photos([{'id': f'p{i}', 'public_id': f'portfolio/p{i}', 'title': f'Photo {i}',
+                          'categories': ['Voyage']} for i in range(3)]).wait()
+    storage.save_users({'Alice': {'password': 'x'}}).wait()
+    storage.save_messages([{'id': 'm1', 'from': 'Alice', 'to': 'Bob', 'read': False}]).wait()
+
+
+def test_import_with_metrics(tmp_path):
+    source = make_storage(str(tmp_path / 'source'))
+    os.makedirs(tmp_path / 'source')
+    fill(source)
+    export_path = str(tmp_path / 'export.ndjson.gz')
+    assert export_file(source, export_path) == 5
+
+    os.makedirs(tmp_path / 'target')
+    target = make_storage(str(tmp_path / 'target'))
+    # Le fichier créé par la migration n'est pas compté, seulement celui de l'import
+    run_migrations(target)
+    metrics = Metrics()
+    metrics.instrument_storage(target)
+    totals = import_file(target, export_path)
+
+    assert totals == {'photo': (3, 0), 'user': (1, 0), 'message': (1, 0)}
+    assert [photo['id'] for photo in target.load_photos()] == ['p0', 'p1', 'p2']
+    assert 'Alice' in target.load_users()
+    # La taille des écritures en flux est comptée au passage des morceaux
+    written = metrics.file_write_bytes._values[('data.json',)]
+    assert written[-2] == os.path.getsize(target.gallery_file)
+
+
+def test_import_without_new_records_keeps_files(tmp_path):
+    storage = make_storage(str(tmp_path))
+    fill(storage)
+    export_path = str(tmp_path / 'export.ndjson')
+    export_file(storage, export_path)
+    run_migrations(storage)
+    signature = file_signature(storage.gallery_file)
+
+    totals = import_file(storage, export_path)
+
+    assert totals == {'photo': (0, 3), 'user': (0, 1), 'message': (0, 1)}
+    assert file_signature(storage.gallery_file) == signature
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Snapshot partagé de la galerie (gallery_snapshot.py)."""
+import json
+import os
+
+from gallery_snapshot import RECENT_PHOTOS, GallerySnapshot, SnapshotPublisher
+from gallery_store import GalleryStore
+from photo_record import json_default
+from storage import JsonStorage
+
+
+def make_store(directory, count):
+    storage = JsonStorage(os.path.join(directory, 'data.json'), os.path.join(directory, 'users.json'),
+                          os.path.join(directory, 'messages.json'), os.path.join(directory, 'stats.json'))
+    store = GalleryStore(storage)
+    # Dates en double : l'ordre se fait alors sur l'id, comme dans le store
+    store.replace_all([{'id': f'p{i:03d}', 'public_id': f'portfolio/p{i}', 'title': f'Photo {i}',
+                        'categories': ['Voyage' if i % 2 else 'Portrait'],
+                        'uploaded_at': f'2024-01-{1 + i % 28:02d}T00:00:00'} for i in range(count)])
+    return store
+
+
+def dumps(data):
+    return json.dumps(data, default=json_default)
+
+
+def test_recent_matches_store_page(tmp_path):
+    store = make_store(str(tmp_path), RECENT_PHOTOS + 20)
+    snapshot = GallerySnapshot(str(tmp_path / 'gallery.snap'), dumps=dumps)
+    snapshot.publish(*store.snapshot_state())
+    view = snapshot.current()
+
+    for limit in (6, 24, RECENT_PHOTOS):
+        photos, next_key = store.page(limit, descending=True)
+        assert view.recent(limit) == ([photo.to_dict() for photo in photos], next_key)
+    # Au-delà des photos indexées, la page vient du store
+    assert view.recent(RECENT_PHOTOS + 1) is None
+    assert view.category_names() == store.categories()
+
+
+def test_recent_small_gallery(tmp_path):
+    store = make_store(str(tmp_path), 3)
+    snapshot = GallerySnapshot(str(tmp_path / 'gallery.snap'), dumps=dumps)
+    snapshot.publish(*store.snapshot_state())
+
+    photos, next_key = snapshot.current().recent(24)
+    assert [photo['id'] for photo in photos] == ['p002', 'p001', 'p000']
+    assert next_key is None
+
+
+def test_publisher_coalesces_changes(tmp_path):
+    store = make_store(str(tmp_path), 3)
+    snapshot = GallerySnapshot(str(tmp_path / 'gallery.snap'), dumps=dumps)
+    # Délai long : seule la publication explicite (flush) a lieu pendant le test
+    publisher = SnapshotPublisher(snapshot, store.snapshot_state, delay=60)
+    for i in range(5):
+        store.add({'id': f'n{i}', 'public_id': f'portfolio/n{i}', 'title': 'Nouvelle', 'categories': ['Voyage']})
+        publisher.schedule()
+    assert snapshot.current() is None
+
+    publisher.flush()
+    publisher.flush()
+
+    assert snapshot.stats['publishes'] == 1
+    assert snapshot.current().photo_count == 8
+    assert publisher.get_stats() == {'scheduled': 1, 'coalesced': 4, 'errors': 0, 'pending': False}
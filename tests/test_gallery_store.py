@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Cache de la galerie (gallery_store.py) quand l'écriture échoue."""
+import os
+
+import pytest
+
+from gallery_store import GalleryStore
+from storage import JsonStorage, SqliteStorage
+
+
+def make_storage(directory, backend):
+    if backend == 'sqlite':
+        return SqliteStorage(os.path.join(directory, 'portfolio.db'))
+    return JsonStorage(os.path.join(directory, 'data.json'), os.path.join(directory, 'users.json'),
+                       os.path.join(directory, 'messages.json'), os.path.join(directory, 'stats.json'))
+
+
+def make_store(directory, backend='json'):
+    store = GalleryStore(make_storage(directory, backend))
+    store.replace_all([{'id': f'p{i}', 'public_id': f'portfolio/p{i}', 'title': f'Montagne {i}', 'description': '',
+                        'categories': ['Voyage'], 'uploaded_at': f'2024-01-0{i + 1}'} for i in range(3)])
+    return store
+
+
+def fail_writes(store, backend):
+    """Fait échouer les écritures suivantes (différée en JSON, immédiate en SQLite)."""
+    storage = store._storage
+
+    def fail(*args, **kwargs):
+        raise OSError('disque plein')
+    if backend == 'sqlite':
+        storage.update_photo = storage.apply_photo_changes = fail
+    else:
+        storage.writer.write_atomic = fail
+
+
+def assert_unchanged(store):
+    assert store.get('p1')['title'] == 'Montagne 1'
+    assert [photo['id'] for photo in store.by_category('Voyage')] == ['p0', 'p1', 'p2']
+    assert store.by_category('Portrait') == []
+    assert [photo['id'] for photo in store.search('montagne', 10)[0]] == ['p2', 'p1', 'p0']
+    assert store.search('lac', 10)[0] == []
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_failed_update_is_rolled_back(tmp_path, backend):
+    store = make_store(str(tmp_path), backend)
+    photo = store.get('p1')
+    fail_writes(store, backend)
+
+    with pytest.raises(OSError):
+        store.update('p1', {'title': 'Lac', 'categories': ['Portrait']})
+
+    assert_unchanged(store)
+    # La photo déjà lue n'a pas été modifiée sur place
+    assert photo['title'] == 'Montagne 1'
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_failed_batch_is_rolled_back(tmp_path, backend):
+    store = make_store(str(tmp_path), backend)
+    fail_writes(store, backend)
+
+    with pytest.raises(OSError):
+        store.apply_batch(updates=[('p1', {'title': 'Lac', 'categories': ['Portrait']})], deleted_ids=['p0'])
+
+    assert_unchanged(store)
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_pages_are_stable_across_backends(tmp_path, backend):
+    store = make_store(str(tmp_path), backend)
+    first, key = store.page(2, descending=True)
+    store.add({'id': 'p9', 'public_id': 'portfolio/p9', 'title': 'Nouvelle', 'categories': ['Voyage'],
+               'uploaded_at': '2024-02-01'})
+
+    rest, next_key = store.page(2, after=key, descending=True)
+
+    assert [photo['id'] for photo in first + rest] == ['p2', 'p1', 'p0']
+    assert next_key is None
+    # Relu depuis le stockage (autre worker), l'ordre est le même
+    reloaded = GalleryStore(make_storage(str(tmp_path), backend))
+    assert [photo['id'] for photo in reloaded.page(10, descending=True)[0]] == ['p9', 'p2', 'p1', 'p0']
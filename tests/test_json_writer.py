@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""Écriture atomique des fichiers JSON (json_writer.py)."""
+import os
+import stat
+
+import pytest
+
+import json_writer
+from json_writer import JsonWriter
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fchmod'), reason='droits POSIX')
+
+
+def test_replace_keeps_existing_mode(tmp_path):
+    path = str(tmp_path / 'data.json')
+    with open(path, 'w') as f:
+        f.write('[]')
+    os.chmod(path, 0o644)
+
+    JsonWriter().write(path, [{'id': 'p0'}])
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+
+def test_new_file_follows_umask(tmp_path):
+    path = str(tmp_path / 'users.json')
+    JsonWriter().write_atomic(path, b'{}')
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o666 & ~json_writer._UMASK
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Migrations du schéma des données (migrations.py)."""
+import json
+import os
+import shutil
+
+from migrations import run_migrations
+from storage import JsonStorage, SqliteStorage
+
+# data.json livré avec le dépôt (sans numéro de schéma)
+REPO_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data.json')
+
+
+def make_storage(directory):
+    return JsonStorage(os.path.join(directory, 'data.json'), os.path.join(directory, 'users.json'),
+                       os.path.join(directory, 'messages.json'), os.path.join(directory, 'stats.json'))
+
+
+def test_migrations_do_not_create_missing_files(tmp_path):
+    storage = make_storage(str(tmp_path))
+    with open(storage.gallery_file, 'w') as f:
+        f.write('{"photos": [{"id": "p0", "public_id": "portfolio/p0", "category": "Voyage"}]}')
+
+    assert [version for version, _, _ in run_migrations(storage)] == [1]
+
+    assert storage.load_photos()[0]['categories'] == ['Voyage']
+    assert storage.schema_version() == 1
+    assert not os.path.exists(storage.users_file)
+    assert not os.path.exists(storage.messages_file)
+
+
+def test_migrations_on_empty_sqlite(tmp_path):
+    storage = SqliteStorage(str(tmp_path / 'portfolio.db'))
+
+    run_migrations(storage)
+
+    assert storage.schema_version() == 1
+    assert storage.load_users() == {} and storage.load_messages() == []
+
+
+def test_migrate_repository_data(tmp_path):
+    storage = make_storage(str(tmp_path))
+    shutil.copy(REPO_DATA, storage.gallery_file)
+    with open(REPO_DATA) as f:
+        original = json.load(f)['photos']
+
+    assert [version for version, _, _ in run_migrations(storage)] == [1]
+    assert run_migrations(storage) == []
+
+    assert storage.schema_version() == 1
+    photos = storage.load_photos()
+    assert [photo['id'] for photo in photos] == [photo['id'] for photo in original]
+    assert all(isinstance(photo['categories'], list) and 'title' in photo for photo in photos)
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""Comptage des visites par lots (visits.py)."""
+import os
+import time
+
+from storage import JsonStorage
+from visits import VisitTracker
+
+
+def test_pending_visits_are_flushed_without_new_visit(tmp_path):
+    storage = JsonStorage(os.path.join(tmp_path, 'data.json'), os.path.join(tmp_path, 'users.json'),
+                          os.path.join(tmp_path, 'messages.json'), os.path.join(tmp_path, 'stats.json'))
+    tracker = VisitTracker(storage, flush_interval=0.05)
+    tracker.record('visiteur-1', page='/')
+    tracker.record('visiteur-2', page='/')
+    assert storage.visit_counts()[1] == 0
+
+    deadline = time.monotonic() + 2
+    while not tracker.get_stats()['flushes'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert tracker.get_stats()['flushes'] == 1
+    assert storage.visit_counts()[1] == 2
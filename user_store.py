@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Cache en mémoire des utilisateurs avec index des noms insensible à la casse."""
+import threading
+
+
+class UserStore:
+    """Garde les utilisateurs en mémoire avec un index nom normalisé -> nom réel.
+
+    La connexion, l'inscription et la vérification des destinataires sont
+    ainsi des recherches en O(1) au lieu d'un parcours de users.json. Le cache
+    est rechargé si la signature du stockage change (inscription dans un
+    autre worker) ; l'unicité insensible à la casse est garantie par le
+    stockage lui-même (verrou fichier en JSON, COLLATE NOCASE en SQLite).
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+        self._lock = threading.RLock()
+        self._users = None
+        self._by_lower = {}
+        self._signature = None
+        self.stats = {'hits': 0, 'misses': 0, 'reloads': 0, 'writes': 0}
+
+    def _set_users(self, users):
+        self._users = users
+        self._by_lower = {username.lower(): username for username in users}
+
+    def _ensure_loaded(self):
+        signature = self._storage.users_signature()
+        if self._users is not None and signature == self._signature:
+            self.stats['hits'] += 1
+            return
+
+        self.stats['misses'] += 1
+        try:
+            users = self._storage.load_users()
+        except Exception as e:
+            print(f"Erreur lors du chargement des utilisateurs: {e}")
+            if self._users is None:
+                self._set_users({})
+            return
+        if self._users is not None:
+            self.stats['reloads'] += 1
+        self._set_users(users)
+        self._signature = signature
+
+    def all(self):
+        """Retourne le dict {nom: infos} des utilisateurs (à ne pas modifier directement)."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._users
+
+    def usernames(self):
+        """Liste des noms d'utilisateurs, dans l'ordre d'inscription."""
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._users)
+
+    def exists(self, username):
+        """Vrai si ce nom exact est inscrit."""
+        with self._lock:
+            self._ensure_loaded()
+            return username in self._users
+
+    def find(self, username):
+        """Trouve un utilisateur en ignorant la casse. Retourne (nom réel, infos) ou (None, None)."""
+        with self._lock:
+            self._ensure_loaded()
+            actual_username = self._by_lower.get(username.lower())
+            if actual_username is None:
+                return None, None
+            return actual_username, self._users[actual_username]
+
+    def add(self, username, record):
+        """Inscrit un utilisateur. Retourne False si le nom est déjà pris (insensible à la casse)."""
+        with self._lock:
+            self._ensure_loaded()
+            if username.lower() in self._by_lower:
+                return False
+            if not self._storage.add_user(username, record):
+                # Nom pris entre-temps par un autre worker : recharger au prochain accès
+                self._signature = None
+                return False
+            self._users[username] = record
+            self._by_lower[username.lower()] = username
+            self.stats['writes'] += 1
+            self._signature = self._storage.users_signature()
+            return True
+
+    def replace_all(self, users):
+        """Remplace tous les utilisateurs."""
+        with self._lock:
+            self._set_users(dict(users))
+            ticket = self._storage.save_users(self._users)
+            if ticket is not None:
+                ticket.wait()
+            self.stats['writes'] += 1
+            self._signature = self._storage.users_signature()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['users'] = len(self._users) if self._users is not None else 0
+            return stats
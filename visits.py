@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""Comptage des visites : tampon en mémoire et estimation HyperLogLog des visiteurs uniques.
+
+Les visites sont aussi agrégées par page et par tranche horaire et
+journalière (« buckets ») : total et visiteurs uniques de chaque tranche.
+Les séries de /admin/stats se lisent directement dans ces agrégats, sans
+parcourir l'historique. Tant qu'une tranche peut encore recevoir des
+visites, ses visiteurs uniques sont suivis par un petit sketch HyperLogLog ;
+ensuite seul le nombre est gardé (compactage), et les tranches trop
+anciennes sont supprimées.
+"""
+import atexit
+import base64
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class HyperLogLog:
+    """Sketch HyperLogLog de taille fixe (2^p registres d'un octet).
+
+    Avec p=14 (16 Ko), l'erreur typique sur le nombre de visiteurs uniques est
+    d'environ 0,8 %, quel que soit le nombre de visiteurs.
+    """
+
+    def __init__(self, p=14, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError('Taille de sketch invalide')
+
+    def add(self, item):
+        x = int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = x >> (64 - self.p)
+        rest = (x << self.p) & 0xFFFFFFFFFFFFFFFF
+        # Rang = nombre de zéros en tête des bits restants + 1
+        rank = min(64 - rest.bit_length(), 64 - self.p) + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Fusionne un autre sketch (union des visiteurs)."""
+        if other.p != self.p:
+            raise ValueError('Sketches de tailles différentes')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        """Estimation du nombre d'éléments distincts."""
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # Correction pour les petits effectifs (linear counting)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def to_base64(self):
+        return base64.b64encode(bytes(self.registers)).decode('ascii')
+
+    @classmethod
+    def from_base64(cls, data, p=14):
+        return cls(p, base64.b64decode(data))
+
+
+# --- Agrégats par tranche ---
+# Sketch des tranches ouvertes : 2^10 registres (1 Ko), erreur typique ~3 %
+BUCKET_P = 10
+# Page « toutes pages confondues »
+ALL_PAGES = '*'
+# Les sketches sont gardés tant que la tranche est récente, puis remplacés par leur compte
+OPEN_HOURS = timedelta(hours=2)
+OPEN_DAYS = timedelta(days=2)
+# Durée de conservation des tranches
+HOURLY_RETENTION = timedelta(days=7)
+DAILY_RETENTION = timedelta(days=400)
+
+HOUR_FORMAT = '%Y-%m-%dT%H:00'
+DAY_FORMAT = '%Y-%m-%d'
+
+
+def hour_key(moment):
+    """Clé de la tranche horaire d'un datetime (heure locale du serveur)."""
+    return moment.strftime(HOUR_FORMAT)
+
+
+def day_key(moment):
+    return moment.strftime(DAY_FORMAT)
+
+
+def merge_bucket(bucket, total, visitor_ids):
+    """Ajoute des visites à une tranche {'total', 'unique', 'hll'} (modifiée sur place).
+
+    Une tranche déjà compactée (sans sketch) ne reçoit que des visites
+    tardives : ses visiteurs uniques sont alors approchés par excès.
+    """
+    bucket['total'] = bucket.get('total', 0) + total
+    hll = bucket.get('hll')
+    if hll is None and bucket.get('unique'):
+        bucket['unique'] += len(visitor_ids)
+        return bucket
+    if hll is None:
+        hll = bucket['hll'] = HyperLogLog(BUCKET_P)
+    for visitor_id in visitor_ids:
+        hll.add(visitor_id)
+    bucket['unique'] = hll.count()
+    return bucket
+
+
+def compaction_cutoffs(now=None):
+    """Limites (clés) de compactage et de suppression des tranches horaires et journalières.
+
+    Retourne {'hour': (compacter avant, supprimer avant), 'day': (...)}.
+    """
+    now = now or datetime.now()
+    return {
+        'hour': (hour_key(now - OPEN_HOURS), hour_key(now - HOURLY_RETENTION)),
+        'day': (day_key(now - OPEN_DAYS), day_key(now - DAILY_RETENTION)),
+    }
+
+
+def fill_series(rows, keys, pages):
+    """Série complète {page: [{'start', 'total', 'unique'}...]} (tranches sans visite à zéro)."""
+    by_key = {(row['page'], row['start']): row for row in rows}
+    series = {}
+    for page in pages:
+        series[page] = [{'start': key,
+                         'total': by_key.get((page, key), {}).get('total', 0),
+                         'unique': by_key.get((page, key), {}).get('unique', 0)} for key in keys]
+    return series
+
+
+def series_keys(granularity, count, now=None):
+    """Clés des `count` dernières tranches, de la plus ancienne à la courante."""
+    now = now or datetime.now()
+    if granularity == 'hour':
+        return [hour_key(now - timedelta(hours=i)) for i in range(count - 1, -1, -1)]
+    return [day_key(now - timedelta(days=i)) for i in range(count - 1, -1, -1)]
+
+
+class VisitTracker:
+    """Met les visites en tampon et les écrit par lots dans le stockage.
+
+    Une visite ne coûte qu'un ajout en mémoire ; le lot est écrit quand
+    `max_pending` visites sont en attente, toutes les `flush_interval`
+    secondes par un thread de fond (même sans nouvelle visite), et à l'arrêt
+    du worker.
+    """
+
+    def __init__(self, storage, flush_interval=10, max_pending=500):
+        self._storage = storage
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending_ids = set()
+        self._pending_total = 0
+        # {(page, clé horaire): [total, visiteurs]}
+        self._pending_buckets = {}
+        self._last_flush = time.monotonic()
+        self._thread = None
+        self.stats = {'recorded': 0, 'flushes': 0, 'flush_errors': 0}
+        atexit.register(self.flush)
+
+    def _start(self):
+        """Démarre le thread d'écriture périodique (au premier enregistrement, sous le verrou)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='visit-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self._lock:
+                due = self._pending_total > 0
+            if due:
+                self.flush()
+
+    def record(self, visitor_id, page=None):
+        """Enregistre une visite (écriture différée), comptée aussi dans les tranches de `page`."""
+        with self._lock:
+            self._pending_ids.add(visitor_id)
+            self._pending_total += 1
+            if page is not None:
+                key = hour_key(datetime.now())
+                for bucket_page in (page, ALL_PAGES):
+                    bucket = self._pending_buckets.get((bucket_page, key))
+                    if bucket is None:
+                        bucket = self._pending_buckets[(bucket_page, key)] = [0, set()]
+                    bucket[0] += 1
+                    bucket[1].add(visitor_id)
+            self.stats['recorded'] += 1
+            self._start()
+            due = (self._pending_total >= self.max_pending
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Écrit les visites en attente dans le stockage."""
+        with self._lock:
+            visitor_ids, total = self._pending_ids, self._pending_total
+            buckets = self._pending_buckets
+            self._pending_ids, self._pending_total, self._pending_buckets = set(), 0, {}
+            self._last_flush = time.monotonic()
+        if not total:
+            return
+        try:
+            self._storage.record_visits(visitor_ids, total, buckets=buckets)
+            with self._lock:
+                self.stats['flushes'] += 1
+        except Exception as e:
+            print(f"Erreur lors de l'enregistrement des visites: {e}")
+            # Remettre le lot en attente pour la prochaine tentative
+            with self._lock:
+                self._pending_ids.update(visitor_ids)
+                self._pending_total += total
+                for key, (bucket_total, bucket_ids) in buckets.items():
+                    pending = self._pending_buckets.setdefault(key, [0, set()])
+                    pending[0] += bucket_total
+                    pending[1].update(bucket_ids)
+                self.stats['flush_errors'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['pending'] = self._pending_total
+            return stats
@@ -7,20 +7,10 @@ from pathlib import Path
 project_dir = Path(__file__).parent
 sys.path.insert(0, str(project_dir))
 
-# Load environment variables from .env file
-try:
-    from dotenv import load_dotenv
-    dotenv_path = os.path.join(project_dir, '.env')
-    if os.path.exists(dotenv_path):
-        load_dotenv(dotenv_path)
-        print(f"Loaded .env from {dotenv_path}")
-    else:
-        print(f".env file not found at {dotenv_path}")
-except ImportError:
-    print("python-dotenv not installed, using environment variables")
-
-# Import the Flask app
-from app import app as application
+# Create the Flask app (config.py loads .env from the project directory)
+from app import create_app
+from config import Config
+application = create_app(Config)
 
 # For debugging - uncomment if needed
 # import logging